@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks the author handling of the NCX, OPF and OPS stages on synthetic
+articles with many authors, made by replacing the authors of a PLoS article
+with the given numbers of generated authors. The time per author should stay
+flat as the number of authors grows.
+
+The "before" run reproduces the old append_new_text, which counted the
+children of the destination on every call and made the heading quadratic in
+the number of authors.
+
+Usage: python3 benchmarks/author_scaling.py [-n REPEAT] [-a AUTHORS ...] ARTICLE.xml
+"""
+
+import argparse
+import gc
+import os
+import re
+import shutil
+import tempfile
+import time
+
+from openaccess_epub import ncx, opf
+from openaccess_epub.article import Article
+from openaccess_epub.ops import OPSPLoS
+import openaccess_epub.utils.element_methods as element_methods
+
+AUTHOR = '<contrib contrib-type="author" xlink:type="simple">\
+<name name-style="western"><surname>Author{0}</surname>\
+<given-names>Given Q</given-names></name>\
+<xref ref-type="aff" rid="aff{1}"><sup>{1}</sup></xref></contrib>'
+
+
+def counting_append_new_text(destination, text, join_str=None):
+    if join_str is None:
+        join_str = ' '
+    if len(destination) > 0:
+        last = destination[-1]
+        if last.tail is None:
+            last.tail = text
+        else:
+            last.tail = join_str.join([last.tail, text])
+    else:
+        if destination.text is None:
+            destination.text = text
+        else:
+            destination.text = join_str.join([destination.text, text])
+
+
+def synthetic_article(template, authors, path):
+    """
+    Writes the template article to path with its first contrib-group of
+    authors replaced by the given number of generated authors.
+    """
+    contribs = ''.join(AUTHOR.format(i, 1) for i in range(authors))
+    xml, count = re.subn(r'<contrib-group>\s*<contrib contrib-type="author".*?</contrib-group>',
+                         lambda m: '<contrib-group>' + contribs + '</contrib-group>',
+                         template, count=1, flags=re.S)
+    if not count:
+        raise ValueError('The article has no contrib-group of authors')
+    with open(path, 'w') as out:
+        out.write(xml)
+
+
+def measure(path, repeat):
+    """
+    Returns the least seconds spent in the NCX, OPF and OPS stages for the
+    article at path.
+    """
+    best = None
+    for _i in range(repeat):
+        article = Article(path, validation=False)
+        gc.collect()
+        output_dir = tempfile.mkdtemp()
+        try:
+            os.mkdir(os.path.join(output_dir, 'OPS'))
+            start = time.perf_counter()
+            toc = ncx.NCX('benchmark', output_dir)
+            toc.take_article(article)
+            ncx_done = time.perf_counter()
+            package = opf.OPF(output_dir, False)
+            package.take_article(article)
+            opf_done = time.perf_counter()
+            OPSPLoS(article, output_dir)
+            ops_done = time.perf_counter()
+        finally:
+            shutil.rmtree(output_dir)
+        times = (ncx_done - start, opf_done - ncx_done, ops_done - opf_done)
+        if best is None or sum(times) < sum(best):
+            best = times
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', '--repeat', type=int, default=3)
+    parser.add_argument('-a', '--authors', type=int, nargs='+',
+                        default=[500, 1000, 2000, 5000])
+    parser.add_argument('article')
+    args = parser.parse_args()
+
+    with open(args.article, encoding='utf-8') as template_file:
+        template = template_file.read()
+    work_dir = tempfile.mkdtemp()
+    try:
+        print('{0:<8} {1:>8} {2:>10} {3:>10} {4:>10} {5:>12}'.format('', 'authors',
+                                                                  'ncx ms',
+                                                                  'opf ms',
+                                                                  'ops ms',
+                                                                  'us/author'))
+        for authors in args.authors:
+            path = os.path.join(work_dir, 'authors-{0}.xml'.format(authors))
+            synthetic_article(template, authors, path)
+            current = element_methods.append_new_text
+            element_methods.append_new_text = counting_append_new_text
+            try:
+                before = measure(path, args.repeat)
+            finally:
+                element_methods.append_new_text = current
+            after = measure(path, args.repeat)
+            for name, times in [('before', before), ('after', after)]:
+                print('{0:<8} {1:>8} {2:>10.2f} {3:>10.2f} {4:>10.2f} {5:>12.2f}'.format(name,
+                                                                                       authors,
+                                                                                       times[0] * 1000,
+                                                                                       times[1] * 1000,
+                                                                                       times[2] * 1000,
+                                                                                       sum(times) * 1e6 / authors))
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks the content-addressed image cache against the old cache, which kept
+a copy of each article's images in a directory of its own and copied it out
+with shutil.copytree. Synthetic articles are made with a number of distinct
+images each, plus images shared by all of them (such as publisher logos and
+equation glyphs). The disk used by each cache and the time to place the images
+of every article from it are reported, and then the time to prune the new cache
+to half its size.
+
+Usage: python3 benchmarks/image_cache.py [-a ARTICLES] [-i IMAGES] [-s SHARED] [--size BYTES] [--dir DIR]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from openaccess_epub.utils.image_cache import ImageCache
+
+
+def disk_usage(directory):
+    """
+    Returns the bytes of the distinct files (by inode) beneath directory.
+    """
+    seen, total = set(), 0
+    for root, _dirs, files in os.walk(directory):
+        for name in files:
+            stat = os.stat(os.path.join(root, name))
+            if (stat.st_dev, stat.st_ino) not in seen:
+                seen.add((stat.st_dev, stat.st_ino))
+                total += stat.st_blocks * 512
+    return total
+
+
+def make_articles(work_dir, articles, images, shared, size):
+    """
+    Writes the images of the synthetic articles in the old cache layout, and
+    returns the list of their DOIs.
+    """
+    shared_images = [os.urandom(size) for _i in range(shared)]
+    dois = []
+    for number in range(articles):
+        doi = '10.1371/journal.pone.{0:07d}'.format(number)
+        directory = os.path.join(work_dir, 'old', *doi.split('/'))
+        os.makedirs(directory)
+        for image in range(images):
+            with open(os.path.join(directory, 'g{0:03d}.png'.format(image)), 'wb') as out:
+                out.write(os.urandom(size))
+        for image, data in enumerate(shared_images):
+            with open(os.path.join(directory, 'e{0:03d}.png'.format(image)), 'wb') as out:
+                out.write(data)
+        dois.append(doi)
+    return dois
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-a', '--articles', type=int, default=200)
+    parser.add_argument('-i', '--images', type=int, default=8,
+                        help='distinct images per article')
+    parser.add_argument('-s', '--shared', type=int, default=12,
+                        help='images shared by all articles')
+    parser.add_argument('--size', type=int, default=50000)
+    parser.add_argument('--dir', default=None,
+                        help='directory to work in, on the filesystem to test')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(dir=args.dir)
+    try:
+        dois = make_articles(work_dir, args.articles, args.images, args.shared,
+                             args.size)
+        cache = ImageCache(os.path.join(work_dir, 'new'))
+        start = time.perf_counter()
+        for doi in dois:
+            cache.store(doi, os.path.join(work_dir, 'old', *doi.split('/')))
+        store_time = time.perf_counter() - start
+
+        old_out = os.path.join(work_dir, 'old-out')
+        start = time.perf_counter()
+        for doi in dois:
+            shutil.copytree(os.path.join(work_dir, 'old', *doi.split('/')),
+                            os.path.join(old_out, doi.split('/')[1]))
+        old_time = time.perf_counter() - start
+
+        new_out = os.path.join(work_dir, 'new-out')
+        start = time.perf_counter()
+        for doi in dois:
+            cache.place(doi, os.path.join(new_out, doi.split('/')[1]))
+        new_time = time.perf_counter() - start
+
+        old_disk = disk_usage(os.path.join(work_dir, 'old'))
+        new_disk = disk_usage(os.path.join(cache.root, 'blobs'))
+        print('{0} articles, {1} images each, {2} of them shared'.format(args.articles,
+                                                                        args.images + args.shared,
+                                                                        args.shared))
+        print('Stored in the new cache in {0:.1f} ms'.format(store_time * 1000))
+        print('{0:<10} {1:>12} {2:>12}'.format('cache', 'disk MiB', 'place ms'))
+        print('{0:<10} {1:>12.1f} {2:>12.1f}'.format('old', old_disk / 2 ** 20, old_time * 1000))
+        print('{0:<10} {1:>12.1f} {2:>12.1f}'.format('new', new_disk / 2 ** 20, new_time * 1000))
+        print('Placed by: {0}'.format(', '.join('{0} {1}'.format(method, count)
+                                                for method, count in sorted(cache.placed.items()))))
+
+        start = time.perf_counter()
+        evicted, freed = cache.prune(cache.size() // 2)
+        prune_time = time.perf_counter() - start
+        print('Pruned to half size in {0:.1f} ms, evicting {1} articles and {2:.1f} MiB'.format(prune_time * 1000,
+                                                                                            evicted,
+                                                                                            freed / 2 ** 20))
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks the download of the images of a PLoS article against a local HTTP
+server standing in for the publisher, which answers after a fixed latency and
+fails a share of the requests with 503. The concurrent Fetcher is compared to
+the old serial download, which opened a connection per image, waited a second
+to try a 503 once more, and gave up on the article at the first failure.
+
+Usage: python3 benchmarks/image_fetch.py [-l LATENCY_MS] [-f FAIL_RATE] ARTICLE.xml [-w WORKERS ...]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from openaccess_epub.article import Article
+from openaccess_epub.utils.fetch import Fetcher, FetchResult
+from openaccess_epub.utils.images import fetch_plos_images
+
+
+class StandIn(ThreadingHTTPServer):
+    """
+    The stand-in server, counting the connections and requests it receives.
+    """
+    daemon_threads = True
+
+    def __init__(self, latency, fail_rate, size):
+        ThreadingHTTPServer.__init__(self, ('127.0.0.1', 0), StandInHandler)
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.body = os.urandom(size)
+        self.random = random.Random(0)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests += 1
+            fail = self.server.random.random() < self.server.fail_rate
+        time.sleep(self.server.latency)
+        body = b'' if fail else self.server.body
+        self.send_response(503 if fail else 200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class SerialFetcher(object):
+    """
+    The old download loop, as a fetcher for fetch_plos_images().
+    """
+    def fetch_all(self, jobs):
+        results = []
+        for job in jobs:
+            if results and results[-1].error is not None:
+                results.append(FetchResult(job.url, job.path, None, 'not attempted'))
+                continue
+            try:
+                try:
+                    image = urllib.request.urlopen(job.url)
+                except urllib.error.HTTPError as e:
+                    if e.code != 503:
+                        raise
+                    time.sleep(1)
+                    image = urllib.request.urlopen(job.url)
+            except urllib.error.HTTPError as e:
+                results.append(FetchResult(job.url, job.path, e.code,
+                                           'HTTP {0}'.format(e.code)))
+                continue
+            with open(job.path, 'wb') as output:
+                output.write(image.read())
+            results.append(FetchResult(job.url, job.path, 200, None))
+        return results
+
+
+def measure(article, server, fetcher):
+    """
+    Downloads the images of the article from the server with the fetcher, and
+    returns the seconds taken, the number of images written, and the
+    connections and requests the server received.
+    """
+    output_dir = tempfile.mkdtemp()
+    server.connections = server.requests = 0
+    base_url = 'http://127.0.0.1:{0}/article/{{0}}'.format(server.server_address[1])
+    try:
+        start = time.perf_counter()
+        fetch_plos_images(article.get_DOI().split('/')[1], output_dir, article,
+                          fetcher=fetcher, base_url=base_url)
+        elapsed = time.perf_counter() - start
+        written = len(os.listdir(output_dir))
+    finally:
+        shutil.rmtree(output_dir)
+    return elapsed, written, server.connections, server.requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-l', '--latency', type=float, default=50,
+                        help='milliseconds before each response')
+    parser.add_argument('-f', '--fail-rate', type=float, default=0.05)
+    parser.add_argument('-s', '--size', type=int, default=20000,
+                        help='bytes per image')
+    parser.add_argument('-w', '--workers', type=int, nargs='+', default=[4, 8])
+    parser.add_argument('article')
+    args = parser.parse_args()
+
+    article = Article(args.article, validation=False)
+    server = StandIn(args.latency / 1000.0, args.fail_rate, args.size)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    fetchers = [('serial', SerialFetcher())]
+    for workers in args.workers:
+        fetchers.append(('{0} workers'.format(workers),
+                         Fetcher(workers=workers, backoff=0.1)))
+    rows = []
+    try:
+        for name, fetcher in fetchers:
+            rows.append((name,) + measure(article, server, fetcher))
+    finally:
+        server.shutdown()
+    print()
+    print('{0:<12} {1:>10} {2:>8} {3:>12} {4:>9}'.format('fetcher', 'ms', 'images',
+                                                       'connections', 'requests'))
+    for name, elapsed, written, connections, requests in rows:
+        print('{0:<12} {1:>10.1f} {2:>8} {3:>12} {4:>9}'.format(name, elapsed * 1000,
+                                                              written, connections,
+                                                              requests))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks the metadata stage of Article (Article.get_metadata) with and
+without the cache of metadata record classes, reporting time per article and
+memory as measured by tracemalloc.
+
+The uncached run reproduces the old behavior of creating a new namedtuple
+class for every packed element.
+
+Usage: python3 benchmarks/metadata_records.py [-n REPEAT] ARTICLE.xml ...
+"""
+
+import argparse
+import time
+import tracemalloc
+from collections import namedtuple
+
+import openaccess_epub.article as article_module
+from openaccess_epub.article import Article
+
+
+def uncached_record_class(type_name, field_names):
+    return namedtuple(type_name, field_names)
+
+
+def measure(articles, repeat):
+    """
+    Runs get_metadata on every article repeat times, returning the mean
+    seconds per article, the peak traced memory, and the memory still held by
+    the resulting metadata.
+    """
+    #Warm the content model tables so only the packing is measured
+    for article in articles:
+        article.get_metadata()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    kept = []
+    for _i in range(repeat):
+        for article in articles:
+            kept.append(article.get_metadata())
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (elapsed / (repeat * len(articles)),
+            peak - baseline,
+            current - baseline)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', '--repeat', type=int, default=10)
+    parser.add_argument('articles', nargs='+')
+    args = parser.parse_args()
+
+    articles = [Article(path, validation=False) for path in args.articles]
+
+    cached_record_class = article_module.record_class
+    article_module.record_class = uncached_record_class
+    try:
+        before = measure(articles, args.repeat)
+    finally:
+        article_module.record_class = cached_record_class
+    after = measure(articles, args.repeat)
+
+    print('{0:<10} {1:>12} {2:>12} {3:>12}'.format('', 'ms/article',
+                                                   'peak KiB', 'held KiB'))
+    for name, (per_article, peak, held) in [('before', before),
+                                            ('after', after)]:
+        print('{0:<10} {1:>12.2f} {2:>12.1f} {3:>12.1f}'.format(name,
+                                                            per_article * 1000,
+                                                            peak / 1024,
+                                                            held / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks the OPS backends side by side: the publisher's OPS class, which
+converts the article element by element, and OPSXSLT, which renders it with
+the compiled ViewNLM stylesheet. The time to compile the stylesheet, paid once
+per process, is reported separately.
+
+With --diff, a unified diff of the text of the main documents produced by the
+two backends is written for each article, to compare their content.
+
+Usage: python3 benchmarks/ops_backends.py [-n REPEAT] [--diff DIR] ARTICLE.xml ...
+"""
+
+import argparse
+import difflib
+import os
+import shutil
+import tempfile
+import time
+
+from lxml import etree
+
+from openaccess_epub.article import Article
+from openaccess_epub.ops import OPSPLoS, OPSFrontiers, OPSXSLT
+from openaccess_epub.ops.opsxslt import get_transform
+
+#Elements whose text is placed on lines of its own for the diff
+BLOCKS = set(['p', 'div', 'li', 'td', 'th', 'tr', 'table', 'blockquote', 'br',
+              'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr'])
+
+
+def python_backend(article):
+    """
+    Returns the publisher's OPS class for the article.
+    """
+    if article.get_DOI().startswith('10.3389/'):
+        return OPSFrontiers
+    return OPSPLoS
+
+
+def measure(backend, article, repeat):
+    """
+    Returns the least seconds to produce the OPS content of the article with
+    the backend, and the text of its main document.
+    """
+    best = None
+    for _i in range(repeat):
+        output_dir = tempfile.mkdtemp()
+        try:
+            os.mkdir(os.path.join(output_dir, 'OPS'))
+            start = time.perf_counter()
+            backend(article, output_dir)
+            elapsed = time.perf_counter() - start
+            main = [f for f in os.listdir(os.path.join(output_dir, 'OPS'))
+                    if f.startswith('main.')][0]
+            document = etree.parse(os.path.join(output_dir, 'OPS', main))
+        finally:
+            shutil.rmtree(output_dir)
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, main_text(document)
+
+
+def main_text(document):
+    """
+    Returns the text of the document as a list of lines, one or more for each
+    block element, without the blank lines and indentation which differ
+    between the backends.
+    """
+    for element in document.iter():
+        if isinstance(element.tag, str) and \
+           etree.QName(element).localname in BLOCKS:
+            element.text = '\n' + (element.text or '')
+            element.tail = '\n' + (element.tail or '')
+    text = etree.tostring(document, method='text', encoding='unicode')
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', '--repeat', type=int, default=5)
+    parser.add_argument('--diff', action='store', default=None,
+                        help='directory to write the text diffs to')
+    parser.add_argument('articles', nargs='+')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    get_transform()
+    print('Stylesheet compiled in {0:.2f} ms'.format((time.perf_counter() - start) * 1000))
+    if args.diff and not os.path.isdir(args.diff):
+        os.makedirs(args.diff)
+
+    print('{0:<40} {1:>10} {2:>10} {3:>8} {4:>8}'.format('article',
+                                                      'python ms',
+                                                      'xslt ms',
+                                                      'speedup',
+                                                      'changed'))
+    for path in args.articles:
+        article = Article(path, validation=False)
+        python_time, python_text = measure(python_backend(article), article,
+                                           args.repeat)
+        xslt_time, xslt_text = measure(OPSXSLT, article, args.repeat)
+        name = os.path.splitext(os.path.basename(path))[0]
+        diff = list(difflib.unified_diff(python_text, xslt_text,
+                                         'python/' + name, 'xslt/' + name,
+                                         lineterm=''))
+        changed = sum(1 for line in diff if line[:1] in '+-' and
+                      line[:3] not in ('+++', '---'))
+        if args.diff:
+            with open(os.path.join(args.diff, name + '.diff'), 'w') as out:
+                out.write('\n'.join(diff) + '\n')
+        print('{0:<40} {1:>10.2f} {2:>10.2f} {3:>8.2f} {4:>8}'.format(name[:40],
+                                                                    python_time * 1000,
+                                                                    xslt_time * 1000,
+                                                                    python_time / xslt_time,
+                                                                    changed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks the node conversion of the main document by OPSPLoS, comparing the
+phased conversion (one walk of the tree per phase) with the equivalent
+conversion making one walk of the tree per conversion method, as was done
+before. The body of the article is repeated to show how each scales with the
+size of the document.
+
+Usage: python3 benchmarks/ops_conversion.py [-n REPEAT] [-s SCALE ...] ARTICLE.xml
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from copy import deepcopy
+
+from openaccess_epub.article import Article
+from openaccess_epub.ops.opsplos import OPSPLoS
+
+
+def scaled_body(body, scale):
+    """
+    Returns a copy of the body with its content repeated scale times.
+    """
+    scaled = deepcopy(body)
+    for _i in range(scale - 1):
+        for child in body:
+            scaled.append(deepcopy(child))
+    return scaled
+
+
+def per_pass(phases):
+    """
+    Splits the phases so that every conversion makes its own walk of the tree.
+    """
+    return [[entry] for phase in phases for entry in phase]
+
+
+def measure(ops, body, split, repeat):
+    """
+    Returns the least seconds to convert a copy of the body, by phases or, if
+    split is True, by passes.
+    """
+    best = None
+    for _i in range(repeat):
+        top = deepcopy(body)
+        ops.html_tables = []
+        phases = ops.main_conversion_phases()
+        if split:
+            phases = per_pass(phases)
+        start = time.perf_counter()
+        ops.convert_elements(top, phases)
+        ops.convert_div_titles(top, depth=1)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', '--repeat', type=int, default=5)
+    parser.add_argument('-s', '--scale', type=int, nargs='+',
+                        default=[1, 4, 16, 64])
+    parser.add_argument('article')
+    args = parser.parse_args()
+
+    article = Article(args.article, validation=False)
+    output_dir = tempfile.mkdtemp()
+    try:
+        os.mkdir(os.path.join(output_dir, 'OPS'))
+        ops = OPSPLoS(article, output_dir)
+    finally:
+        shutil.rmtree(output_dir)
+
+    print('{0:>6} {1:>10} {2:>12} {3:>12} {4:>8}'.format('scale', 'elements',
+                                                         'passes ms',
+                                                         'phases ms',
+                                                         'speedup'))
+    for scale in args.scale:
+        body = scaled_body(article.body, scale)
+        elements = sum(1 for _e in body.iter())
+        before = measure(ops, body, True, args.repeat)
+        after = measure(ops, body, False, args.repeat)
+        print('{0:>6} {1:>10} {2:>12.2f} {3:>12.2f} {4:>8.2f}'.format(scale,
+                                                                    elements,
+                                                                    before * 1000,
+                                                                    after * 1000,
+                                                                    before / after))
+
+
+if __name__ == '__main__':
+    main()
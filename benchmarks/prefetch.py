@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks Batch Input Mode with and without image prefetching. Copies of a
+PLoS article are given distinct DOIs and converted in turn, with their images
+downloaded from the local stand-in server of benchmarks/image_fetch.py into an
+empty image cache. The time for the whole batch is reported for each
+look-ahead window, where 0 fetches the images of each article as it is
+converted.
+
+Usage: python3 benchmarks/prefetch.py [-n ARTICLES] [-l LATENCY_MS] ARTICLE.xml [-k WINDOW ...]
+"""
+
+import argparse
+import contextlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import types
+
+from image_fetch import StandIn
+
+from openaccess_epub.main import batch_article
+from openaccess_epub.utils import images
+from openaccess_epub.utils.fetch import Fetcher
+from openaccess_epub.utils.prefetch import prefetch, article_doi
+from openaccess_epub.utils.dtds import parse
+
+
+def make_batch(article, directory, count):
+    """
+    Writes count copies of the article to directory, each with its own DOI,
+    and returns their paths.
+    """
+    doi = article_doi(parse(article).getroot())
+    with open(article) as article_file:
+        text = article_file.read()
+    paths = []
+    for number in range(count):
+        new_doi = '{0}{1:04d}'.format(doi, number)
+        path = os.path.join(directory, new_doi.split('/')[1] + '.xml')
+        with open(path, 'w') as copy:
+            copy.write(text.replace(doi, new_doi))
+        paths.append(path)
+    return paths
+
+
+def run_batch(paths, work_dir, window, fetcher):
+    """
+    Converts the articles with an empty image cache, prefetching window
+    articles ahead, and returns the seconds taken.
+    """
+    cache_dir = tempfile.mkdtemp(dir=work_dir)
+    output_dir = tempfile.mkdtemp(dir=work_dir)
+    config = types.SimpleNamespace(use_input_relative_images=False,
+                                   input_relative_images=[],
+                                   use_image_cache=True,
+                                   image_cache=cache_dir,
+                                   image_cache_size=None,
+                                   use_image_fetching=True,
+                                   input_relative_css='.')
+    args = types.SimpleNamespace(no_dtd_validation=False,
+                                 no_validation_cache=False,
+                                 no_epubcheck=False,
+                                 ops_backend='python',
+                                 split_main=None,
+                                 mathml=False,
+                                 image_profile=None)
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for path in prefetch(paths, config, window, fetcher, args.mathml):
+            batch_article(path, output_dir, args, config)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', '--articles', type=int, default=12)
+    parser.add_argument('-l', '--latency', type=float, default=50,
+                        help='milliseconds before each response')
+    parser.add_argument('-s', '--size', type=int, default=20000,
+                        help='bytes per image')
+    parser.add_argument('-k', '--window', type=int, nargs='+', default=[0, 2, 4])
+    parser.add_argument('article')
+    args = parser.parse_args()
+
+    server = StandIn(args.latency / 1000.0, 0.0, args.size)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = 'http://127.0.0.1:{0}/article/{{0}}'.format(server.server_address[1])
+    for subjournal in images.plos_journal_urls:
+        images.plos_journal_urls[subjournal] = base_url
+    work_dir = tempfile.mkdtemp()
+    try:
+        paths = make_batch(args.article, work_dir, args.articles)
+        rows = []
+        for window in args.window:
+            elapsed = run_batch(paths, work_dir, window, Fetcher())
+            rows.append((window, elapsed))
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir)
+    print('{0} articles, {1:.0f} ms latency'.format(args.articles, args.latency))
+    print('{0:<8} {1:>10} {2:>12}'.format('window', 's', 'articles/s'))
+    for window, elapsed in rows:
+        print('{0:<8} {1:>10.2f} {2:>12.2f}'.format(window, elapsed,
+                                                   args.articles / elapsed))
+
+
+if __name__ == '__main__':
+    main()
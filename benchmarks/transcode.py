@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks the transcoding of article images for device profiles. Synthetic
+articles are made with photographic TIFF figures and line-art PNG figures at
+print resolution. For each profile the bytes of the images are reported before
+and after, with the time to transcode them all, first into an empty image
+cache and then again from the cache. Requires Pillow.
+
+Usage: python3 benchmarks/transcode.py [-a ARTICLES] [-f FIGURES] [-p PROFILE ...]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+import types
+
+from PIL import Image, ImageDraw
+
+from openaccess_epub.utils import transcode
+
+
+def make_figures(directory, figures, seed):
+    """
+    Writes the figures of an article, alternately photographic TIFF and
+    line-art PNG, at 2400 by 1800 pixels.
+    """
+    os.makedirs(directory)
+    rand = random.Random(seed)
+    for number in range(figures):
+        if number % 2 == 0:
+            bands = [Image.effect_noise((2400, 1800), rand.randint(20, 80))
+                     for _band in range(3)]
+            photo = Image.merge('RGB', bands)
+            photo.save(os.path.join(directory, 'g{0:03d}.tif'.format(number)))
+        else:
+            drawing = Image.new('RGB', (2400, 1800), 'white')
+            draw = ImageDraw.Draw(drawing)
+            for _line in range(60):
+                draw.line([(rand.randrange(2400), rand.randrange(1800)),
+                           (rand.randrange(2400), rand.randrange(1800))],
+                          fill=(0, 0, rand.randrange(256)), width=4)
+            drawing.save(os.path.join(directory, 'g{0:03d}.png'.format(number)))
+
+
+def directory_size(directory):
+    return sum(os.path.getsize(os.path.join(directory, name))
+               for name in os.listdir(directory))
+
+
+def run(sources, work_dir, profile, config):
+    """
+    Copies the articles' figures to fresh directories and transcodes them,
+    returning the seconds taken and the bytes of the results.
+    """
+    directories = []
+    for number, source in enumerate(sources):
+        directory = os.path.join(work_dir, 'out-{0}-{1}'.format(profile.name, number))
+        shutil.rmtree(directory, ignore_errors=True)
+        shutil.copytree(source, directory)
+        directories.append(directory)
+    start = time.perf_counter()
+    for directory in directories:
+        transcode.transcode_images(directory, profile, config)
+    elapsed = time.perf_counter() - start
+    return elapsed, sum(directory_size(directory) for directory in directories)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-a', '--articles', type=int, default=4)
+    parser.add_argument('-f', '--figures', type=int, default=6,
+                        help='figures per article')
+    parser.add_argument('-p', '--profile', nargs='+',
+                        default=['original', 'tablet', 'e-ink'])
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        sources = []
+        for number in range(args.articles):
+            source = os.path.join(work_dir, 'article-{0}'.format(number))
+            make_figures(source, args.figures, number)
+            sources.append(source)
+        before = sum(directory_size(source) for source in sources)
+        config = types.SimpleNamespace(use_image_cache=True,
+                                       image_cache=os.path.join(work_dir, 'cache'),
+                                       image_cache_size=None)
+        print('{0} articles, {1} figures each, {2:.1f} MiB'.format(args.articles,
+                                                                  args.figures,
+                                                                  before / 2 ** 20))
+        print('{0:<10} {1:>10} {2:>10} {3:>12}'.format('profile', 'MiB', 'cold s',
+                                                      'cached s'))
+        for name in args.profile:
+            profile = transcode.get_profile(name)
+            cold, after = run(sources, work_dir, profile, config)
+            cached, _after = run(sources, work_dir, profile, config)
+            print('{0:<10} {1:>10.1f} {2:>10.2f} {3:>12.2f}'.format(name, after / 2 ** 20,
+                                                                  cold, cached))
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -18,10 +18,12 @@ setup(name='openaccess_epub',
       url='https://github.com/SavinaRoja/openaccess_epub',
       package_dir={'': 'src'},
       packages=['openaccess_epub',
-                'openaccess_epub.ncx', 'openaccess_epub.opf',
-                'openaccess_epub.ops', 'openaccess_epub.utils'],
+                'openaccess_epub.ncx', 'openaccess_epub.nlm_transform',
+                'openaccess_epub.opf', 'openaccess_epub.ops',
+                'openaccess_epub.utils'],
       package_data={'openaccess_epub': ['data/dtds/*/*.*',
-                                        'data/dtds/*/*/*.*']},
+                                        'data/dtds/*/*/*.*',
+                                        'data/*.xsl']},
       scripts=['scripts/oaepub', 'scripts/epubzip', 'scripts/oae-quickstart', 'scripts/dtdvalidate'],
       data_files=[('', ['README.md'])],
       classifiers=['Development Status :: 3 - Alpha',
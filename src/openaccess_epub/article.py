@@ -1,36 +1,142 @@
 # -*- coding: utf-8 -*-
 #oaepub modules
-from openaccess_epub import JPTS10_PATH, JPTS11_PATH, JPTS20_PATH,\
-    JPTS21_PATH, JPTS22_PATH, JPTS23_PATH, JPTS30_PATH
 from openaccess_epub.utils import element_methods
+from openaccess_epub.utils.dtds import dtd_tuple, dtds, registry, parse,\
+    get_parser
+from openaccess_epub.utils.validation import validate
 #Standard lib modules
 import os
+import io
 import sys
+import zlib
 import shutil
 import logging
 from collections import namedtuple
-from keyword import iskeyword
 #Other, nonstandard lib modules
 from lxml import etree
 
 log = logging.getLogger('Article')
 
-dtd_tuple = namedtuple('DTD_Tuple', 'path, name, version')
+#A picklable snapshot of an Article: the zlib-compressed serialization of the
+#document (with its DOCTYPE), and the flat values computed from it
+ArticleSnapshot = namedtuple('ArticleSnapshot', 'xml, public_id, dtd_name, \
+dtd_version, doi, publisher, lazy_metadata')
 
-dtds = {'-//NLM//DTD Journal Archiving and Interchange DTD v1.0 20021201//EN':
-        dtd_tuple(JPTS10_PATH, 'JPTS', 1.0),
-        '-//NLM//DTD Journal Archiving and Interchange DTD v1.1 20031101//EN':
-        dtd_tuple(JPTS11_PATH, 'JPTS', 1.1),
-        '-//NLM//DTD Journal Publishing DTD v2.0 20040830//EN':
-        dtd_tuple(JPTS20_PATH, 'JPTS', 2.0),
-        '-//NLM//DTD Journal Publishing DTD v2.1 20050630//EN':
-        dtd_tuple(JPTS21_PATH, 'JPTS', 2.1),
-        '-//NLM//DTD Journal Publishing DTD v2.2 20060430//EN':
-        dtd_tuple(JPTS22_PATH, 'JPTS', 2.2),
-        '-//NLM//DTD Journal Publishing DTD v2.3 20070202//EN':
-        dtd_tuple(JPTS23_PATH, 'JPTS', 2.3),
-        '-//NLM//DTD Journal Publishing DTD v3.0 20080202//EN':
-        dtd_tuple(JPTS30_PATH, 'JPTS', 3.0)}
+#The structure of an Article shared by NCX, OPF and OPS, see get_outline(): the
+#OutlineNodes of the body, the lists of the <table> elements and of the <ref>
+#elements of the back matter, and a dictionary of the elements of the body and
+#back matter by id
+ArticleOutline = namedtuple('ArticleOutline', 'sections, tables, refs, ids')
+
+#A <sec>, <fig> or <table-wrap> element which is a child of the body or of a
+#<sec> in the outline, and the OutlineNodes of its own such children
+OutlineNode = namedtuple('OutlineNode', 'element, children')
+
+#The tags of the elements in the OutlineNodes
+OUTLINE_TAGS = ('sec', 'fig', 'table-wrap')
+
+#Metadata record classes, keyed by (type name, field names)
+_record_classes = {}
+
+
+def record_class(type_name, field_names):
+    """
+    Returns the namedtuple class used to pack metadata elements with the given
+    type name and field names. Each class is created once per process and then
+    reused for every element of that kind, rather than creating a throwaway
+    class for every element in every article.
+    """
+    key = (type_name, field_names)
+    try:
+        return _record_classes[key]
+    except KeyError:
+        cls = namedtuple(type_name, field_names)
+        _record_classes[key] = cls
+        return cls
+
+
+def pack_attributes(element, model):
+    """
+    Returns the dictionary of attribute values for a metadata element, keyed
+    by the attribute names declared in its DTD. Undeclared values are None.
+    """
+    attrs = {}
+    for key, attr_lookup, prefix, name in model.attributes:
+        if attr_lookup is None:
+            attr_lookup = '{'+element.nsmap[prefix]+'}'+name
+        #Not worrying about implied defaults right now
+        attrs[key] = element.attrib.get(attr_lookup)
+    return attrs
+
+
+#Maps of field name to (child tag, multiple) for LazyRecord, keyed by model
+_lazy_fields = {}
+
+
+class LazyRecord(object):
+    """
+    A metadata record which packs its fields only when they are first accessed,
+    after which they are memoized. It has the same fields as the namedtuple
+    records produced by eager packing (node, attrs, child elements, and text),
+    and its children are LazyRecords in turn.
+    """
+    __slots__ = ('node', '_model', '_content_model', '_values', '_children')
+
+    def __init__(self, element, content_model):
+        self.node = element
+        self._content_model = content_model
+        self._model = content_model[element.tag]
+        self._values = {}
+        self._children = None
+
+    @property
+    def _fields(self):
+        return self._model.field_names
+
+    def __getattr__(self, name):
+        #Private names are never fields; this also keeps unset slots from
+        #recursing into __getattr__
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self._values[name]
+        except KeyError:
+            pass
+        value = self._pack(name)
+        self._values[name] = value
+        return value
+
+    def _pack(self, name):
+        model = self._model
+        if name == 'attrs':
+            return pack_attributes(self.node, model)
+        if name == 'text' and model.pcdata:
+            return element_methods.all_text(self.node)
+        key = (model.type_name, model.field_names)
+        try:
+            fields = _lazy_fields[key]
+        except KeyError:
+            #Child fields follow node and attrs in the field names
+            fields = dict(zip(model.field_names[2:], model.children))
+            _lazy_fields[key] = fields
+        try:
+            child_tag, multiple = fields[name]
+        except KeyError:
+            raise AttributeError('{0} has no field {1}'.format(model.type_name, name))
+        if self._children is None:
+            #Collect the children by tag in a single pass
+            self._children = {}
+            for child in self.node:
+                self._children.setdefault(child.tag, []).append(child)
+        found = self._children.get(child_tag, [])
+        if multiple:
+            return [LazyRecord(i, self._content_model) for i in found]
+        elif found:
+            return LazyRecord(found[0], self._content_model)
+        return None
+
+    def __repr__(self):
+        return '<LazyRecord {0} at {1:#x}>'.format(self._model.type_name, id(self))
 
 
 class Article(object):
@@ -41,34 +147,54 @@ class Article(object):
     also be implemented. This class will be later passed to OPF and NCX for
     structural/metadata translation and to OPS for content translation.
     """
-    def __init__(self, xml_file, validation=True):
+    def __init__(self, xml_file, validation=True, lazy_metadata=False,
+                 validation_cache=None):
         log.info('Parsing file: {0}'.format(xml_file))
 
-        #Parse the document
-        self.document = etree.parse(xml_file)
+        #Parse the document, never touching the network
+        self.document = parse(xml_file)
 
         #Find its public id so we can identify the appropriate DTD
         public_id = self.document.docinfo.public_id
 
-        #Instantiate an lxml.etree.DTD class from the dtd files in our data
+        #Get the lxml.etree.DTD class from the process-wide registry, it is
+        #only compiled the first time its public id is seen
         try:
-            dtd = dtds[public_id]
+            dtd = registry.spec(public_id)
         except KeyError as err:
             print('Document published according to unsupported specification. \
 Please contact the maintainers of OpenAccess_EPUB.')
             raise err  # We can proceed no further without the DTD
         else:
-            self.dtd = etree.DTD(dtd.path)
+            self.dtd = registry.get(public_id)
             self.dtd_name, self.dtd_version = dtd.name, dtd.version
 
-        #If using a supported DTD type, execute validation
+        #If using a supported DTD type, execute validation. A ValidationCache
+        #skips validation of files whose result is already known
         if validation:
-            if not self.dtd.validate(self.document):
+            if validation_cache is None:
+                result = validate(self.dtd, self.document)
+            else:
+                result = validation_cache.validate(self.dtd, self.document,
+                                                   public_id, xml_file)
+            if not result.passed:
                 print('The document {0} did not pass validation according to \
 its DTD.'.format(xml_file))
-                print(self.dtd.error_log.filter_from_errors())
+                print(result.errors)
                 sys.exit(1)
 
+        self.load_elements(lazy_metadata)
+
+        #Attempt, as well as possible, to identify the publisher and doi for
+        #the article.
+        self.doi = self.get_DOI()
+        self.publisher = self.get_publisher()
+
+    def load_elements(self, lazy_metadata):
+        """
+        Defines the key top-level elements of the parsed document and
+        translates its metadata into a data structure.
+        """
         #Get basic elements, per DTD (and version if necessary)
         if self.dtd_name == 'JPTS':
             self.front = self.document.find('front')  # Element: mandatory
@@ -79,155 +205,162 @@ its DTD.'.format(xml_file))
         
         #At this point we have parsed the article, validated it, defined key
         #top-level elements in it, and now we must translate its metadata into
-        #a data structure.
+        #a data structure. With lazy_metadata, elements are packed on demand.
+        self.lazy_metadata = lazy_metadata
         self.metadata = self.get_metadata()
+        self.contributors = None
+        self.outline = None
 
-        #Attempt, as well as possible, to identify the publisher and doi for
-        #the article.
-        self.doi = self.get_DOI()
-        self.publisher = self.get_publisher()
+    def snapshot(self):
+        """
+        Returns an ArticleSnapshot, a compact and picklable representation of
+        the Article, which may be handed to another process or stored and
+        turned back into an Article with Article.from_snapshot().
+        """
+        xml = etree.tostring(self.document, encoding='utf-8',
+                             xml_declaration=True)
+        return ArticleSnapshot(zlib.compress(xml),
+                               self.document.docinfo.public_id,
+                               self.dtd_name,
+                               self.dtd_version,
+                               self.doi,
+                               self.publisher,
+                               self.lazy_metadata)
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """
+        Creates an Article from an ArticleSnapshot. The snapshot was taken of an
+        Article that had already been parsed and validated, so the document is
+        not validated again, and the DOI and publisher are taken as they are.
+        """
+        article = cls.__new__(cls)
+        xml = io.BytesIO(zlib.decompress(snapshot.xml))
+        article.document = etree.parse(xml, get_parser())
+        article.dtd = registry.get(snapshot.public_id)
+        article.dtd_name = snapshot.dtd_name
+        article.dtd_version = snapshot.dtd_version
+        article.load_elements(snapshot.lazy_metadata)
+        article.doi = snapshot.doi
+        article.publisher = snapshot.publisher
+        return article
+
+    def __reduce__(self):
+        #Pickle by way of a snapshot
+        return (self.__class__.from_snapshot, (self.snapshot(),))
 
     def get_metadata(self):
-        
-        #Dictionary comprehension - element name : element definition
-        dtd_dict = {i.name: i for i in self.dtd.elements()}
-        
-        def coerce_string(input):
-            for char in input:
-                if char.lower() not in 'abcdefghijklmnopqrstuvwxyz1234567890_':
-                    input = input.replace(char, '_')
-            return input
-        
-        eltuple = namedtuple('ElTuple', 'tag, occurrence')
-        
-        def get_sub_elements(content, multiple=False, first=None):
-            sub_elements = []  #The final list of tuples to be returned
-
-            #The first level of recursion is special, and we need not be
-            #concerned with inheriting plurality from an upper branch.
-            if first:
-                if content is None:
-                    return []
-                elif content.type == 'pcdata':
-                    #If an element can only contain pcdata (text), look no more
-                    return([eltuple('pcdata', 'multiple')])
-                elif content.type in ['seq', 'or']:
-                    if content.occur in ['mult', 'plus']:  # Pass on multiple
-                        sub_elements += get_sub_elements(content, multiple=True)
-                    else:  # Don't pass on multiple
-                        sub_elements += get_sub_elements(content, multiple=False)
-                elif content.type == 'element':  # May only contain one kind of element
-                    if content.occur in ['mult', 'plus']:
-                        return [eltuple(content.name, 'multiple')]
-                    else:
-                        return [eltuple(content.name, 'singular')]
-
-            #This is for everything that is not the first point of recursion
-            else:
-                for branch in [content.left, content.right]:
-                    if branch is not None:
-                        #PCDATA is a special case, look no deeper, always multiple
-                        if branch.type == 'pcdata':
-                            sub_elements.append(eltuple('pcdata', 'multiple'))
-                        #"seq" and "or" are sequence types, their plurality may
-                        #be passed down to internal structures. Plurality is
-                        #never lost, only gained.
-                        elif branch.type in ['seq', 'or']:
-                            if multiple or branch.occur in ['mult', 'plus']:
-                                sub_elements += get_sub_elements(branch, multiple=True)
-                            else:
-                                sub_elements += get_sub_elements(branch, multiple=False)
-                        elif branch.type == 'element':
-                            if multiple or branch.occur in ['mult', 'plus']:
-                                sub_elements.append(eltuple(branch.name, 'multiple'))
-                            else:
-                                sub_elements.append(eltuple(branch.name, 'singular'))
-
-            return sub_elements
-        
+        """
+        Packs the metadata elements of the article into a hierarchical
+        namedtuple structure according to the content model of its DTD. The
+        content model table is computed once per DTD, so this is a single walk
+        over the elements of the article.
+
+        If the Article was created with lazy_metadata, the structure is made of
+        LazyRecords instead, which pack only the fields that are accessed.
+        """
+        content_model = registry.content_model(self.document.docinfo.public_id)
+
         def recursive_element_packing(element):
             if element is None:
                 return None
-            tagname = element.tag
-            element_def = dtd_dict[tagname]
-            #Create lists for field names and field values
-            field_names = []
-            field_vals = []
-            #Create a self reference, named node, value is the element itself
-            field_names.append('node')
-            field_vals.append(element)
-            #Handle attributes
-            attrs = {}  # Dict to hold attributes
-            field_names.append('attrs')  # namedtuple attribute to receive dict
+            model = content_model[element.tag]
+            #The first field is a self reference, named node
+            field_vals = [element]
             #Compose the attrs dict with appropriate keys and values
-            for attribute in element_def.iterattributes():
-                if attribute.prefix:
-                    if attribute.prefix == 'xmlns':  # Pseudo-attribute
-                        continue
-                    elif attribute.prefix == 'xml':
-                        attr_lookup = '{{http://www.w3.org/XML/1998/namespace}}{0}'.format(attribute.name)
-                    else:
-                        attr_lookup = '{'+element.nsmap[attribute.prefix]+'}'+attribute.name
-                    key = '{0}:{1}'.format(attribute.prefix, attribute.name)
-                else:
-                    key = attribute.name
-                    attr_lookup = key
-                #Add the value of the attribute to list of field values
-                try:
-                    value = element.attrib[attr_lookup]
-                except KeyError:
-                    attrs[key] = None  # Not worrying about implied defaults right now
-                    #field_vals.append(None
+            field_vals.append(pack_attributes(element, model))
+            #Collect the children by tag in a single pass
+            children = {}
+            for child in element:
+                children.setdefault(child.tag, []).append(child)
+            for child_tag, multiple in model.children:
+                found = children.get(child_tag, [])
+                if multiple:
+                    field_vals.append([recursive_element_packing(i) for i in found])
+                elif found:
+                    field_vals.append(recursive_element_packing(found[0]))
                 else:
-                    attrs[key] = value
-            #Add the attrs dict to field values
-            field_vals.append(attrs)
-            #Get the sub_elements for the element
-            sub_elements = get_sub_elements(element_def.content, first=True)
-            get_text = False  # A control variable, used later if PCDATA in content model
-            for sub_element in sub_elements:
-                #We have the sub elements according to tag and occurrence
-                if sub_element.tag == 'pcdata':
-                    get_text = True
-                    continue
-                if sub_element.occurrence == 'multiple':
-                    child_tag = sub_element.tag
-                    child_list = []
-                    for each in element.findall(child_tag):
-                        child_list.append(recursive_element_packing(each))
-                    field_names.append(child_tag)
-                    field_vals.append(child_list)
-                else:
-                    child_tag = sub_element.tag
-                    child_element = element.find(child_tag)
-                    if child_element is not None:
-                        child = recursive_element_packing(child_element)
-                    else:
-                        child = None
-                    field_names.append(child_tag)
-                    field_vals.append(child)
-            if get_text:
-                field_names.append('text')
+                    field_vals.append(None)
+            if model.pcdata:
                 field_vals.append(element_methods.all_text(element))
 
-            #Make items in field_names safe for namedtuple
-            #Coerce characters in string
-            field_names = [coerce_string(i) for i in field_names]
-            #Prepend 'l' to reserved keywords for element tagname
-            if iskeyword(tagname):
-                tagname = 'l' + tagname
-            #Prepend 'l' to reserved keywords for sub_elements
-            field_names = ['l'+i if iskeyword(i) else i for i in field_names]
-
-            data_tuple = namedtuple(coerce_string(tagname), ', '.join(field_names))
+            data_tuple = record_class(model.type_name, model.field_names)
             return data_tuple(*field_vals)
 
+        def lazy_element_packing(element):
+            if element is None:
+                return None
+            return LazyRecord(element, content_model)
+
+        if self.lazy_metadata:
+            packing = lazy_element_packing
+        else:
+            packing = recursive_element_packing
+
         if self.dtd_name == 'JPTS':
-            metadata_tuple = namedtuple('Metadata', 'front, back')
-            front = recursive_element_packing(self.front)
-            back = recursive_element_packing(self.back)
+            metadata_tuple = record_class('Metadata', ('front', 'back'))
+            front = packing(self.front)
+            back = packing(self.back)
             return metadata_tuple(front, back)
 
+    def get_contributors(self, contrib_type):
+        """
+        Returns the list of contrib metadata elements of the given contrib-type
+        (such as 'author' or 'editor') in document order. All of the contrib
+        elements are indexed by type on the first call, so that OPS, OPF and
+        NCX share a single walk of the contrib-groups.
+        """
+        if self.contributors is None:
+            self.contributors = {}
+            if self.dtd_name == 'JPTS':
+                for contrib_group in self.metadata.front.article_meta.contrib_group:
+                    for contrib in contrib_group.contrib:
+                        contrib_type_attr = contrib.attrs['contrib-type']
+                        self.contributors.setdefault(contrib_type_attr, []).append(contrib)
+        return self.contributors.get(contrib_type, [])
+
+    def get_outline(self):
+        """
+        Returns the ArticleOutline of the article, built in a single walk of the
+        body and back matter on the first call, so that NCX, OPF and OPS need
+        not search the document for its structure each on their own. This must
+        be done before OPS converts the article in place.
+
+        The sections are the tree of the sections of the body, with their
+        figures and tables, from which the NCX makes its navMap and lists. The
+        <sec> elements of the body which lack an id are given one, "OA-EPUB-0",
+        "OA-EPUB-1" and so on in document order, as the NCX and the OPS content
+        link to them.
+        """
+        if self.outline is None:
+            sections, tables, refs, ids = [], [], [], {}
+            id_int = 0
+            for part in self.document.getroot().iterchildren('body', 'back'):
+                #The children lists of the body and of the sections in the tree
+                children = {part: sections}
+                for element in part.iter(etree.Element):
+                    tag = element.tag
+                    if tag == 'sec' and part.tag == 'body':
+                        if 'id' not in element.attrib:
+                            element.attrib['id'] = 'OA-EPUB-{0}'.format(id_int)
+                            id_int += 1
+                    elif tag == 'table':
+                        tables.append(element)
+                    elif tag == 'ref' and part.tag == 'back':
+                        refs.append(element)
+                    if tag in OUTLINE_TAGS and part.tag == 'body':
+                        siblings = children.get(element.getparent())
+                        if siblings is not None:
+                            node = OutlineNode(element, [])
+                            siblings.append(node)
+                            if tag == 'sec':
+                                children[element] = node.children
+                    element_id = element.get('id')
+                    if element_id is not None:
+                        ids.setdefault(element_id, element)
+            self.outline = ArticleOutline(sections, tables, refs, ids)
+        return self.outline
+
     def get_publisher(self):
         """
         This function will attempt to identify the publisher of the article.
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Catalog Mode extracts only the Dublin Core metadata for a directory of article
+XML files, without producing any ePub output. Only the <front> of each article
+is parsed; parsing stops as soon as the end of <front> is reached. The result
+is written as one JSON record per line (JSONL).
+
+The metadata values are the same as those placed in the OPF by the publisher
+methods in openaccess_epub.opf.publisher_metadata.
+"""
+
+#oaepub modules
+from openaccess_epub.article import Article
+from openaccess_epub.utils.dtds import registry, iterparse, needs_dtd
+import openaccess_epub.opf.publisher_metadata as publisher_metadata
+#Standard lib modules
+import json
+import logging
+import traceback
+
+log = logging.getLogger('Catalog')
+
+#Prefixes of the publisher metadata methods, by publisher
+publisher_prefixes = {'PLoS': 'plos', 'Frontiers': 'frontiers'}
+
+
+class FrontMatter(Article):
+    """
+    An Article holding only the <front> of the document. The document is parsed
+    incrementally and parsing stops after </front>, so <body> and <back> are
+    never read. Metadata is always lazy, and no DTD validation is performed.
+    """
+    def __init__(self, xml_file):
+        log.info('Parsing front matter: {0}'.format(xml_file))
+        front = self.parse_front(xml_file)
+        if front is None:
+            raise ValueError('No <front> element found in {0}'.format(xml_file))
+        self.document = front.getroottree()
+
+        public_id = self.document.docinfo.public_id
+        dtd = registry.spec(public_id)  # KeyError if unsupported
+        self.dtd = registry.get(public_id)
+        self.dtd_name, self.dtd_version = dtd.name, dtd.version
+
+        self.load_elements(True)
+        self.doi = self.get_DOI()
+        self.publisher = self.get_publisher()
+
+    def load_elements(self, lazy_metadata=True):
+        """
+        Only the <front> is defined; the parser may have read ahead into the
+        rest of the document, but it is incomplete and is ignored.
+        """
+        self.front = self.document.find('front')
+        self.body = None
+        self.back = None
+        self.sub_article = []
+        self.response = []
+        self.lazy_metadata = True
+        self.metadata = self.get_metadata()
+        self.contributors = None
+        self.outline = None
+
+    @staticmethod
+    def parse_front(xml_file, load_dtd=False):
+        """
+        Parses the file up to the end of <front> and returns that element, or
+        None if there is no <front>. If the front uses entities defined by the
+        DTD, it is parsed again with the DTD loaded.
+        """
+        context = iterparse(xml_file, load_dtd=load_dtd, events=('end',),
+                            tag='front')
+        for _event, element in context:
+            if not load_dtd and needs_dtd(context.error_log):
+                return FrontMatter.parse_front(xml_file, load_dtd=True)
+            return element
+        return None
+
+
+def text(value):
+    """
+    Some publisher metadata methods return bytes from serialization, this
+    makes sure we have a string.
+    """
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return value
+
+
+def catalog_record(xml_file):
+    """
+    Returns a dictionary of the Dublin Core metadata for an article, suitable
+    for serialization to JSON. Failures produce a record with an "error" key
+    rather than raising, so that one bad file does not stop a catalog run.
+    """
+    try:
+        article = FrontMatter(xml_file)
+        prefix = publisher_prefixes[article.publisher]
+
+        def dc(name):
+            method = getattr(publisher_metadata, '{0}_dc_{1}'.format(prefix, name))
+            return method(article)
+
+        return {'file': xml_file,
+                'doi': article.doi,
+                'title': text(dc('title')),
+                'creators': [{'name': text(c.name), 'role': c.role,
+                              'file_as': text(c.file_as)}
+                             for c in dc('creator')],
+                'contributors': [{'name': text(c.name), 'role': c.role,
+                                  'file_as': text(c.file_as)}
+                                 for c in dc('contributor')],
+                'dates': [{'year': d.year, 'month': d.month, 'day': d.day,
+                           'event': d.event} for d in dc('date')],
+                'subjects': [text(s) for s in dc('subject')],
+                'publisher': dc('publisher'),
+                'language': dc('language')}
+    except (Exception, SystemExit) as err:
+        log.debug(traceback.format_exc())
+        return {'file': xml_file,
+                'error': '{0}: {1}'.format(type(err).__name__, err)}
+
+
+def write_catalog(records, catalog_file):
+    """
+    Writes each record to the open catalog_file as a line of JSON. Returns the
+    count of records written and the count of those that were errors.
+    """
+    written, errors = 0, 0
+    for record in records:
+        catalog_file.write(json.dumps(record, ensure_ascii=False))
+        catalog_file.write('\n')
+        written += 1
+        if 'error' in record:
+            errors += 1
+    return written, errors
@@ -13,16 +13,24 @@ import shutil
 import logging
 import traceback
 import subprocess
+import multiprocessing
+import time
 
 #OpenAccess_EPUB Modules
 from ._version import __version__
 import openaccess_epub.utils as utils
 import openaccess_epub.utils.input as u_input
 from openaccess_epub.utils.images import get_images
+from openaccess_epub.utils.prefetch import prefetch
+import openaccess_epub.utils.transcode as transcode
 import openaccess_epub.opf as opf
 import openaccess_epub.ncx as ncx
 import openaccess_epub.ops as ops
 from openaccess_epub.article import Article
+from openaccess_epub.utils.dtds import registry, sniff_public_id
+from openaccess_epub.catalog import catalog_record, write_catalog
+import openaccess_epub.utils.validation as validation
+import openaccess_epub.nlm_transform.citation as citation
 
 CACHE_LOCATION = utils.cache_location()
 LOCAL_DIR = os.getcwd()
@@ -58,6 +66,56 @@ def OAEParser():
                                 file(s). This is advised only for use on files
                                 that have already been validated by dtdvalidate
                                 or otherwise.''')
+    parser.add_argument('--no-validation-cache', action='store_false',
+                        default=True,
+                        help='''Use this to always perform DTD-validation,
+                                rather than reusing the results stored for
+                                files that have been validated before.''')
+    parser.add_argument('--citation-cache', action='store_true',
+                        default=False,
+                        help='''Use this to keep formatted citations in a
+                                cache between runs, so that works cited by
+                                many articles are only formatted once.''')
+    parser.add_argument('-w', '--workers', action='store', type=int,
+                        default=None,
+                        help='''Specify the number of worker processes used in
+                                Parallel Batch Input Mode. Defaults to the
+                                number of CPUs on the system.''')
+    parser.add_argument('--ops-backend', action='store',
+                        choices=['python', 'xslt'], default='python',
+                        help='''Select how the article content is converted
+                                for the ePub. "python" (the default) converts
+                                it element by element for each publisher,
+                                "xslt" renders it with the bundled NLM
+                                ViewNLM stylesheet.''')
+    parser.add_argument('--split-main', action='store', type=int,
+                        default=None, metavar='KB',
+                        help='''Split the main document of each article into
+                                several documents of about KB kilobytes,
+                                between its top-level sections, so that
+                                large articles open quickly on e-readers. 0
+                                places each top-level section in a document
+                                of its own.''')
+    parser.add_argument('--mathml', action='store_true', default=False,
+                        help='''Place formulas which are given in MathML in
+                                the ePub as MathML, rather than as images;
+                                their images are not downloaded. Formulas
+                                without MathML are still given as images.''')
+    parser.add_argument('--prefetch', action='store', type=int, default=0,
+                        metavar='K',
+                        help='''In Batch Input Mode and Collection Input Mode,
+                                download the images of the next K articles
+                                into the image cache while each article is
+                                converted. Requires the image cache and image
+                                fetching to be enabled in the config file.''')
+    parser.add_argument('--image-profile', action='store', default=None,
+                        metavar='PROFILE',
+                        help='''Transcode the images of the ePub for a device
+                                profile: "e-ink", "tablet", "original" (which
+                                only converts TIFF and recompresses), or one
+                                defined by image_profiles in the config file.
+                                Images larger than the device's screen are
+                                downscaled. Requires Pillow.''')
     modes = parser.add_mutually_exclusive_group()
     modes.add_argument('-i', '--input', action='store', default=False,
                        help='''Input may be a path to a local directory, a
@@ -81,10 +139,21 @@ def OAEParser():
                                Typing a string after this flag will provide a
                                title for the collection. If no title is given,
                                the main script may ask for one.''')
-    modes.add_argument('-cI', '--clear-image-cache', action='store_true',
-                       default=False, help='''Clears the image cache''')
-    modes.add_argument('-cC', '--clear-cache', action='store_true',
-                       default=False, help='''Clears the entire cache''')
+    modes.add_argument('-k', '--catalog', action='store', default=False,
+                       help='''Use to specify a directory of article XML files
+                               for which only the metadata will be extracted,
+                               to a JSONL file named catalog.jsonl.''')
+    modes.add_argument('--cache-stats', action='store_true', default=False,
+                       help='''Print the size of the image cache, the number
+                               of articles and images in it, and when they
+                               were last used.''')
+    modes.add_argument('--cache-prune', action='store', default=False,
+                       nargs='?', const=True, metavar='SIZE',
+                       help='''Remove the images of the articles used least
+                               recently from the image cache until it is no
+                               larger than SIZE, such as 500M or 20G. If no
+                               size is given, the image_cache_size of the
+                               config file is used. 0 empties the cache.''')
     return parser.parse_args()
 
 
@@ -115,17 +184,23 @@ def single_input(args, config=None):
     if 'http:' in args.input:
         raw_name = u_input.url_input(args.input)
         abs_input_path = os.path.join(LOCAL_DIR, raw_name+'.xml')
-        parsed_article = Article(abs_input_path, validation=args.no_dtd_validation)
+        parsed_article = Article(abs_input_path,
+                                 validation=args.no_dtd_validation,
+                                 validation_cache=get_validation_cache(args))
     #Fetch by DOI
     elif args.input[:4] == 'doi:':
         raw_name = u_input.doi_input(args.input)
         abs_input_path = os.path.join(LOCAL_DIR, raw_name+'.xml')
-        parsed_article = Article(abs_input_path, validation=args.no_dtd_validation)
+        parsed_article = Article(abs_input_path,
+                                 validation=args.no_dtd_validation,
+                                 validation_cache=get_validation_cache(args))
     #Local XML input
     else:
         abs_input_path = utils.get_absolute_path(args.input)
         raw_name = u_input.local_input(abs_input_path)
-        parsed_article = Article(abs_input_path, validation=args.no_dtd_validation)
+        parsed_article = Article(abs_input_path,
+                                 validation=args.no_dtd_validation,
+                                 validation_cache=get_validation_cache(args))
 
     #Generate the output path name, this will be the directory name for the
     #output. This output directory will later be zipped into an EPUB
@@ -136,7 +211,12 @@ def single_input(args, config=None):
               outdirect=output_name,
               explicit_images=args.images,   # Explicit image path
               batch=False,
-              config=config)
+              config=config,
+              in_place=True,
+              ops_backend=args.ops_backend,
+              split_size=args.split_main,
+              mathml=args.mathml,
+              image_profile=args.image_profile)
 
     #Cleanup removes the produced output directory, keeps the ePub file
     if args.clean:  # Defaults to False, --clean or -c to toggle on
@@ -166,49 +246,161 @@ def batch_input(args, config=None):
     """
     if config is None:
         config = get_config_module()
+    output_directory = utils.get_output_directory(args)
     error_file = open('batch_tracebacks.txt', 'w')
-    #Iterate over all listed files in the batch directory
-    for item in os.listdir(args.batch):
-        item_path = os.path.join(args.batch, item)
-        #Skip directories and files without .xml extension
-        _root, extension = os.path.splitext(item)
-        if not os.path.isfile(item_path):
-            continue
-        if not extension == '.xml':
-            continue
+    #Iterate over all listed files in the batch directory, prefetching the
+    #images of those ahead if --prefetch is given
+    for item_path in prefetch(list_xml_files(args.batch), config, args.prefetch,
+                              mathml=args.mathml):
         print(item_path)
-
-        #Parse the article
         try:
-            raw_name = u_input.local_input(item_path)
-        except:
+            batch_article(item_path, output_directory, args, config)
+        except (Exception, SystemExit):
+            error_file.write(item_path + '\n')
             traceback.print_exc(file=error_file)
-        else:
-            parsed_article = Article(os.path.join(args.batch, raw_name+'.xml'),
-                                     validation=args.no_dtd_validation)
+    error_file.close()
+    log.info('DTD registry: {0}'.format(registry.stats()))
+    cache = get_validation_cache(args)
+    if cache is not None:
+        log.info('Validation cache: {0} hits, {1} misses'.format(cache.hits,
+                                                                 cache.misses))
 
-        #Create the output name
-        output_name = os.path.join(utils.get_output_directory(args), raw_name)
 
-        #Make the EPUB
-        try:
-            make_epub(parsed_article,
-                      outdirect=output_name,
-                      explicit_images=None,   # No explicit image path
-                      batch=True,
-                      config=config)
-        except:
-            error_file.write(item_path + '\n')
-            traceback.print_exc(file=error_file)
+def batch_article(item_path, output_directory, args, config):
+    """
+    The unit of work shared by Batch Input Mode and Parallel Batch Input Mode.
+    The article is parsed, converted to ePub, its unzipped output is removed,
+    and epubcheck is called on the result unless disabled. Exceptions are left
+    to the caller so that a failure is confined to a single article.
+    """
+    raw_name = u_input.local_input(item_path)
+    parsed_article = Article(item_path, validation=args.no_dtd_validation,
+                             lazy_metadata=True,
+                             validation_cache=get_validation_cache(args))
 
+    #Create the output name
+    output_name = os.path.join(output_directory, raw_name)
+
+    #Make the EPUB
+    try:
+        make_epub(parsed_article,
+                  outdirect=output_name,
+                  explicit_images=None,   # No explicit image path
+                  batch=True,
+                  config=config,
+                  in_place=True,
+                  ops_backend=args.ops_backend,
+                  split_size=args.split_main,
+                  mathml=args.mathml,
+                  image_profile=args.image_profile)
+    finally:
         #Cleanup output directory, keeps EPUB and log
-        shutil.rmtree(output_name)
+        if os.path.isdir(output_name):
+            shutil.rmtree(output_name)
 
-        #Running epubcheck on the output verifies the validity of the ePub,
-        #requires a local installation of java and epubcheck.
-        if args.no_epubcheck:
-            epubcheck('{0}.epub'.format(output_name), config)
-    error_file.close()
+    #Running epubcheck on the output verifies the validity of the ePub,
+    #requires a local installation of java and epubcheck.
+    if args.no_epubcheck:
+        epubcheck('{0}.epub'.format(output_name), config)
+
+
+#Per-process state for Parallel Batch Input Mode, set by the pool initializer
+_worker_state = {}
+
+
+def _init_batch_worker(output_directory, args):
+    """
+    Pool initializer for Parallel Batch Input Mode. The config module cannot be
+    pickled, so each worker process loads its own copy once.
+    """
+    _worker_state['config'] = get_config_module()
+    _worker_state['output_directory'] = output_directory
+    _worker_state['args'] = args
+
+
+def _parallel_batch_worker(item_path):
+    """
+    Runs batch_article() inside a worker process. Returns a tuple of the input
+    path, success boolean, elapsed seconds, the formatted traceback (None on
+    success), and the validation cache hits and misses for the article.
+    Nothing is allowed to escape, so a single bad article cannot take down the
+    pool; Article calls sys.exit() on failed validation, hence SystemExit is
+    caught as well.
+    """
+    cache = get_validation_cache(_worker_state['args'])
+    hits, misses = (cache.hits, cache.misses) if cache is not None else (0, 0)
+    start = time.time()
+    trace = None
+    try:
+        batch_article(item_path,
+                      _worker_state['output_directory'],
+                      _worker_state['args'],
+                      _worker_state['config'])
+    except (Exception, SystemExit):
+        trace = traceback.format_exc()
+    elapsed = time.time() - start
+    if cache is not None:
+        hits, misses = cache.hits - hits, cache.misses - misses
+    return item_path, trace is None, elapsed, trace, hits, misses
+
+
+def parallel_batch_input(args, config=None):
+    """
+    Parallel Batch Input Mode is the same as Batch Input Mode, except that the
+    articles are distributed across a pool of worker processes (see --workers)
+    so that all of the system's CPUs may be used.
+
+    Each article is processed in isolation; if one fails, its traceback is
+    written to batch_tracebacks.txt and the rest of the batch continues. A
+    summary of throughput is printed when the batch is complete.
+    """
+    if config is None:
+        config = get_config_module()
+    output_directory = utils.get_output_directory(args)
+    xml_files = list_xml_files(args.parallel_batch)
+    workers = args.workers or multiprocessing.cpu_count()
+    workers = max(1, min(workers, len(xml_files) or 1))
+    print('Processing {0} articles with {1} workers'.format(len(xml_files),
+                                                           workers))
+    #Compile the DTDs in use before forking so the workers inherit them
+    registry.warm(sniff_public_id(xml_file) for xml_file in xml_files)
+    succeeded, failed = 0, 0
+    cache_hits, cache_misses = 0, 0
+    start = time.time()
+    error_file = open('batch_tracebacks.txt', 'w')
+    pool = multiprocessing.Pool(processes=workers,
+                                initializer=_init_batch_worker,
+                                initargs=(output_directory, args))
+    try:
+        results = pool.imap_unordered(_parallel_batch_worker, xml_files)
+        for item_path, success, elapsed, trace, hits, misses in results:
+            cache_hits += hits
+            cache_misses += misses
+            if success:
+                succeeded += 1
+                print('{0} ({1:.2f}s)'.format(item_path, elapsed))
+            else:
+                failed += 1
+                print('{0} FAILED, see batch_tracebacks.txt'.format(item_path))
+                error_file.write(item_path + '\n')
+                error_file.write(trace)
+                error_file.flush()
+        pool.close()
+    except KeyboardInterrupt:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        error_file.close()
+    total = time.time() - start
+    rate = (succeeded + failed) / total if total else 0.0
+    print('Parallel batch complete: {0} succeeded, {1} failed in {2:.1f}s \
+({3:.2f} articles/s with {4} workers)'.format(succeeded, failed, total, rate,
+                                              workers))
+    log.info('Parallel batch: {0} succeeded, {1} failed, {2:.1f}s'.format(succeeded, failed, total))
+    if get_validation_cache(args) is not None:
+        log.info('Validation cache: {0} hits, {1} misses'.format(cache_hits,
+                                                                 cache_misses))
 
 
 def collection_input(args, config=None):
@@ -276,9 +468,10 @@ def collection_input(args, config=None):
     myopf = opf.OPF(location=output_name, collection_mode=True, title=title)
 
     #Now it is time to operate on each of the xml files
-    for xml_file in xml_files:
+    for xml_file in prefetch(xml_files, config, args.prefetch):
         raw_name = u_input.local_input(xml_file)  # is this used?
-        parsed_article = Article(xml_file, validation=args.no_dtd_validation)
+        parsed_article = Article(xml_file, validation=args.no_dtd_validation,
+                                 validation_cache=get_validation_cache(args))
         toc.take_article(parsed_article)
         myopf.take_article(parsed_article)
     
@@ -292,17 +485,15 @@ def collection_input(args, config=None):
         if os.path.isdir(expected_local):
             utils.images.local_images(expected_local, img_dir)
         else:
-            article_cache = os.path.join(config.image_cache, journal_doi, article_doi)
-            if os.path.isdir(article_cache):
-                utils.images.image_cache(article_cache, img_dir)
-            else:
+            image_cache = utils.image_cache.config_cache(config)
+            if not image_cache.place(doi, img_dir):
                 print('Images for {0} (DOI: {1}) could not be found!'.format(xml_file, doi))
                 r = input('Try to download them? [Y/n]')
                 if r in ['y', 'Y', '']:
                     os.mkdir(img_dir)
                     utils.images.fetch_plos_images(article_doi, img_dir, parsed_article)
                     if config.use_image_cache:
-                        utils.images.move_images_to_cache(img_dir, article_cache)
+                        image_cache.store(doi, img_dir)
                 else:
                     sys.exit(1)
 
@@ -322,6 +513,102 @@ def collection_input(args, config=None):
         epubcheck('{0}.epub'.format(output_name), config)
 
 
+def catalog_input(args, config=None):
+    """
+    Catalog Input Mode extracts the Dublin Core metadata (as it would be placed
+    in the OPF) for every article XML file in a directory, without producing
+    any ePub output. Only the <front> of each article is parsed.
+
+    The output is written to catalog.jsonl in the output directory, one JSON
+    record per article; articles that could not be processed get a record with
+    an "error" key. The work is distributed across worker processes, see
+    --workers.
+    """
+    output_directory = utils.get_output_directory(args)
+    xml_files = list_xml_files(args.catalog)
+    workers = args.workers or multiprocessing.cpu_count()
+    workers = max(1, min(workers, len(xml_files) or 1))
+    catalog_path = os.path.join(output_directory, 'catalog.jsonl')
+    print('Cataloging {0} articles with {1} workers to {2}'.format(len(xml_files),
+                                                                  workers,
+                                                                  catalog_path))
+    #Compile the DTDs in use before forking so the workers inherit them
+    registry.warm(sniff_public_id(xml_file) for xml_file in xml_files)
+    start = time.time()
+    with open(catalog_path, 'w', encoding='utf-8') as catalog_file:
+        if workers == 1:
+            written, errors = write_catalog(map(catalog_record, xml_files),
+                                            catalog_file)
+        else:
+            pool = multiprocessing.Pool(processes=workers)
+            try:
+                #Files are small and quick, so send them out in chunks
+                chunksize = max(1, min(256, len(xml_files) // (workers * 4)))
+                records = pool.imap_unordered(catalog_record, xml_files,
+                                              chunksize)
+                written, errors = write_catalog(records, catalog_file)
+                pool.close()
+            except KeyboardInterrupt:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+    total = time.time() - start
+    rate = written / total if total else 0.0
+    print('Catalog complete: {0} records, {1} errors in {2:.1f}s \
+({3:.0f} articles/s)'.format(written, errors, total, rate))
+
+
+def cache_stats(args, config=None):
+    """
+    Prints a summary of the image cache.
+    """
+    if config is None:
+        config = get_config_module()
+    image_cache = utils.image_cache.config_cache(config)
+    stats = image_cache.stats()
+    size = utils.image_cache.format_size
+    print('Image cache: {0}'.format(image_cache.root))
+    print('Articles:    {0}'.format(stats.articles))
+    print('Images:      {0} ({1} distinct)'.format(stats.files,
+                                                  stats.blobs - stats.transcodes))
+    print('Transcodes:  {0}'.format(stats.transcodes))
+    print('Size:        {0} ({1} without sharing)'.format(size(stats.size),
+                                                          size(stats.logical_size)))
+    if image_cache.max_size is None:
+        print('Size limit:  none')
+    else:
+        print('Size limit:  {0}'.format(size(image_cache.max_size)))
+    if stats.articles:
+        print('Last used:   {0} to {1}'.format(time.ctime(stats.oldest),
+                                               time.ctime(stats.newest)))
+
+
+def cache_prune(args, config=None):
+    """
+    Evicts the articles used least recently from the image cache until it is
+    within the size given to --cache-prune, or else the configured limit.
+    """
+    if config is None:
+        config = get_config_module()
+    image_cache = utils.image_cache.config_cache(config)
+    if args.cache_prune is True:
+        max_size = image_cache.max_size
+        if max_size is None:
+            sys.exit('No size was given, and image_cache_size is not set')
+    else:
+        try:
+            max_size = utils.image_cache.parse_size(args.cache_prune)
+        except ValueError as error:
+            sys.exit(str(error))
+        if max_size is None:
+            sys.exit('Please give a size to prune the image cache to')
+    evicted, freed = image_cache.prune(max_size)
+    size = utils.image_cache.format_size
+    print('Evicted {0} articles, freeing {1}'.format(evicted, size(freed)))
+    print('The image cache now takes {0}'.format(size(image_cache.size())))
+
+
 def zipped_input(args, config=None):
     """
     Zipped Input Mode is primarily intended as a workflow for Frontiers
@@ -331,12 +618,30 @@ def zipped_input(args, config=None):
         config = get_config_module()
 
 
-def make_epub(article, outdirect, explicit_images, batch, config=None):
+def make_epub(article, outdirect, explicit_images, batch, config=None,
+              in_place=False, ops_backend='python', split_size=None,
+              mathml=False, image_profile=None):
     """
     Encapsulates the primary processing work-flow. Before this method is
     called, pre-processing has occurred to define important directory and file
     locations. The article has been processed for metadata and now it is time
     to generate the ePub content.
+
+    If in_place is True, the article's content is moved into the OPS rather
+    than copied, saving time and memory, and the article should not be used
+    afterwards.
+
+    ops_backend selects the OPS content generator: 'python' for the publisher's
+    OPS class, or 'xslt' for OPSXSLT.
+
+    If split_size is given, the main document is split into chunks of about
+    split_size kilobytes, and the NCX and OPF are pointed to the chunks.
+
+    If mathml is True, formulas given in MathML are placed in the ePub as
+    MathML instead of images. The xslt backend does not support this.
+
+    If image_profile is given, the images are transcoded for that device
+    profile, see utils.transcode.
     """
     print('Processing output to {0}.epub'.format(outdirect))
     if config is None:
@@ -353,8 +658,18 @@ def make_epub(article, outdirect, explicit_images, batch, config=None):
     #Get the Digital Object Identifier
     DOI = article.get_DOI()
 
+    if mathml and ops_backend == 'xslt':
+        log.warning('MathML formulas are not supported by the xslt backend')
+        mathml = False
+
     #Get the images
-    get_images(DOI, outdirect, explicit_images, config, article)
+    get_images(DOI, outdirect, explicit_images, config, article, mathml)
+    img_dir = os.path.join(outdirect, 'OPS', 'images-{0}'.format(DOI.split('/')[1]))
+    renamed = False
+    if image_profile is not None and os.path.isdir(img_dir):
+        renamed = transcode.transcode_images(img_dir,
+                                             transcode.get_profile(image_profile, config),
+                                             config)
 
     toc = ncx.NCX(__version__, outdirect)
     myopf = opf.OPF(outdirect, False)
@@ -363,10 +678,21 @@ def make_epub(article, outdirect, explicit_images, batch, config=None):
     #While NCX and OPF adapt automatically to the publisher, here we must
     #distinguish between the publishers for the instantiation of the correct
     #publisher's OPS
-    if DOI.split('/')[0] == '10.1371':  # PLoS
-        ops_doc = ops.OPSPLoS(article, outdirect)
+    if ops_backend == 'xslt':
+        ops_doc = ops.OPSXSLT(article, outdirect, in_place,
+                              split_size=split_size)
+    elif DOI.split('/')[0] == '10.1371':  # PLoS
+        ops_doc = ops.OPSPLoS(article, outdirect, in_place, split_size, mathml)
     elif DOI.split('/')[0] == '10.3389':  # Frontiers
-        ops_doc = ops.OPSFrontiers(article, outdirect)
+        ops_doc = ops.OPSFrontiers(article, outdirect, in_place, split_size,
+                                   mathml)
+    #The main document may have been split, the later chunks follow it
+    if len(ops_doc.main_chunks) > 1:
+        toc.relocate(ops_doc.main_chunks[0], ops_doc.chunk_map)
+        myopf.add_chunks_to_spine(ops_doc.main_chunks[0], ops_doc.main_chunks[1:])
+    #Transcoding may have changed the extensions of images the OPS refers to
+    if renamed:
+        transcode.relink_images(os.path.join(outdirect, 'OPS'), img_dir)
     toc.write()
     myopf.write()
     utils.epub_zip(outdirect)
@@ -390,6 +716,16 @@ def epubcheck(epubname, config=None):
         epubname += '.epub'
     subprocess.call(['java', '-jar', config.epubcheck, epubname])
 
+def get_validation_cache(args):
+    """
+    Returns the shared ValidationCache unless it was disabled by the
+    --no-validation-cache flag, in which case None is returned.
+    """
+    if args.no_validation_cache:
+        return validation.get_cache()
+    return None
+
+
 def get_config_module():
     """
     If the config.py file exists, import it as a module. If it does not exist,
@@ -431,7 +767,23 @@ def main(args):
     
     #Import the config module, this fails and exits if it does not exist
     config = get_config_module()
+
+    #Persist the DTD content model tables between runs
+    registry.cache_dir = os.path.join(CACHE_LOCATION, 'dtd_cache')
+
+    #Formatted citations may also persist between runs
+    if args.citation_cache:
+        citation.formatter.store = citation.CitationStore(citation.default_store_path())
     
+    #Images are only transcoded for a known profile, and with Pillow
+    if args.image_profile is not None:
+        if args.image_profile not in transcode.profile_names(config):
+            sys.exit('Unknown image profile {0}, choose from: {1}'.format(args.image_profile,
+                                                                         ', '.join(transcode.profile_names(config))))
+        if transcode.Image is None:
+            print('Images will not be transcoded, as Pillow is not installed')
+            args.image_profile = None
+
     #Even if they don't plan on using the image cache, make sure it exists
     utils.images.make_image_cache(config.image_cache)  # User configurable
 
@@ -445,5 +797,11 @@ def main(args):
         parallel_batch_input(args, config)
     elif args.collection:  # Convert multiple XML articles into single EPUB
         collection_input(args, config)
-    elif args.zipped:  # Convert Frontiers zipfile into single EPUB
+    elif args.catalog:  # Extract metadata only, to JSONL
+        catalog_input(args, config)
+    elif args.zip:  # Convert Frontiers zipfile into single EPUB
         zipped_input(args, config)
+    elif args.cache_stats:  # Summarize the image cache
+        cache_stats(args, config)
+    elif args.cache_prune:  # Evict the least recently used images
+        cache_prune(args, config)
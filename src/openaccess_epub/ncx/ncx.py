@@ -135,47 +135,32 @@ e
             insertion_point = title.children
         else:
             insertion_point = self.nav_map
-        #Check if the article has a body element
-        body = self.article.body
-        if body is not None:
-            self.id_int = 0
-            #This step is executed as pre-processing, <sec> elements will receive
-            #an id attribute if they lack one
-            #This has a, helpful, side-effect when the Article is given to OPS
-            for sec in body.findall('.//sec'):
-                if 'id' not in sec.attrib:
-                    sec.attrib['id'] = 'OA-EPUB-{0}'.format(self.id_int)
-                    self.id_int += 1
-            #Recursively parse the structure of the input article and add to navmap
-            for nav_point in self.recursive_article_navmap(body):
-                insertion_point.append(nav_point)
+        #The outline gives an id attribute to the <sec> elements lacking one
+        #This has a, helpful, side-effect when the Article is given to OPS
+        outline = self.article.get_outline()
+        #Recursively add the sections of the article to the navmap
+        for nav_point in self.recursive_article_navmap(outline.sections):
+            insertion_point.append(nav_point)
         #Add a navpoint for the references, if there are references
-        if self.article.back is not None:
-            if self.article.back.findall('ref'):
-                id = 'references-{0}'.format(self.article_doi)
-                label = 'References'
-                source = 'biblio.{0}.xml#references'.format(self.article_doi)
-                references = navpoint(id, label, self.pull_play_order(), source, [])
-                insertion_point.append(references)
+        if outline.refs:
+            id = 'references-{0}'.format(self.article_doi)
+            label = 'References'
+            source = 'biblio.{0}.xml#references'.format(self.article_doi)
+            references = navpoint(id, label, self.pull_play_order(), source, [])
+            insertion_point.append(references)
 
-    def recursive_article_navmap(self, src_element, depth=0, first=True):
+    def recursive_article_navmap(self, nodes, depth=0, first=True):
         """
-        This function recursively traverses the content of an input article to
-        add the correct elements to the NCX file's navMap and Lists.
+        This function recursively traverses the OutlineNodes of the sections of
+        an input article, see Article.get_outline(), to add the correct
+        elements to the NCX file's navMap and Lists.
         """
         #TODO: This may need modification for non JPTS
         if depth > self.maxdepth:
             self.maxdepth = depth
         navpoints = []
-        tagnames = ['sec', 'fig', 'table-wrap']
-        for child in src_element:
-            try:
-                tagname = child.tag
-            except AttributeError:  # Text nodes have no attribute tagName
-                continue
-            else:
-                if tagname not in tagnames:
-                    continue
+        for child, child_nodes in nodes:
+            tagname = child.tag
             source_id = child.attrib['id']
             #In single mode, use the id as it is
             if not self.collection_mode:
@@ -193,7 +178,7 @@ e
             source = 'main.{0}.xml#{1}'.format(self.article_doi, source_id)
             if tagname == 'sec':
                 play_order = self.pull_play_order()
-                children = self.recursive_article_navmap(child, depth=depth+1)
+                children = self.recursive_article_navmap(child_nodes, depth=depth+1)
                 new_nav = navpoint(child_id, label, play_order, source, children)
                 navpoints.append(new_nav)
             #figs and table-wraps do not have children
@@ -205,6 +190,32 @@ e
                 self.list_of_tables.append(new_nav)
         return navpoints
 
+    def relocate(self, main_name, chunk_map):
+        """
+        Points the navPoints and navTargets to the ids of the main document
+        main_name which have been placed in another document, as when it is
+        split into chunks by OPS; chunk_map gives the name of the document for
+        each id which has been moved.
+        """
+        def relocated(source):
+            document, _sep, source_id = source.partition('#')
+            if document == main_name and source_id in chunk_map:
+                return '{0}#{1}'.format(chunk_map[source_id], source_id)
+            return source
+
+        def relocate_navpoints(navpoints):
+            return [nav._replace(source=relocated(nav.source),
+                                 children=relocate_navpoints(nav.children))
+                    for nav in navpoints]
+
+        if not chunk_map:
+            return
+        self.nav_map = relocate_navpoints(self.nav_map)
+        self.list_of_figures = [nav._replace(source=relocated(nav.source))
+                                for nav in self.list_of_figures]
+        self.list_of_tables = [nav._replace(source=relocated(nav.source))
+                               for nav in self.list_of_tables]
+
     def extract_article_metadata(self):
         """
         This method calls set_publisher_metadata_methods to ensure that
@@ -251,7 +262,6 @@ e
         self.article_doi = ''
         self.journal_doi = ''
         self.play_order = 1
-        self.id_int = 0
         self.maxdepth = 0
         self.nav_map = []
 
@@ -407,8 +417,7 @@ to the relaxed constraints of OPS 2.0'''))
         #Generate the List of Tables
         self.make_list_of_tables()
         filename = os.path.join(self.location, 'OPS', 'toc.ncx')
-        with open(filename, 'wb') as output:
-            output.write(etree.tostring(self.document, encoding='utf-8'))
+        utils.write_xml(self.document, filename)
 
     def pull_play_order(self):
         """
@@ -6,171 +6,707 @@ content for display in an ePub.
 
 Reference material may be found here:
 https://github.com/PLOS/ambra/blob/master/base/src/main/resources/viewnlm-v2.3.xsl
+
+The same works are cited by many articles, so formatted citations are
+memoized by a fingerprint of the citation: the citation type and the
+whitespace-normalized serialization of the citation element, which does not
+include the id or label of the <ref>. The memo is an LRU cache shared by all
+articles in the process, and may be backed by a CitationStore, an SQLite
+database in the cache location, so that citations are formatted once across
+runs.
 """
 
+import openaccess_epub.utils
+import openaccess_epub.utils.element_methods as element_methods
+from collections import OrderedDict
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
 from lxml import etree
 
-class CitationFormatter(object):
+log = logging.getLogger('nlm_transform.citation')
+
+#Increment this when the formatting changes, it is part of every fingerprint
+#so that stored citations in the old format are no longer used
+FORMAT_VERSION = 3
+
+#The tags of the citation elements in the Tag Suite versions
+CITATION_TAGS = ('element-citation', 'mixed-citation', 'citation',
+                 'nlm-citation')
+
+#The Tag Suite's inline formatting elements, and their xhtml analogues as
+#(tag, style), as for the emphasis elements in OPSMeta.JPTS_emphasis
+INLINE_TAGS = {'italic': ('i', None),
+               'bold': ('b', None),
+               'sup': ('sup', None),
+               'sub': ('sub', None),
+               'sc': ('span', 'font-variant:small-caps'),
+               'underline': ('span', 'text-decoration:underline'),
+               'monospace': ('span', 'font-family:monospace')}
+
+#The Tag Suite's linking elements, made into <a> elements wherever they are
+LINK_TAGS = ('ext-link', 'uri')
+
+
+def get_citation(ref):
     """
-    
-    """
-
-    def __init__(self):
-        pass
-
-def format_citation(citation, citation_type=None):
-    """
-    This method may be built to support elements from different Tag Suite
-    versions with the following tag names:
-        citation, element-citation, mixed-citation, and nlm-citation
-
-    The citation-type attribute is optional, and may also be empty; if it has a
-    value then it should appear in the following prescribed list, or it will be
-    treated as 'other'.
-
-    book          Book or book series
-    commun        Informal or personal communication, such as a phone call or
-                  an email message
-    confproc      Conference proceedings
-    discussion    Discussion among a group in some forum — public, private, or
-                  electronic — which may or may not be moderated, for example,
-                  a single discussion thread in a listserv
-    gov           Government publication or government standard
-    journal       Journal article
-    list          Listserv or discussion group (as an entity, as opposed to a
-                  single discussion thread which uses the value “discussion”)
-    other         None of the listed types.
-    patent        Patent or patent application
-    thesis        Work written as part of the completion of an advanced degree
-    web           Website
-
-    This method will accept a passed citation_type argument which will override
-    checking of the element's citation-type attribute and force the formatting
-    according to the passed string value. Note that this may not be appropriate
-    in many cases.
-    """
-    cite_types = {'book': self.format_book_citation,
-                  'commun': self.format_commun_citation,
-                  'confproc': self.format_confproc_citation,
-                  'discussion': self.format_discussion_citation,
-                  'gov': self.format_gov_citation,
-                  'journal': self.format_journal_citation,
-                  'list': self.format_list_citation,
-                  'other': self.format_other_citation,
-                  'patent': self.format_patent_citation,
-                  'thesis': self.format_thesis_citation,
-                  'web': self.format_web_citation,
-                  '': self.format_other_citation,  # Empty becomes 'other'
-                  None: self.format_other_citation}  # None becomes 'other'
-
-    #Only check if no citation_type value is passed
-    if citation_type is None:
-        #Get the citation-type attribute value
-        if 'citation-type' in nlm_citation.attrib:
-            citation_type = nlm_citation.attrib['citation-type']
-
-    #Pass the citation to the appropriate function and return result
-    return cite_types[citation_type](citation)
-
-    @staticmethod
-    def format_book_citation(self, citation):
+    Returns the citation element of a <ref>, or None if it has none.
+    """
+    for child in ref:
+        if child.tag in CITATION_TAGS:
+            return child
+    return None
+
+
+def get_citation_type(citation):
+    """
+    Returns the type of the citation from its publication-type (JPTS 3.0) or
+    citation-type attribute. The type is 'other' if it is missing, empty or
+    not one of the prescribed values.
+    """
+    for name in ['publication-type', 'citation-type']:
+        value = citation.attrib.get(name)
+        if value:
+            break
+    if value not in CitationFormatter.citation_types:
+        return 'other'
+    return value
+
+
+def fingerprint(citation, citation_type):
+    """
+    Returns the key by which the formatted citation is memoized.
+    """
+    xml = etree.tostring(citation, encoding='unicode', with_tail=False)
+    key = '{0}\n{1}\n{2}'.format(FORMAT_VERSION, citation_type, ' '.join(xml.split()))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def normalized_text(element):
+    """
+    Returns all of the text beneath the element, with whitespace normalized.
+    """
+    return ' '.join(''.join(element.itertext()).split())
+
+
+def sentence(text):
+    """
+    Adds a period to the end of the text unless it already has some final
+    punctuation.
+    """
+    text = text.strip()
+    if text and text[-1] not in '.?!':
+        text += '.'
+    return text
+
+
+class CitationStore(object):
+    """
+    Stores and retrieves formatted citations by fingerprint in an SQLite
+    database. The connection is opened lazily and reopened in a new process,
+    so an instance may be created before forking worker processes.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._connection = None
+        self._pid = None
+
+    @property
+    def connection(self):
+        if self._connection is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            self._connection = sqlite3.connect(self.path, timeout=60,
+                                               check_same_thread=False)
+            self._connection.execute('''CREATE TABLE IF NOT EXISTS citations
+                                        (fingerprint TEXT PRIMARY KEY,
+                                         xhtml TEXT NOT NULL,
+                                         stored REAL)''')
+            self._connection.commit()
+            self._pid = os.getpid()
+        return self._connection
+
+    def lookup(self, key):
         """
-        citation-type=\"book\"
+        Returns the stored xhtml for the fingerprint, or None.
         """
+        row = self.connection.execute('''SELECT xhtml FROM citations
+                                         WHERE fingerprint=?''',
+                                      (key,)).fetchone()
+        if row is None:
+            return None
+        return row[0]
 
-        #Get the count of authors
-        author_group_count = int(citation.xpath('count(person-group) + count(collab)'))
-        #Detect if there are non-authors
-        if citation.xpath('person-group[@person-group-type!=\'author\']'):
-            non_authors = True
-        else:
-            non_authors= False
-        #Detect article-title
-        if citation.xpath('article-title'):
-            article_title = True
+    def store(self, key, xhtml):
+        """
+        Records the xhtml for the fingerprint.
+        """
+        with self.connection:
+            self.connection.execute('''INSERT OR REPLACE INTO citations
+                                       VALUES (?, ?, ?)''',
+                                    (key, xhtml, time.time()))
+
+    def clear(self):
+        """
+        Removes all stored citations.
+        """
+        with self.connection:
+            self.connection.execute('DELETE FROM citations')
+
+
+def default_store_path():
+    return os.path.join(openaccess_epub.utils.cache_location(),
+                        'citation_cache.sqlite')
+
+
+class CitationFormatter(object):
+    """
+    Formats Tag Suite citation elements as xhtml, dispatching on the type of
+    the citation. Results are memoized in an LRU cache of up to maxsize
+    citations, and in the CitationStore if one is given.
+    """
+    #The prescribed values of citation-type, see format_citation()
+    citation_types = ('book', 'commun', 'confproc', 'discussion', 'gov',
+                      'journal', 'list', 'other', 'patent', 'thesis', 'web')
+
+    #The parts of a citation appended by append_authors_and_year() and
+    #append_links(), and by the formatters for each type of citation
+    common_parts = ('person-group', 'name', 'string-name', 'collab', 'etal',
+                    'year', 'season', 'month', 'day', 'pub-id') + LINK_TAGS
+    pages_parts = ('fpage', 'lpage', 'elocation-id')
+    journal_parts = common_parts + pages_parts + ('article-title', 'source',
+                                                  'volume', 'issue')
+    book_parts = common_parts + pages_parts + ('chapter-title', 'article-title',
+                                               'source', 'edition', 'publisher-loc',
+                                               'publisher-name', 'size')
+    patent_parts = common_parts + ('article-title', 'source', 'patent')
+    web_parts = common_parts + ('article-title', 'source', 'date-in-citation',
+                                'access-date')
+
+    def __init__(self, maxsize=4096, store=None):
+        self.maxsize = maxsize
+        self.store = store
+        self.memo = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.cite_types = {'book': self.format_book_citation,
+                           'commun': self.format_other_citation,
+                           'confproc': self.format_confproc_citation,
+                           'discussion': self.format_web_citation,
+                           'gov': self.format_book_citation,
+                           'journal': self.format_journal_citation,
+                           'list': self.format_web_citation,
+                           'other': self.format_other_citation,
+                           'patent': self.format_patent_citation,
+                           'thesis': self.format_book_citation,
+                           'web': self.format_web_citation}
+
+    def format_ref(self, ref):
+        """
+        Returns a new <p> with the label and formatted citation of a <ref>,
+        with the ref's id.
+        """
+        ref_p = etree.Element('p')
+        if 'id' in ref.attrib:
+            ref_p.attrib['id'] = ref.attrib['id']
+        label = ref.find('label')
+        if label is not None:
+            ref_p.text = normalized_text(label) + ' '
+        citation = get_citation(ref)
+        if citation is None:  # Fall back to the text of the ref
+            element_methods.append_new_text(ref_p, normalized_text(ref), join_str='')
         else:
-            article_title = False
-        #Find out if there is at least one author or compiler
-        auth_or_comp = False
-        for person_group in citation.findall('person-group'):
-            if 'person-group-type' in person_group.attrib:
-                if person_group.attrib['person-group-type'] in ['author', 'compiler']:
-                    auth_or_comp = True
-                    break
-
-        #These pieces of information allow us to provide two special use cases
-        #and one general use case.
-        #First special case:
-        if author_group_count > 0 and non_authors and article_title:
-            pass
-
-        #Second special case
-        elif auth_or_comp:
-            pass
-
-        #General case
+            ref_p.append(self.format_citation(citation))
+        return ref_p
+
+    def format_citation(self, citation, citation_type=None):
+        """
+        This method may be built to support elements from different Tag Suite
+        versions with the following tag names:
+            citation, element-citation, mixed-citation, and nlm-citation
+
+        The citation-type attribute is optional, and may also be empty; if it
+        has a value then it should appear in the following prescribed list,
+        or it will be treated as 'other'.
+
+        book          Book or book series
+        commun        Informal or personal communication, such as a phone
+                      call or an email message
+        confproc      Conference proceedings
+        discussion    Discussion among a group in some forum — public,
+                      private, or electronic — which may or may not be
+                      moderated, for example, a single discussion thread in a
+                      listserv
+        gov           Government publication or government standard
+        journal       Journal article
+        list          Listserv or discussion group (as an entity, as opposed
+                      to a single discussion thread which uses the value
+                      “discussion”)
+        other         None of the listed types.
+        patent        Patent or patent application
+        thesis        Work written as part of the completion of an advanced
+                      degree
+        web           Website
+
+        This method will accept a passed citation_type argument which will
+        override checking of the element's citation-type attribute and force
+        the formatting according to the passed string value. Note that this
+        may not be appropriate in many cases.
+
+        Returns a new <span class="citation"> element.
+        """
+        if citation_type is None:
+            citation_type = get_citation_type(citation)
+        key = fingerprint(citation, citation_type)
+        xhtml = self.lookup(key)
+        if xhtml is None:
+            #mixed-citation carries its own punctuation and spacing
+            if citation.tag == 'mixed-citation':
+                span = self.format_mixed_citation(citation)
+            else:
+                span = self.cite_types[citation_type](citation)
+            xhtml = etree.tostring(span, encoding='unicode')
+            self.remember(key, xhtml)
+            return span
+        return etree.fromstring(xhtml)
+
+    def lookup(self, key):
+        """
+        Returns the memoized xhtml for the fingerprint, from the LRU cache or
+        the store, or None.
+        """
+        with self._lock:
+            try:
+                xhtml = self.memo[key]
+            except KeyError:
+                pass
+            else:
+                self.memo.move_to_end(key)
+                self.hits += 1
+                return xhtml
+        if self.store is not None:
+            xhtml = self.store.lookup(key)
+            if xhtml is not None:
+                with self._lock:
+                    self.hits += 1
+                self.remember(key, xhtml, stored=True)
+                return xhtml
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def remember(self, key, xhtml, stored=False):
+        """
+        Adds the xhtml to the LRU cache, and to the store unless it came from
+        there.
+        """
+        with self._lock:
+            self.memo[key] = xhtml
+            self.memo.move_to_end(key)
+            while len(self.memo) > self.maxsize:
+                self.memo.popitem(last=False)
+        if self.store is not None and not stored:
+            self.store.store(key, xhtml)
+
+    def clear(self):
+        """
+        Empties the LRU cache.
+        """
+        with self._lock:
+            self.memo.clear()
+
+    #Building blocks of the formatted citations
+
+    def new_span(self):
+        span = etree.Element('span')
+        span.attrib['class'] = 'citation'
+        return span
+
+    def append_text(self, span, text):
+        if text:
+            element_methods.append_new_text(span, text, join_str='')
+
+    def append_rich(self, span, element, tag=None, style=None):
+        """
+        Appends the content of the element to the span, keeping its inline
+        formatting. If tag is given, the content is wrapped in a new element
+        with that tag, and the style attribute if style is given.
+        """
+        if tag is not None:
+            span = etree.SubElement(span, tag)
+            if style is not None:
+                span.attrib['style'] = style
+        self.append_text(span, element.text)
+        for child in element:
+            if not isinstance(child.tag, str):  # Comments, PIs
+                pass
+            elif child.tag in INLINE_TAGS:
+                self.append_rich(span, child, *INLINE_TAGS[child.tag])
+            elif child.tag in LINK_TAGS:
+                self.append_link(span, child)
+            else:
+                self.append_rich(span, child)
+            self.append_text(span, child.tail)
+
+    def append_sentence(self, span, element, tag=None):
+        """
+        Appends the rich content of the element followed by a period, unless
+        it ends with some other punctuation, and a space.
+        """
+        if element is None:
+            return
+        text = normalized_text(element)
+        if not text:
+            return
+        self.append_rich(span, element, tag)
+        if text[-1] not in '.?!':
+            self.append_text(span, '.')
+        self.append_text(span, ' ')
+
+    def format_name(self, name):
+        """
+        Formats a <name> as the surname followed by the initials of the given
+        names, as in "Smith JQ".
+        """
+        surname = name.find('surname')
+        given_names = name.find('given-names')
+        parts = []
+        if surname is not None and surname.text:
+            parts.append(' '.join(surname.text.split()))
+        if given_names is not None and given_names.text:
+            given = given_names.text.replace('.', ' ').split()
+            if all(g.isupper() for g in given):  # Given as initials
+                parts.append(''.join(given))
+            else:
+                parts.append(''.join(g[0] for g in given))
+        suffix = name.find('suffix')
+        if suffix is not None and suffix.text:
+            parts.append(suffix.text.strip().rstrip('.'))
+        return ' '.join(parts)
+
+    def person_names(self, citation, group_type='author'):
+        """
+        Returns the names in the person-group of the given type as a list of
+        strings. Citations without person-groups (Tag Suite 2) hold the
+        names of the authors directly.
+        """
+        groups = [g for g in citation.findall('person-group')
+                  if g.attrib.get('person-group-type', 'author') == group_type]
+        if groups:
+            containers = groups
+        elif group_type == 'author':
+            containers = [citation]
         else:
-            pass
+            return []
+        names = []
+        for container in containers:
+            for person in container:
+                if person.tag in ('name', 'string-name'):
+                    if person.find('surname') is not None:
+                        names.append(self.format_name(person))
+                    else:
+                        names.append(normalized_text(person))
+                elif person.tag == 'collab':
+                    names.append(normalized_text(person))
+                elif person.tag == 'etal':
+                    names.append('et al.')
+        return [n for n in names if n]
 
-    @staticmethod
-    def format_commun_citation(self, citation):
+    def append_authors_and_year(self, span, citation):
         """
-        citation-type=\"commun\"
+        Appends the authors of the citation and its year in parentheses, as
+        in "Smith JQ, Doe J (2001) ".
         """
+        authors = self.person_names(citation)
+        if authors:
+            self.append_text(span, ', '.join(authors) + ' ')
+        year = citation.find('year')
+        if year is not None and normalized_text(year):
+            date = [normalized_text(year)]
+            for part in ('season', 'month', 'day'):
+                element = citation.find(part)
+                if element is not None and normalized_text(element):
+                    date.append(normalized_text(element))
+            self.append_text(span, '({0}) '.format(' '.join(date)))
 
-    @staticmethod
-    def format_confproc_citation(self, citation):
+    def append_pages(self, span, citation, prefix=''):
         """
-        citation-type=\"confproc\"
+        Appends the pages of the citation, as a range if there is an lpage, or
+        else its elocation-id, as for articles which have no page numbers.
         """
+        fpage = citation.find('fpage')
+        lpage = citation.find('lpage')
+        if fpage is None or not normalized_text(fpage):
+            elocation = citation.find('elocation-id')
+            if elocation is None or not normalized_text(elocation):
+                return False
+            self.append_text(span, prefix + normalized_text(elocation))
+            return True
+        pages = normalized_text(fpage)
+        if lpage is not None and normalized_text(lpage):
+            pages = '{0}–{1}'.format(pages, normalized_text(lpage))
+        self.append_text(span, prefix + pages)
+        return True
 
-    @staticmethod
-    def format_discussion_citation(self, citation):
+    def append_link(self, span, link_element):
         """
-        citation-type=\"discussion\"
+        Appends an <ext-link> or <uri> as an <a> element, linking to its href
+        or else to its text. Returns False if it has neither.
         """
+        href = None
+        for name, value in link_element.attrib.items():
+            if name.endswith('href'):
+                href = value
+        text = normalized_text(link_element)
+        if not (href or text):
+            return False
+        link = etree.SubElement(span, 'a')
+        link.attrib['href'] = href or text
+        link.text = text or href
+        return True
 
-    @staticmethod
-    def format_gov_citation(self, citation):
+    def append_links(self, span, citation):
         """
-        citation-type=\"gov\"
+        Appends the DOI of the citation as a link, its other identifiers, and
+        its other links. Links within the other parts of the citation, such as
+        a <comment>, are made in place by append_remaining().
         """
+        for pub_id in citation.findall('pub-id'):
+            if not pub_id.text or not pub_id.text.strip():
+                continue
+            pub_id_type = pub_id.attrib.get('pub-id-type')
+            if pub_id_type == 'doi':
+                doi = pub_id.text.strip()
+                self.append_text(span, ' doi:')
+                link = etree.SubElement(span, 'a')
+                link.attrib['href'] = 'http://dx.doi.org/{0}'.format(doi)
+                link.text = doi
+            else:
+                self.append_text(span, ' {0}:{1}'.format(pub_id_type or 'id',
+                                                         pub_id.text.strip()))
+        for link_element in citation:
+            if link_element.tag not in LINK_TAGS:
+                continue
+            self.append_text(span, ' Available: ')
+            if self.append_link(span, link_element):
+                self.append_text(span, '.')
+
+    def append_remaining(self, span, citation, formatted):
+        """
+        Appends each child of the citation whose tag is not in formatted, such
+        as a <comment> or a <conf-date>, as a sentence with its inline
+        formatting and links, so that no part of the citation is lost.
+        """
+        for child in citation:
+            if not isinstance(child.tag, str) or child.tag in formatted:
+                continue
+            text = normalized_text(child)
+            if not text:
+                continue
+            self.append_text(span, ' ')
+            self.append_rich(span, child)
+            if text[-1] not in '.?!':
+                self.append_text(span, '.')
+
+    #Formatting by type of citation
 
-    @staticmethod
     def format_journal_citation(self, citation):
         """
         citation-type=\"journal\"
+
+        Smith JQ, Doe J (2001) Title of the article. Source 1(2): 10–20.
         """
+        span = self.new_span()
+        self.append_journal_parts(span, citation)
+        self.finish(span)
+        self.append_remaining(span, citation, self.journal_parts)
+        self.append_links(span, citation)
+        return span
 
-    @staticmethod
-    def format_list_citation(self, citation):
+    def append_journal_parts(self, span, citation):
         """
-        citation-type=\"list\"
+        Appends the authors, year, title, source, volume, issue and pages.
         """
-    @staticmethod
-    def format_other_citation(self, citation):
+        self.append_authors_and_year(span, citation)
+        self.append_sentence(span, citation.find('article-title'))
+        source = citation.find('source')
+        if source is not None:
+            self.append_rich(span, source)
+        volume = citation.find('volume')
+        if volume is not None and normalized_text(volume):
+            self.append_text(span, ' ' + normalized_text(volume))
+            issue = citation.find('issue')
+            if issue is not None and normalized_text(issue):
+                self.append_text(span, '({0})'.format(normalized_text(issue)))
+            self.append_pages(span, citation, prefix=': ')
+        else:
+            self.append_pages(span, citation, prefix=' ')
+
+    def format_book_citation(self, citation):
         """
-        citation-type=\"other\"
+        citation-type=\"book\", also used for \"thesis\" and \"gov\"
+
+        Smith JQ (2001) Title of the chapter. In: Doe J, editors. Source.
+        Location: Publisher. pp. 10–20.
         """
+        span = self.new_span()
+        self.append_authors_and_year(span, citation)
+        chapter = citation.find('chapter-title')
+        if chapter is None:
+            chapter = citation.find('article-title')
+        if chapter is not None:
+            self.append_sentence(span, chapter)
+            editors = self.person_names(citation, 'editor')
+            if editors:
+                self.append_text(span, 'In: {0}, editors. '.format(', '.join(editors)))
+        self.append_sentence(span, citation.find('source'))
+        edition = citation.find('edition')
+        if edition is not None:
+            self.append_text(span, sentence(normalized_text(edition)) + ' ')
+        location = citation.find('publisher-loc')
+        publisher = citation.find('publisher-name')
+        if location is not None and publisher is not None:
+            self.append_text(span, '{0}: {1}. '.format(normalized_text(location),
+                                                       normalized_text(publisher)))
+        elif publisher is not None:
+            self.append_text(span, sentence(normalized_text(publisher)) + ' ')
+        elif location is not None:
+            self.append_text(span, sentence(normalized_text(location)) + ' ')
+        if not self.append_pages(span, citation, prefix='pp. '):
+            size = citation.find('size')
+            if size is not None:
+                self.append_text(span, '{0} p'.format(normalized_text(size)))
+        self.finish(span)
+        self.append_remaining(span, citation, self.book_parts)
+        self.append_links(span, citation)
+        return span
+
+    def format_confproc_citation(self, citation):
+        """
+        citation-type=\"confproc\"
+
+        Smith JQ (2001) Title of the paper. Conference name; Location. pp. 10–20.
+        """
+        span = self.new_span()
+        self.append_authors_and_year(span, citation)
+        self.append_sentence(span, citation.find('article-title'))
+        formatted = self.common_parts + self.pages_parts + ('article-title',)
+        conference = citation.find('conf-name')
+        if conference is None:
+            conference = citation.find('source')
+        if conference is not None:
+            self.append_rich(span, conference)
+            formatted += (conference.tag,)
+            location = citation.find('conf-loc')
+            if location is not None:
+                self.append_text(span, '; ' + normalized_text(location))
+                formatted += ('conf-loc',)
+            self.append_text(span, '. ')
+        self.append_pages(span, citation, prefix='pp. ')
+        self.finish(span)
+        self.append_remaining(span, citation, formatted)
+        self.append_links(span, citation)
+        return span
 
-    @staticmethod
     def format_patent_citation(self, citation):
         """
         citation-type=\"patent\"
+
+        Smith JQ (2001) Title of the patent. Source. Patent number.
         """
+        span = self.new_span()
+        self.append_authors_and_year(span, citation)
+        self.append_sentence(span, citation.find('article-title'))
+        self.append_sentence(span, citation.find('source'))
+        patent = citation.find('patent')
+        if patent is not None:
+            self.append_sentence(span, patent)
+        self.finish(span)
+        self.append_remaining(span, citation, self.patent_parts)
+        self.append_links(span, citation)
+        return span
 
-    @staticmethod
-    def format_thesis_citation(self, citation):
+    def format_web_citation(self, citation):
         """
-        citation-type=\"thesis\"
+        citation-type=\"web\", also used for \"discussion\" and \"list\"
+
+        Smith JQ (2001) Title of the page. Source. Available: http://...
+        Accessed 1 January 2012.
         """
-        #Treat the same as "book"
-        return format_book_citation(citation)
+        span = self.new_span()
+        self.append_authors_and_year(span, citation)
+        self.append_sentence(span, citation.find('article-title'))
+        self.append_sentence(span, citation.find('source'))
+        self.finish(span)
+        self.append_remaining(span, citation, self.web_parts)
+        self.append_links(span, citation)
+        accessed = citation.find('date-in-citation')
+        if accessed is None:
+            accessed = citation.find('access-date')
+        if accessed is not None and normalized_text(accessed):
+            self.append_text(span, ' ' + sentence(normalized_text(accessed)))
+        return span
 
-    @staticmethod
-    def format_web_citation(self, citation):
+    def format_other_citation(self, citation):
+        """
+        citation-type=\"other\", also used for \"commun\"
+
+        Formatted as for a journal article, followed by the text of any other
+        parts of the citation as sentences.
+        """
+        span = self.new_span()
+        self.append_journal_parts(span, citation)
+        self.finish(span)
+        self.append_remaining(span, citation, self.journal_parts)
+        self.append_links(span, citation)
+        return span
+
+    def format_mixed_citation(self, citation):
+        """
+        Formats a citation which contains its own punctuation, by its text
+        with inline formatting kept and whitespace normalized.
         """
-        citation-type=\"web\"
+        span = self.new_span()
+        self.append_rich(span, citation)
+        for element in span.iter():
+            if element.text:
+                element.text = re.sub(r'\s+', ' ', element.text)
+            if element.tail and element is not span:
+                element.tail = re.sub(r'\s+', ' ', element.tail)
+        if span.text:
+            span.text = span.text.lstrip()
+        self.finish(span)
+        return span
+
+    def finish(self, span):
+        """
+        Removes trailing whitespace from the span and makes sure that it ends
+        with some final punctuation.
         """
+        last = element_methods.last_child(span)
+        if last is None:
+            span.text = (span.text or '').rstrip() or None
+        else:
+            last.tail = (last.tail or '').rstrip() or None
+        text = ''.join(span.itertext()).rstrip()
+        if text and text[-1] not in '.?!':
+            self.append_text(span, '.')
+
 
+#The formatter shared by all articles in the process
+formatter = CitationFormatter()
 
+
+def format_ref(ref):
+    """
+    Formats a <ref> with the shared CitationFormatter, see
+    CitationFormatter.format_ref().
+    """
+    return formatter.format_ref(ref)
@@ -23,7 +23,7 @@ import os
 import time
 import uuid
 from lxml import etree
-from openaccess_epub.utils import OrderedSet
+from openaccess_epub.utils import OrderedSet, write_xml
 from .publisher_metadata import *
 from collections import namedtuple
 
@@ -273,7 +273,8 @@ xmlns:oebpackage="http://openebook.org/namespaces/oeb-package/1.0/">
         mimetypes = {'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'xml':
                      'application/xhtml+xml', 'png': 'image/png', 'css':
                      'text/css', 'ncx': 'application/x-dtbncx+xml', 'gif':
-                     'image/gif', 'tif': 'image/tif', 'pdf': 'application/pdf'}
+                     'image/gif', 'tif': 'image/tiff', 'tiff': 'image/tiff',
+                     'pdf': 'application/pdf'}
         #Acquiring the current directory allows us to return there when complete
         #Thus avoiding problems relating call location, while allowing paths
         #to be relative to the 
@@ -307,22 +308,33 @@ xmlns:oebpackage="http://openebook.org/namespaces/oeb-package/1.0/">
         XML for the spine of the OPF file.
         """
         dashed_article_doi = self.article_doi.replace('.', '-')
+        outline = self.article.get_outline()
         #Add main, which should not be optional
         main_idref = 'main-{0}-xml'.format(dashed_article_doi)
         self.spine.append(spine_itemref(main_idref, 'yes'))
         #Create biblio idref
         biblio_idref = 'biblio-{0}-xml'.format(dashed_article_doi)
         #Add biblio idref if there is a bibliography
-        if self.article.back is not None:
-            if self.article.back.findall('.//ref'):
-                self.spine.append(spine_itemref(biblio_idref, 'yes'))
+        if outline.refs:
+            self.spine.append(spine_itemref(biblio_idref, 'yes'))
         #Create tables idref
         tables_idref = 'tables-{0}-xml'.format(dashed_article_doi)
         #Add the tables if there should be a tables file
-        tables = self.article.document.findall('.//table')
-        if tables:
+        if outline.tables:
             self.spine.append(spine_itemref(tables_idref, 'no'))
 
+    def add_chunks_to_spine(self, main_name, chunks):
+        """
+        Places the chunks of a main document which has been split by OPS
+        after it in the spine, in their order. main_name and chunks are file
+        names, the idrefs are made from them as in make_file_manifest.
+        """
+        main_idref = main_name.replace('.', '-')
+        idrefs = [itemref.idref for itemref in self.spine]
+        position = idrefs.index(main_idref) + 1
+        self.spine[position:position] = [spine_itemref(chunk.replace('.', '-'), 'yes')
+                                         for chunk in chunks]
+
     def make_spine_itemrefs(self):
         """
         This is responsible for creating the itemref elements in the OPF spine.
@@ -445,8 +457,7 @@ xmlns:oebpackage="http://openebook.org/namespaces/oeb-package/1.0/">
         self.make_spine_itemrefs()
         self.make_metadata_elements()
         filename = os.path.join(self.location, 'OPS', 'content.opf')
-        with open(filename, 'wb') as output:
-            output.write(etree.tostring(self.document, encoding='utf-8'))
+        write_xml(self.document, filename)
 
     def use_collection_mode(self):
         """Enables Collection Mode, sets self.collection_mode to True"""
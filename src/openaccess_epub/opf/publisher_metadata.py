@@ -63,33 +63,30 @@ def plos_dc_creator(article):
     This returns a list of Creator(name, role, file_as)
     """
     creator_list = []
-    for contrib_group in article.metadata.front.article_meta.contrib_group:
-        for contrib in contrib_group.contrib:
-            if not contrib.attrs['contrib-type'] == 'author':
-                continue
-            if contrib.collab:
-                auth = etree.tostring(contrib.collab[0].node, method='text', encoding='utf-8')
-                file_as = auth
-            elif contrib.anonymous:
-                auth = 'Anonymous'
-                file_as = auth
-            else:
-                name = contrib.name[0]  # Work with only first name listed
-                surname = name.surname.text
-                given = name.given_names
-                if given:  # Given is optional
-                    if given.text:  # Odd instances of empty tags
-                        auth = ' '.join([surname, given.text])
-                        given_initial = given.text[0]
-                        file_as = ', '.join([surname, given_initial])
-                    else:
-                        auth = surname
-                        file_as = auth
+    for contrib in article.get_contributors('author'):
+        if contrib.collab:
+            auth = etree.tostring(contrib.collab[0].node, method='text', encoding='utf-8')
+            file_as = auth
+        elif contrib.anonymous:
+            auth = 'Anonymous'
+            file_as = auth
+        else:
+            name = contrib.name[0]  # Work with only first name listed
+            surname = name.surname.text
+            given = name.given_names
+            if given:  # Given is optional
+                if given.text:  # Odd instances of empty tags
+                    auth = ' '.join([surname, given.text])
+                    given_initial = given.text[0]
+                    file_as = ', '.join([surname, given_initial])
                 else:
                     auth = surname
                     file_as = auth
-            new_creator = creator(auth, 'aut', file_as)
-            creator_list.append(new_creator)
+            else:
+                auth = surname
+                file_as = auth
+        new_creator = creator(auth, 'aut', file_as)
+        creator_list.append(new_creator)
     return creator_list
 
 
@@ -103,30 +100,27 @@ def plos_dc_contributor(article):
     This returns a list of Contributor(name, role, file_as)
     """
     contributor_list = []
-    for contrib_group in article.metadata.front.article_meta.contrib_group:
-        for contrib in contrib_group.contrib:
-            if not contrib.attrs['contrib-type'] == 'editor':
-                continue
-            if contrib.collab:
-                auth = etree.tostring(contrib.collab[0].node, method='text', encoding='utf-8')
-                file_as = auth
-            else:
-                name = contrib.name[0]  # Work with only first name listed
-                surname = name.surname.text
-                given = name.given_names
-                if given:  # Given is optional
-                    if given.text:  # Odd instances of empty tags
-                        auth = ' '.join([surname, given.text])
-                        given_initial = given.text[0]
-                        file_as = ', '.join([surname, given_initial])
-                    else:
-                        auth = surname
-                        file_as = auth
+    for contrib in article.get_contributors('editor'):
+        if contrib.collab:
+            auth = etree.tostring(contrib.collab[0].node, method='text', encoding='utf-8')
+            file_as = auth
+        else:
+            name = contrib.name[0]  # Work with only first name listed
+            surname = name.surname.text
+            given = name.given_names
+            if given:  # Given is optional
+                if given.text:  # Odd instances of empty tags
+                    auth = ' '.join([surname, given.text])
+                    given_initial = given.text[0]
+                    file_as = ', '.join([surname, given_initial])
                 else:
                     auth = surname
                     file_as = auth
-            new_contributor = contributor(auth, 'edt', file_as)
-            contributor_list.append(new_contributor)
+            else:
+                auth = surname
+                file_as = auth
+        new_contributor = contributor(auth, 'edt', file_as)
+        contributor_list.append(new_contributor)
     return contributor_list
 
 def plos_dc_publisher(article):
@@ -248,33 +242,30 @@ def frontiers_dc_creator(article):
     This returns a list of Creator(name, role, file_as)
     """
     creator_list = []
-    for contrib_group in article.metadata.front.article_meta.contrib_group:
-        for contrib in contrib_group.contrib:
-            if not contrib.attrs['contrib-type'] == 'author':
-                continue
-            if contrib.collab:
-                auth = etree.tostring(contrib.collab[0].node, method='text', encoding='utf-8')
-                file_as = auth
-            elif contrib.anonymous:
-                auth = 'Anonymous'
-                file_as = auth
-            else:
-                name = contrib.name[0]  # Work with only first name listed
-                surname = name.surname.text
-                given = name.given_names
-                if given:  # Given is optional
-                    if given.text:  # Odd instances of empty tags
-                        auth = ' '.join([surname, given.text])
-                        given_initial = given.text[0]
-                        file_as = ', '.join([surname, given_initial])
-                    else:
-                        auth = surname
-                        file_as = auth
+    for contrib in article.get_contributors('author'):
+        if contrib.collab:
+            auth = etree.tostring(contrib.collab[0].node, method='text', encoding='utf-8')
+            file_as = auth
+        elif contrib.anonymous:
+            auth = 'Anonymous'
+            file_as = auth
+        else:
+            name = contrib.name[0]  # Work with only first name listed
+            surname = name.surname.text
+            given = name.given_names
+            if given:  # Given is optional
+                if given.text:  # Odd instances of empty tags
+                    auth = ' '.join([surname, given.text])
+                    given_initial = given.text[0]
+                    file_as = ', '.join([surname, given_initial])
                 else:
                     auth = surname
                     file_as = auth
-            new_creator = creator(auth, 'aut', file_as)
-            creator_list.append(new_creator)
+            else:
+                auth = surname
+                file_as = auth
+        new_creator = creator(auth, 'aut', file_as)
+        creator_list.append(new_creator)
     return creator_list
 
 
@@ -288,30 +279,27 @@ def frontiers_dc_contributor(article):
     This returns a list of Contributor(name, role, file_as)
     """
     contributor_list = []
-    for contrib_group in article.metadata.front.article_meta.contrib_group:
-        for contrib in contrib_group.contrib:
-            if not contrib.attrs['contrib-type'] == 'editor':
-                continue
-            if contrib.collab:
-                auth = etree.tostring(contrib.collab[0].node, method='text', encoding='utf-8')
-                file_as = auth
-            else:
-                name = contrib.name[0]  # Work with only first name listed
-                surname = name.surname.text
-                given = name.given_names
-                if given:  # Given is optional
-                    if given.text:  # Odd instances of empty tags
-                        auth = ' '.join([surname, given.text])
-                        given_initial = given.text[0]
-                        file_as = ', '.join([surname, given_initial])
-                    else:
-                        auth = surname
-                        file_as = auth
+    for contrib in article.get_contributors('editor'):
+        if contrib.collab:
+            auth = etree.tostring(contrib.collab[0].node, method='text', encoding='utf-8')
+            file_as = auth
+        else:
+            name = contrib.name[0]  # Work with only first name listed
+            surname = name.surname.text
+            given = name.given_names
+            if given:  # Given is optional
+                if given.text:  # Odd instances of empty tags
+                    auth = ' '.join([surname, given.text])
+                    given_initial = given.text[0]
+                    file_as = ', '.join([surname, given_initial])
                 else:
                     auth = surname
                     file_as = auth
-            new_contributor = contributor(auth, 'edt', file_as)
-            contributor_list.append(new_contributor)
+            else:
+                auth = surname
+                file_as = auth
+        new_contributor = contributor(auth, 'edt', file_as)
+        contributor_list.append(new_contributor)
     return contributor_list
 
 def frontiers_dc_publisher(article):
@@ -3,3 +3,4 @@
 from openaccess_epub.ops.opsmeta import OPSMeta
 from openaccess_epub.ops.opsplos import OPSPLoS
 from openaccess_epub.ops.opsfrontiers import OPSFrontiers
+from openaccess_epub.ops.opsxslt import OPSXSLT
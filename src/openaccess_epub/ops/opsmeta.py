@@ -9,22 +9,70 @@ tag set and/or publisher must provide these functions.
 
 import openaccess_epub.utils as utils
 import openaccess_epub.utils.element_methods as element_methods
+from openaccess_epub.utils.element_methods import MATHML_NS
 from lxml import etree
+from copy import deepcopy
 import logging
+import os
 
 log = logging.getLogger('OPSMeta')
 
+OPS_NS = 'http://www.idpf.org/2007/ops'
+
+
+def estimated_size(element):
+    """
+    Returns an estimate of the size of the element serialized, with its tail,
+    from the lengths of its tags, attributes and text, so that it need not be
+    serialized to be measured.
+    """
+    size = 0
+    for each in element.iter():
+        if isinstance(each.tag, str):
+            size += 2 * len(each.tag) + 5  # <tag>...</tag>
+            for key, value in each.attrib.items():
+                size += len(key) + len(value) + 4  # key="value"
+        size += len(each.text or '') + len(each.tail or '')
+    return size
+
 
 class OPSMeta(object):
     """
     This class provides several baseline features and functions required in
     order to produce OPS content.
+
+    If in_place is True, the OPS content takes ownership of the article's
+    content: the body and the back matter are moved into the OPS documents
+    rather than copied, which leaves the Article unfit for further use. This
+    should be used when the Article is discarded after conversion.
+
+    If split_size is given, the main document is split into several documents
+    (chunks) of about split_size kilobytes, see write_main(). The names of the
+    chunks are kept in main_chunks, and the ids placed in chunks after the
+    first, with the name of their chunk, in chunk_map.
+
+    If mathml is True, formulas which are given in MathML are placed in the
+    OPS as MathML rather than as images, see convert_mathml_formula().
     """
-    def __init__(self, article):
+    def __init__(self, article, in_place=False, split_size=None, mathml=False):
         if article.dtd_name == 'JPTS':
             self.convert_emphasis_elements = self.convert_JPTS_emphasis
+        self.in_place = in_place
+        self.split_size = split_size
+        self.mathml = mathml
+        self.main_chunks = []
+        self.chunk_map = {}
         self.document = self.make_document('base')
 
+    def take(self, element):
+        """
+        Returns the article element for placement in an OPS document: a deep
+        copy of it, or in place mode, the element itself.
+        """
+        if self.in_place:
+            return element
+        return deepcopy(element)
+
     def make_document(self, titlestring):
         """
         This method may be used to create a new document for writing as xml
@@ -48,10 +96,201 @@ class OPSMeta(object):
 
     def write_document(self, name, document):
         """
-        This function will write a document to an XML file.
+        This function will write a document to an XML file, name may also be
+        an open binary file. The document is written incrementally, see
+        utils.write_xml().
+        """
+        if self.chunk_map:
+            self.relocate_links(document)
+        utils.write_xml(document, name)
+
+    def write_main(self, name, document):
+        """
+        Writes the main document to the file name. If split_size is set, the
+        document is first split between the top-level divisions of its body
+        (the heading, article info, sections and back matter), which are
+        gathered into chunks of no more than split_size kilobytes; a division
+        larger than that is given a chunk of its own, and a split_size of 0
+        gives each division its own chunk. Other top-level elements are kept
+        with the division before them.
+
+        The first chunk is written to name, the next to name with ".2", ".3"
+        and so on before its extension. Links to the ids in later chunks, in
+        this and the documents written after it, are pointed to their chunk.
+        """
+        directory, main_name = os.path.split(name)
+        self.main_chunks = [main_name]
+        if self.split_size is None:
+            self.write_document(name, document)
+            return
+        body = document.getroot().find('body')
+        limit = self.split_size * 1024
+        chunks = [[]]
+        size = 0
+        for child in body:
+            child_size = estimated_size(child)
+            if child.tag == 'div' and chunks[-1] and size + child_size > limit:
+                chunks.append([])
+                size = 0
+            chunks[-1].append(child)
+            size += child_size
+        root, extension = os.path.splitext(main_name)
+        documents = [(main_name, document)]
+        for number, chunk in enumerate(chunks[1:], start=2):
+            chunk_name = '{0}.{1}{2}'.format(root, number, extension)
+            chunk_document = self.make_document('main')
+            chunk_body = etree.SubElement(chunk_document.getroot(), 'body')
+            for child in chunk:
+                chunk_body.append(child)
+                for element in child.iter():
+                    if isinstance(element.tag, str) and 'id' in element.attrib:
+                        self.chunk_map[element.attrib['id']] = chunk_name
+            self.main_chunks.append(chunk_name)
+            documents.append((chunk_name, chunk_document))
+        log.info('Split {0} into {1} chunks'.format(main_name, len(documents)))
+        for chunk_name, chunk_document in documents:
+            self.write_document(os.path.join(directory, chunk_name), chunk_document)
+
+    def relocate_links(self, document):
+        """
+        Points the links of the document to ids of the main document which
+        write_main() has placed in a later chunk to that chunk.
+        """
+        prefix = self.main_chunks[0] + '#'
+        for link in document.iter('a'):
+            href = link.get('href', '')
+            if href.startswith(prefix):
+                chunk_name = self.chunk_map.get(href[len(prefix):])
+                if chunk_name is not None:
+                    link.attrib['href'] = chunk_name + href[len(prefix) - 1:]
+
+    def convert_elements(self, top, phases):
+        """
+        The conversion engine: each phase is a list of (tag, handler) pairs,
+        and the tree beneath top is walked once per phase to gather every
+        element with one of the phase's tags. The handlers are then called in
+        the listed order, each on all of the gathered elements of its tag in
+        document order; this is the same as a findall('.//tag') pass for each
+        pair, but with a single traversal of the tree.
+
+        Elements which an earlier handler in the phase has renamed are
+        skipped. Elements which an earlier handler in the phase has detached
+        from top, along with some ancestor, are not checked for (that would
+        cost as much as walking the tree again); converting them is harmless
+        as they are no longer part of the output, so handlers should make no
+        changes outside of the element they are given, or else come first in
+        their phase. A handler that copies subtrees (or creates new elements)
+        containing tags handled later must be followed by a new phase, so that
+        those later handlers will find the copies.
+        """
+        for phase in phases:
+            buckets = dict((tag, []) for tag, _handler in phase)
+            for element in top.iterdescendants(*buckets.keys()):
+                buckets[element.tag].append(element)
+            for tag, handler in phase:
+                #Collect first, as the handler may rename the elements
+                for element in [e for e in buckets[tag] if e.tag == tag]:
+                    handler(element)
+
+    def map_xref_targets(self, article):
+        """
+        Returns a dictionary of the address format string, one of main_frag,
+        bib_frag and tab_frag, of each id in the ArticleOutline of the article:
+        the ids of <ref> elements are in the bibliography, those of footnotes
+        to tables in the tables document, and the rest in the main document.
+        It is made before the conversion, which renames the elements.
+        """
+        targets = {}
+        for element_id, element in article.get_outline().ids.items():
+            if element.tag == 'ref':
+                targets[element_id] = self.bib_frag
+            elif element.tag == 'fn' and \
+                 next(element.iterancestors('table-wrap-foot'), None) is not None:
+                targets[element_id] = self.tab_frag
+            else:
+                targets[element_id] = self.main_frag
+        return targets
+
+    def xref_address(self, rid, ref_type):
+        """
+        Returns the address of the id rid, by where the element with that id is
+        placed, or for other ids, by the ref-type of the xref to it.
         """
-        with open(name, 'wb') as out:
-            out.write(etree.tostring(document, encoding='utf-8'))
+        try:
+            address = self.xref_targets[rid]
+        except KeyError:
+            address = self.xref_map.get(ref_type, self.main_frag)
+        return address.format(rid)
+
+    def elevate_from_paragraph(self, element):
+        """
+        Block level elements may not be placed in paragraphs in OPS, so this
+        elevates the element if it is found in a <p>.
+        """
+        if element.getparent().tag == 'p':
+            element_methods.elevate_element(element)
+
+    def convert_mathml_formula(self, formula):
+        """
+        Converts a <disp-formula> or <inline-formula> element holding MathML to
+        a span of the same class, with its id, holding an <ops:switch>: its
+        case is the MathML, for reading systems which support it, and its
+        default is the MathML's alttext or else its text. Any graphics of the
+        formula are discarded, fetch_plos_images() does not download them in
+        this mode. The label of a display formula is placed before the span
+        in bold, as for formulas given as images.
+
+        Returns False, leaving the formula unchanged, if it holds no MathML.
+        """
+        math = formula.find('.//{{{0}}}math'.format(MATHML_NS))
+        if math is None:
+            return False
+        span = etree.Element('span', {'class': formula.tag})
+        if 'id' in formula.attrib:
+            span.attrib['id'] = formula.attrib['id']
+        switch = etree.SubElement(span, '{{{0}}}switch'.format(OPS_NS))
+        case = etree.SubElement(switch, '{{{0}}}case'.format(OPS_NS),
+                                {'required-namespace': MATHML_NS})
+        default = etree.SubElement(switch, '{{{0}}}default'.format(OPS_NS))
+        default.text = math.get('alttext') or ' '.join(''.join(math.itertext()).split())
+        math.tail = None
+        case.append(math)
+        span.tail = formula.tail
+        element_methods.replace(formula, span)
+        label = formula.find('label')
+        if formula.tag == 'disp-formula' and label is not None:
+            label.tag = 'b'
+            label.tail = None
+            element_methods.insert_before(span, label)
+        return True
+
+    #The Journal Publishing Tag Set emphasis elements and their OPS analogues,
+    #as (tag, style)
+    JPTS_emphasis = [('bold', ('b', None)),
+                     ('italic', ('i', None)),
+                     ('monospace', ('span', 'font-family:monospace')),
+                     ('overline', ('span', 'text-decoration:overline')),
+                     ('sans-serif', ('span', 'font-family:sans-serif')),
+                     ('sc', ('span', 'font-variant:small-caps')),
+                     ('strike', ('span', 'text-decoration:line-through')),
+                     ('underline', ('span', 'text-decoration:underline'))]
+    JPTS_emphasis_map = dict(JPTS_emphasis)
+
+    def JPTS_emphasis_phase(self):
+        """
+        Returns the (tag, handler) pairs for the conversion of the JPTS
+        emphasis elements.
+        """
+        return [(tag, self.convert_JPTS_emphasis_element) for tag, _ops in self.JPTS_emphasis]
+
+    def convert_JPTS_emphasis_element(self, element):
+        """
+        Converts a single JPTS emphasis element to its OPS analogue.
+        """
+        tag, style = self.JPTS_emphasis_map[element.tag]
+        element.tag = tag
+        if style is not None:
+            element.attrib['style'] = style
 
     def convert_JPTS_emphasis(self, element):
         """
@@ -60,28 +299,16 @@ class OPSMeta(object):
         <sans-serif>, <sc>, <strike>, <underline>. These need to be converted
         to appropriate OPS analogues. They have no defined attributes.
         """
-        for bold in element.findall('.//bold'):
-            bold.tag = 'b'
-        for italic in element.findall('.//italic'):
-            italic.tag = 'i'
-        for mono in element.findall('.//monospace'):
-            mono.tag = 'span'
-            mono.attrib['style'] = 'font-family:monospace'
-        for over in element.findall('.//overline'):
-            over.tag = 'span'
-            over.attrib['style'] = 'text-decoration:overline'
-        for sans in element.findall('.//sans-serif'):
-            sans.tag = 'span'
-            sans.attrib['style'] = 'font-family:sans-serif'
-        for small in element.findall('.//sc'):
-            small.tag = 'span'
-            small.attrib['style'] = 'font-variant:small-caps'
-        for strike in element.findall('.//strike'):
-            strike.tag = 'span'
-            strike.attrib['style'] = 'text-decoration:line-through'
-        for under in element.findall('.//underline'):
-            under.tag = 'span'
-            under.attrib['style'] = 'text-decoration:underline'
+        self.convert_elements(element, [self.JPTS_emphasis_phase()])
+
+    def address_linking_phase(self):
+        """
+        Returns the (tag, handler) pairs for the conversion of the address
+        linking elements.
+        """
+        return [('email', self.convert_email),
+                ('ext-link', self.convert_ext_link),
+                ('uri', self.convert_uri)]
 
     def convert_address_linking_elements(self, top):
         """
@@ -89,30 +316,40 @@ class OPSMeta(object):
         address linking elements: <email>, <ext-link>, <uri>. The only
         appropriate hypertext element for linking in OPS is the <a> element.
         """
-        #Convert email to a mailto link addressed to the text it contains
-        for email in top.findall('.//email'):
-            element_methods.remove_all_attributes(email)
-            email.tag = 'a'
-            email.attrib['href'] = 'mailto:{0}'.format(email.text)
-        #Ext-links often declare their address as xlink:href attribute
-        #if that fails, direct the link to the contained text
-        for ext_link in top.findall('.//ext-link'):
-            ext_link.tag = 'a'
-            xlink_href_name = element_methods.ns_format(ext_link, 'xlink:href')
-            xlink_href = element_methods.get_attribute(ext_link, xlink_href_name)
-            element_methods.remove_all_attributes(ext_link, exclude=['id'])
-            if xlink_href:
-                ext_link.attrib['href'] = xlink_href
-            else:
-                ext_link.attrib['href'] = element_methods.all_text(ext_link)
-        #Uris often declare their address as xlink:href attribute
-        #if that fails, direct the link to the contained text
-        for uri in top.findall('.//uri'):
-            uri.tag = 'a'
-            xlink_href_name = element_methods.ns_format(uri, 'xlink:href')
-            xlink_href = element_methods.get_attribute(uri, xlink_href_name)
-            element_methods.remove_all_attributes(uri)
-            if xlink_href:
-                uri.attrib['href'] = xlink_href
-            else:
-                uri.attrib['href'] = element_methods.all_text(uri)
+        self.convert_elements(top, [self.address_linking_phase()])
+
+    def convert_email(self, email):
+        """
+        Convert email to a mailto link addressed to the text it contains
+        """
+        element_methods.remove_all_attributes(email)
+        email.tag = 'a'
+        email.attrib['href'] = 'mailto:{0}'.format(email.text)
+
+    def convert_ext_link(self, ext_link):
+        """
+        Ext-links often declare their address as xlink:href attribute if that
+        fails, direct the link to the contained text
+        """
+        ext_link.tag = 'a'
+        xlink_href_name = element_methods.ns_format(ext_link, 'xlink:href')
+        xlink_href = element_methods.get_attribute(ext_link, xlink_href_name)
+        element_methods.remove_all_attributes(ext_link, exclude=['id'])
+        if xlink_href:
+            ext_link.attrib['href'] = xlink_href
+        else:
+            ext_link.attrib['href'] = element_methods.all_text(ext_link)
+
+    def convert_uri(self, uri):
+        """
+        Uris often declare their address as xlink:href attribute if that fails,
+        direct the link to the contained text
+        """
+        uri.tag = 'a'
+        xlink_href_name = element_methods.ns_format(uri, 'xlink:href')
+        xlink_href = element_methods.get_attribute(uri, xlink_href_name)
+        element_methods.remove_all_attributes(uri)
+        if xlink_href:
+            uri.attrib['href'] = xlink_href
+        else:
+            uri.attrib['href'] = element_methods.all_text(uri)
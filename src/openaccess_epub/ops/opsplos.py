@@ -6,9 +6,11 @@ from the OPSGenerator base class in opsgenerator.py
 
 import openaccess_epub.utils as utils
 import openaccess_epub.utils.element_methods as element_methods
+import openaccess_epub.nlm_transform.citation as citation
 from .opsmeta import OPSMeta
 from lxml import etree
 from copy import copy, deepcopy
+import itertools
 import os
 import sys
 import logging
@@ -21,8 +23,9 @@ class OPSPLoS(OPSMeta):
     This provides the full feature set to create OPS content for an ePub file
     from a PLoS journal article.
     """
-    def __init__(self, article, output_dir):
-        OPSMeta.__init__(self, article)
+    def __init__(self, article, output_dir, in_place=False, split_size=None,
+                 mathml=False):
+        OPSMeta.__init__(self, article, in_place, split_size, mathml)
         log.info('Initiating OPSPLoS')
         #Set some initial hooks into the input article content
         self.article = article
@@ -50,7 +53,7 @@ class OPSPLoS(OPSMeta):
         #The first job is to create a file copy the article body to it
         self.document = self.make_document('main')
         if self.article.body is not None:
-            self.document.getroot().append(deepcopy(self.article.body))
+            self.document.getroot().append(self.take(self.article.body))
         else:
             return None  # TODO: Backmatter handling without body
         body = self.document.getroot().find('body')
@@ -70,27 +73,36 @@ class OPSPLoS(OPSMeta):
         self.make_back_matter(body)
 
         #Handle node conversion
-        self.convert_disp_formula_elements(body)
-        self.convert_inline_formula_elements(body)
-        self.convert_disp_quote_elements(body)
-        self.convert_boxed_text_elements(body)
-        self.convert_verse_group_elements(body)
-        self.convert_supplementary_material_elements(body)
-        self.convert_fn_elements(body)
-        self.convert_def_list_elements(body)
-        self.convert_ref_list_elements(body)
-        self.convert_list_elements(body)
-
-        self.convert_fig_elements(body)
-        self.convert_table_wrap_elements(body)
-
-        self.convert_graphic_elements(body)
-
-        #These come last for a reason
-        self.post_processing_conversion(body)
+        self.convert_elements(body, self.main_conversion_phases())
+        self.convert_div_titles(body, depth=1)
 
         #Finally, write to a document
-        self.write_document(os.path.join(self.ops_dir, self.main_frag[:-4]), self.document)
+        self.write_main(os.path.join(self.ops_dir, self.main_frag[:-4]), self.document)
+
+    def main_conversion_phases(self):
+        """
+        Returns the phases of node conversion for the main document, for
+        OPSMeta.convert_elements(). The result is the same as calling each of
+        convert_disp_formula_elements() through convert_graphic_elements(),
+        then post_processing_conversion(), in turn. A phase ends after each
+        conversion that copies content which may hold elements still to be
+        converted.
+        """
+        return [[('disp-formula', self.convert_disp_formula)],
+                [('inline-formula', self.convert_inline_formula),
+                 ('disp-quote', self.convert_disp_quote),
+                 ('boxed-text', self.convert_boxed_text)],
+                [('verse-group', self.convert_verse_group)],
+                [('supplementary-material', self.convert_supplementary_material),
+                 ('fn', self.convert_fn),
+                 ('def-list', self.convert_def_list),
+                 ('ref-list', self.convert_ref_list),
+                 ('list', self.elevate_from_paragraph),
+                 ('list', self.convert_list),
+                 ('fig', self.elevate_from_paragraph),
+                 ('fig', self.convert_fig)],
+                [('table-wrap', self.convert_table_wrap)],
+                [('graphic', self.convert_graphic)] + self.post_processing_phase()]
 
     def make_heading(self, receiving_node):
         """
@@ -162,13 +174,34 @@ class OPSPLoS(OPSMeta):
         operate on all such elements in the final product.
         """
         #TODO: Review this function for completion
-        self.convert_JPTS_emphasis(top)
-        self.convert_address_linking_elements(top)
-        self.convert_xref_elements(top)
-        self.convert_named_content_elements(top)
-        self.convert_sec_elements(top)
+        self.convert_elements(top, [self.post_processing_phase()])
         self.convert_div_titles(top, depth=1)
 
+    def post_processing_phase(self):
+        """
+        Returns the conversions made by post_processing_conversion(), other
+        than of the div titles, as a single phase for
+        OPSMeta.convert_elements().
+        """
+        return (self.JPTS_emphasis_phase() + self.address_linking_phase() +
+                [('xref', self.convert_xref),
+                 ('named-content', self.convert_named_content),
+                 ('sec', self.sec_handler())])
+
+    def tables_conversion_phases(self):
+        """
+        Returns the phases of node conversion for the tables document, for
+        OPSMeta.convert_elements(). The result is the same as calling
+        convert_emphasis_elements(), convert_fn_elements(),
+        convert_disp_formula_elements(), convert_inline_formula_elements(),
+        convert_xref_elements(), then post_processing_conversion(), in turn.
+        """
+        return [self.JPTS_emphasis_phase() +
+                [('fn', self.convert_fn),
+                 ('disp-formula', self.convert_disp_formula)],
+                [('inline-formula', self.convert_inline_formula),
+                 ('xref', self.convert_xref)] + self.post_processing_phase()]
+
     def create_biblio(self):
         """
         This method encapsulates the functions necessary to create the biblio
@@ -177,16 +210,11 @@ class OPSPLoS(OPSMeta):
         self.document = self.make_document('biblio')
         body = etree.SubElement(self.document.getroot(), 'body')
         body.attrib['id'] = 'references'
-        if self.article.metadata.back is None:
-            return
-        else:
-            refs = self.metadata.back.node.findall('.//ref')
-        if len(refs) == 0:
+        refs = self.article.get_outline().refs
+        if not refs:
             return
         for ref in refs:
-            ref_p = etree.SubElement(body, 'p')
-            ref_p.attrib['id'] = ref.attrib['id']
-            ref_p.text = str(etree.tostring(ref, method='text', encoding='utf-8'), encoding='utf-8')
+            body.append(citation.format_ref(ref))
 
         self.write_document(os.path.join(self.ops_dir, self.bib_frag[:-4]), self.document)
 
@@ -205,7 +233,7 @@ class OPSPLoS(OPSMeta):
             if table.tag == 'table-wrap-foot':
                 foot_div = etree.SubElement(body, 'div')
                 foot_div.attrib['class'] = 'table-wrap-foot'
-                element_methods.append_all_below(body, table)
+                element_methods.append_all_below(body, table, move=True)
                 continue
             #Use the custom created label attribute to pass table heading to the tables file
             if 'label' in table.attrib:
@@ -221,14 +249,8 @@ class OPSPLoS(OPSMeta):
                 body.append(div)
 
         #Handle node conversion
-        self.convert_emphasis_elements(body)
-        self.convert_fn_elements(body)
-        self.convert_disp_formula_elements(body)
-        self.convert_inline_formula_elements(body)
-        self.convert_xref_elements(body)
-
-        #Lastly
-        self.post_processing_conversion(body)
+        self.convert_elements(body, self.tables_conversion_phases())
+        self.convert_div_titles(body, depth=1)
 
         #Finally, write to a document
         self.write_document(os.path.join(self.ops_dir, self.tab_frag[:-4]), self.document)
@@ -240,28 +262,35 @@ class OPSPLoS(OPSMeta):
         self.main_frag = 'main.{0}.xml'.format(self.doi_frag) + '#{0}'
         self.bib_frag = 'biblio.{0}.xml'.format(self.doi_frag) + '#{0}'
         self.tab_frag = 'tables.{0}.xml'.format(self.doi_frag) + '#{0}'
+        #This is a mapping of values of the xref ref-type attribute to the
+        #desired local file to be addressed
+        self.xref_map = {'bibr': self.bib_frag,
+                         'fig': self.main_frag,
+                         'supplementary-material': self.main_frag,
+                         'table': self.main_frag,
+                         'aff': self.main_frag,
+                         'sec': self.main_frag,
+                         'table-fn': self.tab_frag,
+                         'boxed-text': self.main_frag,
+                         'other': self.main_frag,
+                         'disp-formula': self.main_frag,
+                         'fn': self.main_frag,
+                         'app': self.main_frag,
+                         '': self.main_frag}
+        #The addresses of the ids of the article, which take precedence
+        self.xref_targets = self.map_xref_targets(self.article)
 
     def get_authors_list(self):
         """
         Gets a list of all authors described in the metadata.
         """
-        authors_list = []
-        for contrib_group in self.metadata.front.article_meta.contrib_group:
-            for contrib in contrib_group.contrib:
-                if contrib.attrs['contrib-type'] == 'author':
-                    authors_list.append(contrib)
-        return authors_list
+        return self.article.get_contributors('author')
 
     def get_editors_list(self):
         """
         Gets a list of all editors described in the metadata.
         """
-        editors_list = []
-        for contrib_group in self.metadata.front.article_meta.contrib_group:
-            for contrib in contrib_group.contrib:
-                if contrib.attrs['contrib-type'] == 'editor':
-                    editors_list.append(contrib)
-        return editors_list
+        return self.article.get_contributors('editor')
 
     def make_heading_title(self, receiving_element):
         """
@@ -415,8 +444,7 @@ class OPSPLoS(OPSMeta):
         
         #Add author stuff to the citation
         author_list = self.get_authors_list()
-        for author in author_list:
-            author_index = author_list.index(author)
+        for author_index, author in enumerate(author_list):
             #At the 6th author, simply append an et al., then stop iterating
             if author_index == 5:
                 element_methods.append_new_text(citation_div, 'et al.', join_str='')
@@ -746,8 +774,8 @@ class OPSPLoS(OPSMeta):
         """
         if len(self.metadata.back.ack) == 0:
             return
-        #Take a copy of the first ack element, using its xml form
-        ack = deepcopy(self.metadata.back.ack[0].node)
+        #Take the first ack element
+        ack = self.take(self.metadata.back.ack[0].node)
         #Modify the tag to div
         ack.tag = 'div'
         #Give it an id
@@ -783,8 +811,8 @@ class OPSPLoS(OPSMeta):
                 break
         if not contribution:
             return
-        #Create a deepcopy of the fn to modify and add to the receiving_el
-        author_contrib = deepcopy(contribution.node)
+        #Take the fn to modify and add to the receiving_el
+        author_contrib = self.take(contribution.node)
         element_methods.remove_all_attributes(author_contrib)
         author_contrib.tag = 'div'
         author_contrib.attrib['id'] = 'author-contributions'
@@ -808,7 +836,7 @@ class OPSPLoS(OPSMeta):
         if len(glossaries) == 0:
             return
         for glossary in glossaries:
-            glossary_copy = deepcopy(glossary.node)
+            glossary_copy = self.take(glossary.node)
             glossary_copy.tag = 'div'
             glossary_copy.attrib['class'] = 'back-glossary'
             receiving_el.append(glossary_copy)
@@ -824,7 +852,7 @@ class OPSPLoS(OPSMeta):
         if len(all_notes) == 0:
             return
         for notes in all_notes:
-            notes_sec = deepcopy(notes.sec[0].node)
+            notes_sec = self.take(notes.sec[0].node)
             notes_sec.tag = 'div'
             notes_sec.attrib['class'] = 'back-notes'
             receiving_el.append(notes_sec)
@@ -854,50 +882,52 @@ class OPSPLoS(OPSMeta):
         OPS xhtml. Aside from translating <fig> to <img>, the content model
         must be edited.
         """
-        figs = top.findall('.//fig')
-        for fig in figs:
-            if fig.getparent().tag == 'p':
-                element_methods.elevate_element(fig)
-        for fig in figs:
-            #self.convert_fn_elements(fig)
-            #self.convert_disp_formula_elements(fig)
-            #Find label and caption
-            label_el = fig.find('label')
-            caption_el = fig.find('caption')
-            #Get the graphic node, this should be mandatory later on
-            graphic_el = fig.find('graphic')
-            #Create a file reference for the image
-            xlink_href = element_methods.ns_format(graphic_el, 'xlink:href')
-            graphic_xlink_href = graphic_el.attrib[xlink_href]
-            file_name = graphic_xlink_href.split('.')[-1] + '.png'
-            img_dir = 'images-' + self.doi_frag
-            img_path = '/'.join([img_dir, file_name])
-
-            #Create the OPS content: using image path, label, and caption
-            img_el = etree.Element('img', {'alt': 'A Figure', 'src': img_path,
-                                           'class': 'figure'})
-            if 'id' in fig.attrib:
-                img_el.attrib['id'] = fig.attrib['id']
-            element_methods.insert_before(fig, img_el)
-
-            #Create content for the label and caption
-            if caption_el is not None or label_el is not None:
-                img_caption_div = etree.Element('div', {'class': 'figure-caption'})
-                img_caption_div_b = etree.SubElement(img_caption_div, 'b')
-                if label_el is not None:
-                    element_methods.append_all_below(img_caption_div_b, label_el)
-                    element_methods.append_new_text(img_caption_div_b, '. ', join_str='')
-                if caption_el is not None:
-                    caption_title = caption_el.find('title')
-                    if caption_title is not None:
-                        element_methods.append_all_below(img_caption_div_b, caption_title)
-                        element_methods.append_new_text(img_caption_div_b, ' ', join_str='')
-                    for each_p in caption_el.findall('p'):
-                        element_methods.append_all_below(img_caption_div, each_p)
-                element_methods.insert_before(fig, img_caption_div)
-
-            #Remove the original <fig>
-            element_methods.remove(fig)
+        self.convert_elements(top, [[('fig', self.elevate_from_paragraph),
+                                      ('fig', self.convert_fig)]])
+
+    def convert_fig(self, fig):
+        """
+        Converts a single <fig> element, see convert_fig_elements().
+        """
+        #self.convert_fn_elements(fig)
+        #self.convert_disp_formula_elements(fig)
+        #Find label and caption
+        label_el = fig.find('label')
+        caption_el = fig.find('caption')
+        #Get the graphic node, this should be mandatory later on
+        graphic_el = fig.find('graphic')
+        #Create a file reference for the image
+        xlink_href = element_methods.ns_format(graphic_el, 'xlink:href')
+        graphic_xlink_href = graphic_el.attrib[xlink_href]
+        file_name = graphic_xlink_href.split('.')[-1] + '.png'
+        img_dir = 'images-' + self.doi_frag
+        img_path = '/'.join([img_dir, file_name])
+
+        #Create the OPS content: using image path, label, and caption
+        img_el = etree.Element('img', {'alt': 'A Figure', 'src': img_path,
+                                       'class': 'figure'})
+        if 'id' in fig.attrib:
+            img_el.attrib['id'] = fig.attrib['id']
+        element_methods.insert_before(fig, img_el)
+
+        #Create content for the label and caption
+        if caption_el is not None or label_el is not None:
+            img_caption_div = etree.Element('div', {'class': 'figure-caption'})
+            img_caption_div_b = etree.SubElement(img_caption_div, 'b')
+            if label_el is not None:
+                element_methods.append_all_below(img_caption_div_b, label_el, move=True)
+                element_methods.append_new_text(img_caption_div_b, '. ', join_str='')
+            if caption_el is not None:
+                caption_title = caption_el.find('title')
+                if caption_title is not None:
+                    element_methods.append_all_below(img_caption_div_b, caption_title, move=True)
+                    element_methods.append_new_text(img_caption_div_b, ' ', join_str='')
+                for each_p in caption_el.findall('p'):
+                    element_methods.append_all_below(img_caption_div, each_p, move=True)
+            element_methods.insert_before(fig, img_caption_div)
+
+        #Remove the original <fig>
+        element_methods.remove(fig)
 
     def convert_table_wrap_elements(self, top):
         """
@@ -906,122 +936,132 @@ class OPSPLoS(OPSMeta):
         
         The 'id' attribute is treated as mandatory by this method.
         """
-        for table_wrap in top.findall('.//table-wrap'):
-            #TODO: Address table uncommenting, for now this is not workable
-            #for child in tab.childNodes:
-            #    if child.nodeType == 8:
-            #        element_methods.uncomment(child)
-            
-            #Create a div for all of the table stuff
-            table_div = etree.Element('div')
-            table_div.attrib['id'] = table_wrap.attrib['id']
-
-            #Get the optional label and caption
-            label = table_wrap.find('label')
-            caption = table_wrap.find('caption')
-            #Check for the alternatives element
-            alternatives = table_wrap.find('alternatives')
-            #Look for the graphic node, under table-wrap and alternatives
-            graphic = table_wrap.find('graphic')
-            if graphic is None and alternatives is not None:
-                graphic = alternatives.find('graphic')
-            #Look for the table node, under table-wrap and alternatives
-            table = table_wrap.find('table')
-            if table is None and alternatives is not None:
-                table = alternatives.find('table')
-
-            #Handling the label and caption
-            if label is not None and caption is not None:
-                caption_div = etree.Element('div', {'class': 'table-caption'})
-                caption_div_b = etree.SubElement(caption_div, 'b')
+        self.convert_elements(top, [[('table-wrap', self.convert_table_wrap)]])
+
+    def convert_table_wrap(self, table_wrap):
+        """
+        Converts a single <table-wrap> element, see convert_table_wrap_elements().
+        """
+        #TODO: Address table uncommenting, for now this is not workable
+        #for child in tab.childNodes:
+        #    if child.nodeType == 8:
+        #        element_methods.uncomment(child)
+
+        #Create a div for all of the table stuff
+        table_div = etree.Element('div')
+        table_div.attrib['id'] = table_wrap.attrib['id']
+
+        #Get the optional label and caption
+        label = table_wrap.find('label')
+        caption = table_wrap.find('caption')
+        #Check for the alternatives element
+        alternatives = table_wrap.find('alternatives')
+        #Look for the graphic node, under table-wrap and alternatives
+        graphic = table_wrap.find('graphic')
+        if graphic is None and alternatives is not None:
+            graphic = alternatives.find('graphic')
+        #Look for the table node, under table-wrap and alternatives
+        table = table_wrap.find('table')
+        if table is None and alternatives is not None:
+            table = alternatives.find('table')
+
+        #Handling the label and caption
+        if label is not None and caption is not None:
+            caption_div = etree.Element('div', {'class': 'table-caption'})
+            caption_div_b = etree.SubElement(caption_div, 'b')
+            if label is not None:
+                element_methods.append_all_below(caption_div_b, label)
+            if caption is not None:
+                #Find, optional, title element and paragraph elements
+                caption_title = caption.find('title')
+                if caption_title is not None:
+                    element_methods.append_all_below(caption_div_b, caption_title, move=True)
+                caption_ps = caption.findall('p')
+                #For title and each paragraph, give children to the div
+                for caption_p in caption_ps:
+                    element_methods.append_all_below(caption_div, caption_p, move=True)
+            #Add this to the table div
+            table_div.append(caption_div)
+
+        ### Practical Description ###
+        #A table may have both, one of, or neither of graphic and table
+        #The different combinations should be handled, but a table-wrap
+        #with neither should fail with an error
+        #
+        #If there is both an image and a table, the image should be placed
+        #in the text flow with a link to the html table
+        #
+        #If there is an image and no table, the image should be placed in
+        #the text flow without a link to an html table
+        #
+        #If there is a table with no image, then the table should be placed
+        #in the text flow.
+
+        if graphic is not None:
+            #Create the image path for the graphic
+            xlink_href = element_methods.ns_format(graphic, 'xlink:href')
+            graphic_xlink_href = graphic.attrib[xlink_href]
+            file_name = graphic_xlink_href.split('.')[-1] + '.png'
+            img_dir = 'images-' + self.doi_frag
+            img_path = '/'.join([img_dir, file_name])
+            #Create the new img element
+            img_element = etree.Element('img', {'alt': 'A Table',
+                                                'src': img_path,
+                                                'class': 'table'})
+            #Add this to the table div
+            table_div.append(img_element)
+            #If table, add it to the list, and link to it
+            if table is not None:  # Both graphic and table
+                #The label attribute is just a means of transmitting some
+                #plaintext which will be used for the labeling in the html
+                #tables file
                 if label is not None:
-                    element_methods.append_all_below(caption_div_b, label)
-                if caption is not None:
-                    #Find, optional, title element and paragraph elements
-                    caption_title = caption.find('title')
-                    if caption_title is not None:
-                        element_methods.append_all_below(caption_div_b, caption_title)
-                    caption_ps = caption.findall('p')
-                    #For title and each paragraph, give children to the div
-                    for caption_p in caption_ps:
-                        element_methods.append_all_below(caption_div, caption_p)
-                #Add this to the table div
-                table_div.append(caption_div)
-
-            ### Practical Description ###
-            #A table may have both, one of, or neither of graphic and table
-            #The different combinations should be handled, but a table-wrap
-            #with neither should fail with an error
-            #
-            #If there is both an image and a table, the image should be placed
-            #in the text flow with a link to the html table
-            #
-            #If there is an image and no table, the image should be placed in
-            #the text flow without a link to an html table
-            #
-            #If there is a table with no image, then the table should be placed
-            #in the text flow.
-            
-            if graphic is not None:
-                #Create the image path for the graphic
-                xlink_href = element_methods.ns_format(graphic, 'xlink:href')
-                graphic_xlink_href = graphic.attrib[xlink_href]
-                file_name = graphic_xlink_href.split('.')[-1] + '.png'
-                img_dir = 'images-' + self.doi_frag
-                img_path = '/'.join([img_dir, file_name])
-                #Create the new img element
-                img_element = etree.Element('img', {'alt': 'A Table',
-                                                    'src': img_path,
-                                                    'class': 'table'})
+                    #Serialize the text, set as label attribute
+                    table.attrib['label'] = str(etree.tostring(label, method='text', encoding='utf-8'), encoding='utf-8')
+                table.attrib['id'] = table_wrap.attrib['id']
+                #Add the table to the tables list
+                self.html_tables.append(table)
+                #Also add the table's foot if it exists
+                table_wrap_foot = table_wrap.find('table-wrap-foot')
+                if table_wrap_foot is not None:
+                    self.html_tables.append(table_wrap_foot)
+                #Create a link to the html version of the table
+                html_table_link = etree.Element('a')
+                html_table_link.attrib['href'] = self.tab_frag.format(table_wrap.attrib['id'])
+                html_table_link.text = 'Go to HTML version of this table'
                 #Add this to the table div
-                table_div.append(img_element)
-                #If table, add it to the list, and link to it
-                if table is not None:  # Both graphic and table
-                    #The label attribute is just a means of transmitting some
-                    #plaintext which will be used for the labeling in the html
-                    #tables file
-                    if label is not None:
-                        #Serialize the text, set as label attribute
-                        table.attrib['label'] = str(etree.tostring(label, method='text', encoding='utf-8'), encoding='utf-8')
-                    table.attrib['id'] = table_wrap.attrib['id']
-                    #Add the table to the tables list
-                    self.html_tables.append(table)
-                    #Also add the table's foot if it exists
-                    table_wrap_foot = table_wrap.find('table-wrap-foot')
-                    if table_wrap_foot is not None:
-                        self.html_tables.append(table_wrap_foot)
-                    #Create a link to the html version of the table
-                    html_table_link = etree.Element('a')
-                    html_table_link.attrib['href'] = self.tab_frag.format(table_wrap.attrib['id'])
-                    html_table_link.text = 'Go to HTML version of this table'
-                    #Add this to the table div
-                    table_div.append(html_table_link)
-
-            elif table is not None:  # Table only
-                #Simply append the table to the table div
-                table_div.append(table)
-            elif graphic is None and table is None:
-                print('Encountered table-wrap element with neither graphic nor table. Exiting.')
-                sys.exit(1)
-
-            #Replace the original table-wrap with the newly constructed div
-            element_methods.replace(table_wrap, table_div)
-        #Finally done
-
-    def convert_sec_elements(self, body):
+                table_div.append(html_table_link)
+
+        elif table is not None:  # Table only
+            #Simply append the table to the table div
+            table_div.append(table)
+        elif graphic is None and table is None:
+            print('Encountered table-wrap element with neither graphic nor table. Exiting.')
+            sys.exit(1)
+
+        #Replace the original table-wrap with the newly constructed div
+        element_methods.replace(table_wrap, table_div)
+
+    def convert_sec_elements(self, top):
         """
         Convert <sec> elements to <div> elements and handle ids and attributes
         """
-        #Find all <sec> in body
-        sec_elements = body.findall('.//sec')
-        count = 0
-        #Convert the sec elements
-        for sec in sec_elements:
+        self.convert_elements(top, [[('sec', self.sec_handler())]])
+
+    def sec_handler(self):
+        """
+        Returns a handler converting single <sec> elements, see
+        convert_sec_elements(). The handler gives numbered ids, counting from
+        0, to the secs it converts which are missing an id.
+        """
+        ids = ('OA-EPUB-{0}'.format(count) for count in itertools.count())
+
+        def convert_sec(sec):
             sec.tag = 'div'
             element_methods.rename_attributes(sec, {'sec-type': 'class'})
             if 'id' not in sec.attrib:  # Give it an id if it is missing
-                sec.attrib['id'] = 'OA-EPUB-{0}'.format(str(count))
-                count += 1
+                sec.attrib['id'] = next(ids)
+        return convert_sec
 
     def convert_div_titles(self, element, depth=0):
         """
@@ -1080,81 +1120,76 @@ class OPSPLoS(OPSMeta):
         materials. As <a> is the only appropiate hypertext linker, this method
         converts xrefs to anchors with the appropriate address.
         """
-        #This is a mapping of values of the ref-type attribute to the desired
-        #local file to be addressed
-        ref_map = {'bibr': self.bib_frag,
-                   'fig': self.main_frag,
-                   'supplementary-material': self.main_frag,
-                   'table': self.main_frag,
-                   'aff': self.main_frag,
-                   'sec': self.main_frag,
-                   'table-fn': self.tab_frag,
-                   'boxed-text': self.main_frag,
-                   'other': self.main_frag,
-                   'disp-formula': self.main_frag,
-                   'fn': self.main_frag,
-                   'app': self.main_frag,
-                   '': self.main_frag}
-        for xref in top.findall('.//xref'):
-            xref.tag = 'a'
-            xref_attrs = copy(xref.attrib)
-            element_methods.remove_all_attributes(xref)
-            if 'ref-type' in xref_attrs:
-                ref_type = xref_attrs['ref-type']
-            else:
-                ref_type = ''
-            rid = xref_attrs['rid']
-            address = ref_map[ref_type].format(rid)
-            xref.attrib['href'] = address
+        self.convert_elements(top, [[('xref', self.convert_xref)]])
+
+    def convert_xref(self, xref):
+        """
+        Converts a single <xref> element, see convert_xref_elements().
+        """
+        xref.tag = 'a'
+        xref_attrs = copy(xref.attrib)
+        element_methods.remove_all_attributes(xref)
+        if 'ref-type' in xref_attrs:
+            ref_type = xref_attrs['ref-type']
+        else:
+            ref_type = ''
+        rid = xref_attrs['rid']
+        xref.attrib['href'] = self.xref_address(rid, ref_type)
 
     def convert_disp_formula_elements(self, top):
         """
         <disp-formula> elements must be converted to OPS conforming elements
         """
-        disp_formulas = top.findall('.//disp-formula')
-        for disp in disp_formulas:
-            #find label element
-            label_el = disp.find('label')
-            graphic_el = disp.find('graphic')
-            if graphic_el is None:  # No graphic, assume math as text instead
-                text_span = etree.Element('span', {'class': 'disp-formula'})
-                if 'id' in disp.attrib:
-                    text_span.attrib['id'] = disp.attrib['id']
-                element_methods.append_all_below(text_span, disp)
-                #Insert the text span before the disp-formula
-                element_methods.insert_before(disp, text_span)
-                #If a label exists, modify and insert before text_span
-                if label_el is not None:
-                    label_el.tag = 'b'
-                    element_methods.insert_before(text_span, label_el)
-                #Remove the disp-formula
-                element_methods.remove(disp)
-                #Skip the rest, which deals with the graphic element
-                continue
-            #The graphic element is present
-            #Create a file reference for the image
-            xlink_href = element_methods.ns_format(graphic_el, 'xlink:href')
-            graphic_xlink_href = graphic_el.attrib[xlink_href]
-            file_name = graphic_xlink_href.split('.')[-1] + '.png'
-            img_dir = 'images-' + self.doi_frag
-            img_path = '/'.join([img_dir, file_name])
+        self.convert_elements(top, [[('disp-formula', self.convert_disp_formula)]])
 
-            #Create OPS content, using image path, and label
-            #Create the img element
-            img_element = etree.Element('img', {'alt': 'A Display Formula',
-                                                'class': 'disp-formula',
-                                                'src': img_path})
-            #Transfer the id attribute
+    def convert_disp_formula(self, disp):
+        """
+        Converts a single <disp-formula> element, see convert_disp_formula_elements().
+        """
+        if self.mathml and self.convert_mathml_formula(disp):
+            return
+        #find label element
+        label_el = disp.find('label')
+        graphic_el = disp.find('graphic')
+        if graphic_el is None:  # No graphic, assume math as text instead
+            text_span = etree.Element('span', {'class': 'disp-formula'})
             if 'id' in disp.attrib:
-                img_element.attrib['id'] = disp.attrib['id']
-            #Insert the img element
-            element_methods.insert_before(disp, img_element)
-            #Create content for the label
+                text_span.attrib['id'] = disp.attrib['id']
+            element_methods.append_all_below(text_span, disp)
+            #Insert the text span before the disp-formula
+            element_methods.insert_before(disp, text_span)
+            #If a label exists, modify and insert before text_span
             if label_el is not None:
                 label_el.tag = 'b'
-                element_methods.insert_before(img_element, label_el)
-            #Remove the old disp-formula element
+                element_methods.insert_before(text_span, label_el)
+            #Remove the disp-formula
             element_methods.remove(disp)
+            #Skip the rest, which deals with the graphic element
+            return
+        #The graphic element is present
+        #Create a file reference for the image
+        xlink_href = element_methods.ns_format(graphic_el, 'xlink:href')
+        graphic_xlink_href = graphic_el.attrib[xlink_href]
+        file_name = graphic_xlink_href.split('.')[-1] + '.png'
+        img_dir = 'images-' + self.doi_frag
+        img_path = '/'.join([img_dir, file_name])
+
+        #Create OPS content, using image path, and label
+        #Create the img element
+        img_element = etree.Element('img', {'alt': 'A Display Formula',
+                                            'class': 'disp-formula',
+                                            'src': img_path})
+        #Transfer the id attribute
+        if 'id' in disp.attrib:
+            img_element.attrib['id'] = disp.attrib['id']
+        #Insert the img element
+        element_methods.insert_before(disp, img_element)
+        #Create content for the label
+        if label_el is not None:
+            label_el.tag = 'b'
+            element_methods.insert_before(img_element, label_el)
+        #Remove the old disp-formula element
+        element_methods.remove(disp)
 
     def convert_inline_formula_elements(self, top):
         """
@@ -1163,31 +1198,37 @@ class OPSPLoS(OPSMeta):
         These elements may contain <inline-graphic> elements, textual content,
         or both.
         """
-        inline_formulas = top.findall('.//inline-formula')
-        for inline in inline_formulas:
-            #inline-formula elements will be modified in situ
-            element_methods.remove_all_attributes(inline)
-            inline.tag = 'span'
-            inline.attrib['class'] = 'inline-formula'
-            inline_graphic = inline.find('inline-graphic')
-            if inline_graphic is None:
-                # Do nothing more if there is no graphic
-                continue
-            #Need to conver the inline-graphic element to an img element
-            inline_graphic.tag = 'img'
-            #Get a copy of the attributes, then remove them
-            inline_graphic_attributes = copy(inline_graphic.attrib)
-            element_methods.remove_all_attributes(inline_graphic)
-            #Create a file reference for the image
-            xlink_href = element_methods.ns_format(inline_graphic, 'xlink:href')
-            graphic_xlink_href = inline_graphic_attributes[xlink_href]
-            file_name = graphic_xlink_href.split('.')[-1] + '.png'
-            img_dir = 'images-' + self.doi_frag
-            img_path = '/'.join([img_dir, file_name])
-            #Set the source to the image path
-            inline_graphic.attrib['src'] = img_path
-            inline_graphic.attrib['class'] = 'inline-formula'
-            inline_graphic.attrib['alt'] = 'An Inline Formula'
+        self.convert_elements(top, [[('inline-formula', self.convert_inline_formula)]])
+
+    def convert_inline_formula(self, inline):
+        """
+        Converts a single <inline-formula> element, see convert_inline_formula_elements().
+        """
+        if self.mathml and self.convert_mathml_formula(inline):
+            return
+        #inline-formula elements will be modified in situ
+        element_methods.remove_all_attributes(inline)
+        inline.tag = 'span'
+        inline.attrib['class'] = 'inline-formula'
+        inline_graphic = inline.find('inline-graphic')
+        if inline_graphic is None:
+            # Do nothing more if there is no graphic
+            return
+        #Need to conver the inline-graphic element to an img element
+        inline_graphic.tag = 'img'
+        #Get a copy of the attributes, then remove them
+        inline_graphic_attributes = copy(inline_graphic.attrib)
+        element_methods.remove_all_attributes(inline_graphic)
+        #Create a file reference for the image
+        xlink_href = element_methods.ns_format(inline_graphic, 'xlink:href')
+        graphic_xlink_href = inline_graphic_attributes[xlink_href]
+        file_name = graphic_xlink_href.split('.')[-1] + '.png'
+        img_dir = 'images-' + self.doi_frag
+        img_path = '/'.join([img_dir, file_name])
+        #Set the source to the image path
+        inline_graphic.attrib['src'] = img_path
+        inline_graphic.attrib['class'] = 'inline-formula'
+        inline_graphic.attrib['alt'] = 'An Inline Formula'
 
     def convert_named_content_elements(self, top):
         """
@@ -1196,12 +1237,17 @@ class OPSPLoS(OPSMeta):
         the tagname to <span> and the content-type attribute to class. I expect
         that this will provide an easily extensible basis for CSS handling.
         """
-        for named_content in top.findall('.//named-content'):
-            named_content.tag = 'span'
-            attrs = copy(named_content.attrib)
-            element_methods.remove_all_attributes(named_content)
-            if 'content-type' in attrs:
-                named_content.attrib['class'] = attrs['content-type']
+        self.convert_elements(top, [[('named-content', self.convert_named_content)]])
+
+    def convert_named_content(self, named_content):
+        """
+        Converts a single <named-content> element, see convert_named_content_elements().
+        """
+        named_content.tag = 'span'
+        attrs = copy(named_content.attrib)
+        element_methods.remove_all_attributes(named_content)
+        if 'content-type' in attrs:
+            named_content.attrib['class'] = attrs['content-type']
 
     def convert_disp_quote_elements(self, top):
         """
@@ -1211,11 +1257,16 @@ class OPSPLoS(OPSMeta):
         <disp-quote> elements have a relatively complex content model, but PLoS
         appears to employ either <p>s or <list>s.
         """
-        for disp_quote in top.findall('.//disp-quote'):
-            if disp_quote.getparent().tag =='p':
-                element_methods.elevate_element(disp_quote)
-            disp_quote.tag = 'div'
-            disp_quote.attrib['class'] = 'disp-quote'
+        self.convert_elements(top, [[('disp-quote', self.convert_disp_quote)]])
+
+    def convert_disp_quote(self, disp_quote):
+        """
+        Converts a single <disp-quote> element, see convert_disp_quote_elements().
+        """
+        if disp_quote.getparent().tag =='p':
+            element_methods.elevate_element(disp_quote)
+        disp_quote.tag = 'div'
+        disp_quote.attrib['class'] = 'disp-quote'
 
     def convert_boxed_text_elements(self, top):
         """
@@ -1228,24 +1279,28 @@ class OPSPLoS(OPSMeta):
         This method will elevate the <sec> element, adding class information as
         well as processing the title.
         """
-        for boxed_text in top.findall('.//boxed-text'):
-            sec_el = boxed_text.find('sec')
-            if sec_el is not None:
-                sec_el.tag = 'div'
-                title = sec_el.find('title')
-                if title is not None:
-                    title.tag = 'b'
-                sec_el.attrib['class'] = 'boxed-text'
-                if 'id' in boxed_text.attrib:
-                    sec_el.attrib['id'] = boxed_text.attrib['id']
-                element_methods.replace(boxed_text, sec_el)
-                continue
-            else:
-                div_el = etree.Element('div', {'class': 'boxed-text'})
-                if 'id' in boxed_text.attrib:
-                    div_el.attrib['id'] = boxed_text.attrib['id']
-                element_methods.append_all_below(div_el, boxed_text)
-                element_methods.replace(boxed_text, div_el)
+        self.convert_elements(top, [[('boxed-text', self.convert_boxed_text)]])
+
+    def convert_boxed_text(self, boxed_text):
+        """
+        Converts a single <boxed-text> element, see convert_boxed_text_elements().
+        """
+        sec_el = boxed_text.find('sec')
+        if sec_el is not None:
+            sec_el.tag = 'div'
+            title = sec_el.find('title')
+            if title is not None:
+                title.tag = 'b'
+            sec_el.attrib['class'] = 'boxed-text'
+            if 'id' in boxed_text.attrib:
+                sec_el.attrib['id'] = boxed_text.attrib['id']
+            element_methods.replace(boxed_text, sec_el)
+        else:
+            div_el = etree.Element('div', {'class': 'boxed-text'})
+            if 'id' in boxed_text.attrib:
+                div_el.attrib['id'] = boxed_text.attrib['id']
+            element_methods.append_all_below(div_el, boxed_text, move=True)
+            element_methods.replace(boxed_text, div_el)
 
     def convert_supplementary_material_elements(self, top):
         """
@@ -1262,46 +1317,50 @@ class OPSPLoS(OPSMeta):
         contain 1 <label> element, followed by a <caption><title><p></caption>
         substructure.
         """
-        supplementary_materials = top.findall('.//supplementary-material')
-        for supplementary in supplementary_materials:
-            #Create a div element to hold the supplementary content
-            suppl_div = etree.Element('div')
-            if 'id' in supplementary.attrib:
-                suppl_div.attrib['id'] = supplementary.attrib['id']
-            element_methods.insert_before(supplementary, suppl_div)
-            #Get the sub elements
-            label = supplementary.find('label')
-            caption = supplementary.find('caption')
-            #Get the external resource URL for the supplementary information
-            ns_xlink_href = element_methods.ns_format(supplementary, 'xlink:href')
-            xlink_href = supplementary.attrib[ns_xlink_href]
-            resource_url = self.fetch_single_representation(xlink_href)
-            if label is not None:
-                label.tag = 'a'
-                label.attrib['href'] = resource_url
-                element_methods.append_new_text(label, '. ', join_str='')
-                suppl_div.append(label)
-            if caption is not None:
-                title = caption.find('title')
-                paragraphs = caption.findall('p')
-                if title is not None:
-                    title.tag = 'b'
-                    suppl_div.append(title)
-                for paragraph in paragraphs:
-                    suppl_div.append(paragraph)
-            #This is a fix for odd articles with <p>s outside of <caption>
-            #See journal.pctr.0020006, PLoS themselves fail to format this for
-            #the website, though the .pdf is good
-            #It should be noted that journal.pctr.0020006 does not pass
-            #validation because it places a <p> before a <caption>
-            #By placing this at the end of the method, it conforms to the spec
-            #by expecting such p tags after caption. This causes a hiccup in
-            #the rendering for journal.pctr.0020006, but it's better than
-            #skipping the data entirely AND it should also work for conforming
-            #articles.
-            for paragraph in supplementary.findall('p'):
+        self.convert_elements(top, [[('supplementary-material', self.convert_supplementary_material)]])
+
+    def convert_supplementary_material(self, supplementary):
+        """
+        Converts a single <supplementary-material> element, see convert_supplementary_material_elements().
+        """
+        #Create a div element to hold the supplementary content
+        suppl_div = etree.Element('div')
+        if 'id' in supplementary.attrib:
+            suppl_div.attrib['id'] = supplementary.attrib['id']
+        element_methods.insert_before(supplementary, suppl_div)
+        #Get the sub elements
+        label = supplementary.find('label')
+        caption = supplementary.find('caption')
+        #Get the external resource URL for the supplementary information
+        ns_xlink_href = element_methods.ns_format(supplementary, 'xlink:href')
+        xlink_href = supplementary.attrib[ns_xlink_href]
+        resource_url = self.fetch_single_representation(xlink_href)
+        if label is not None:
+            label.tag = 'a'
+            label.attrib['href'] = resource_url
+            element_methods.append_new_text(label, '. ', join_str='')
+            suppl_div.append(label)
+        if caption is not None:
+            title = caption.find('title')
+            paragraphs = caption.findall('p')
+            if title is not None:
+                title.tag = 'b'
+                suppl_div.append(title)
+            for paragraph in paragraphs:
                 suppl_div.append(paragraph)
-            element_methods.remove(supplementary)
+        #This is a fix for odd articles with <p>s outside of <caption>
+        #See journal.pctr.0020006, PLoS themselves fail to format this for
+        #the website, though the .pdf is good
+        #It should be noted that journal.pctr.0020006 does not pass
+        #validation because it places a <p> before a <caption>
+        #By placing this at the end of the method, it conforms to the spec
+        #by expecting such p tags after caption. This causes a hiccup in
+        #the rendering for journal.pctr.0020006, but it's better than
+        #skipping the data entirely AND it should also work for conforming
+        #articles.
+        for paragraph in supplementary.findall('p'):
+            suppl_div.append(paragraph)
+        element_methods.remove(supplementary)
 
     def convert_verse_group_elements(self, top):
         """
@@ -1317,32 +1376,37 @@ class OPSPLoS(OPSMeta):
         title, and subtitle elements correctly, while converting <verse-lines>
         to italicized lines.
         """
-        for verse_group in top.findall('.//verse-group'):
-            #Find some possible sub elements for the heading
-            label = verse_group.find('label')
-            title = verse_group.find('title')
-            subtitle = verse_group.find('subtitle')
-            #Modify the verse-group element
-            verse_group.tag = 'div'
-            verse_group.attrib['id'] = 'verse-group'
-            #Create a title for the verse_group
-            if label is not None or title is not None or subtitle is not None:
-                new_verse_title = etree.Element('b')
-                #Insert it at the beginning
-                verse_group.insert(0, new_verse_title)
-                #Induct the title elements into the new title
-                if label is not None:
-                    element_methods.append_all_below(new_verse_title, label)
-                    element_methods.remove(label)
-                if title is not None:
-                    element_methods.append_all_below(new_verse_title, title)
-                    element_methods.remove(title)
-                if subtitle is not None:
-                    element_methods.append_all_below(new_verse_title, subtitle)
-                    element_methods.remove(subtitle)
-            for verse_line in verse_group.findall('verse-line'):
-                verse_line.tag = 'p'
-                verse_line.attrib['class'] = 'verse-line'
+        self.convert_elements(top, [[('verse-group', self.convert_verse_group)]])
+
+    def convert_verse_group(self, verse_group):
+        """
+        Converts a single <verse-group> element, see convert_verse_group_elements().
+        """
+        #Find some possible sub elements for the heading
+        label = verse_group.find('label')
+        title = verse_group.find('title')
+        subtitle = verse_group.find('subtitle')
+        #Modify the verse-group element
+        verse_group.tag = 'div'
+        verse_group.attrib['id'] = 'verse-group'
+        #Create a title for the verse_group
+        if label is not None or title is not None or subtitle is not None:
+            new_verse_title = etree.Element('b')
+            #Insert it at the beginning
+            verse_group.insert(0, new_verse_title)
+            #Induct the title elements into the new title
+            if label is not None:
+                element_methods.append_all_below(new_verse_title, label, move=True)
+                element_methods.remove(label)
+            if title is not None:
+                element_methods.append_all_below(new_verse_title, title, move=True)
+                element_methods.remove(title)
+            if subtitle is not None:
+                element_methods.append_all_below(new_verse_title, subtitle, move=True)
+                element_methods.remove(subtitle)
+        for verse_line in verse_group.findall('verse-line'):
+            verse_line.tag = 'p'
+            verse_line.attrib['class'] = 'verse-line'
 
     def convert_fn_elements(self, top):
         """
@@ -1356,28 +1420,32 @@ class OPSPLoS(OPSMeta):
         identified as an Erratum, in which case it will be removed in
         accordance with PLoS' apparent guidelines.
         """
-        footnotes = top.findall('.//fn')
-        for footnote in footnotes:
-            #Use only the first paragraph
-            paragraph = footnote.find('p')
-            #If no paragraph, move on
-            if paragraph is None:
-                element_methods.remove(footnote)
-                continue
-            #Simply remove corrected errata items
-            paragraph_text = str(etree.tostring(paragraph, method='text', encoding='utf-8'), encoding='utf-8')
-            if paragraph_text.startswith('Erratum') and 'Corrected' in paragraph_text:
-                element_methods.remove(footnote)
-                continue
-            #Transfer some attribute information from the fn element to the paragraph
-            if 'id' in footnote.attrib:
-                paragraph.attrib['id'] = footnote.attrib['id']
-            if 'fn-type' in footnote.attrib:
-                paragraph.attrib['class'] = 'fn-type-{0}'.footnote.attrib['fn-type']
-            else:
-                paragraph.attrib['class'] = 'fn'
-                #Replace the 
-            element_methods.replace(footnote, paragraph)
+        self.convert_elements(top, [[('fn', self.convert_fn)]])
+
+    def convert_fn(self, footnote):
+        """
+        Converts a single <fn> element, see convert_fn_elements().
+        """
+        #Use only the first paragraph
+        paragraph = footnote.find('p')
+        #If no paragraph, move on
+        if paragraph is None:
+            element_methods.remove(footnote)
+            return
+        #Simply remove corrected errata items
+        paragraph_text = str(etree.tostring(paragraph, method='text', encoding='utf-8'), encoding='utf-8')
+        if paragraph_text.startswith('Erratum') and 'Corrected' in paragraph_text:
+            element_methods.remove(footnote)
+            return
+        #Transfer some attribute information from the fn element to the paragraph
+        if 'id' in footnote.attrib:
+            paragraph.attrib['id'] = footnote.attrib['id']
+        if 'fn-type' in footnote.attrib:
+            paragraph.attrib['class'] = 'fn-type-{0}'.footnote.attrib['fn-type']
+        else:
+            paragraph.attrib['class'] = 'fn'
+            #Replace the
+        element_methods.replace(footnote, paragraph)
 
     def convert_list_elements(self, top):
         """
@@ -1414,35 +1482,35 @@ class OPSPLoS(OPSMeta):
         #I have yet to gather many examples of this element, and may have to
         #write a recursive method for the processing of lists depending on how
         #PLoS produces their XML, for now this method is ignorant of nesting
-
         #TODO: prefix-words, one possible solution would be to have this method
         #edit the CSS to provide formatting support for arbitrary prefixes...
 
         #This is a block level element, so elevate it if found in p
-        for list_el in top.findall('.//list'):
-            if list_el.getparent().tag == 'p':
-                element_methods.elevate_element(list_el)
-
-        #list_el is used instead of list (list is reserved)
-        for list_el in top.findall('.//list'):
-            if 'list-type' not in list_el.attrib:
-                list_el_type = 'order'
-            else:
-                list_el_type = list_el.attrib['list-type']
-            #Unordered lists
-            if list_el_type in ['', 'bullet', 'simple']:
-                list_el.tag = 'ul'
-                #CSS must be used to recognize the class and suppress bullets
-                if list_el_type == 'simple':
-                    list_el.attrib['class'] = 'simple'
-            #Ordered lists
-            else:
-                list_el.tag = 'ol'
-                list_el.attrib['class'] = list_el_type
-            #Convert the list-item element tags to 'li'
-            for list_item in list_el.findall('list-item'):
-                list_item.tag = 'li'
-            element_methods.remove_all_attributes(list_el, exclude=['id', 'class'])
+        self.convert_elements(top, [[('list', self.elevate_from_paragraph),
+                                      ('list', self.convert_list)]])
+
+    def convert_list(self, list_el):
+        """
+        Converts a single <list> element, see convert_list_elements().
+        """
+        if 'list-type' not in list_el.attrib:
+            list_el_type = 'order'
+        else:
+            list_el_type = list_el.attrib['list-type']
+        #Unordered lists
+        if list_el_type in ['', 'bullet', 'simple']:
+            list_el.tag = 'ul'
+            #CSS must be used to recognize the class and suppress bullets
+            if list_el_type == 'simple':
+                list_el.attrib['class'] = 'simple'
+        #Ordered lists
+        else:
+            list_el.tag = 'ol'
+            list_el.attrib['class'] = list_el_type
+        #Convert the list-item element tags to 'li'
+        for list_item in list_el.findall('list-item'):
+            list_item.tag = 'li'
+        element_methods.remove_all_attributes(list_el, exclude=['id', 'class'])
 
     def convert_def_list_elements(self, top):
         """
@@ -1455,31 +1523,36 @@ class OPSPLoS(OPSMeta):
         will convert the <def-list> to a classed <div> with a styled format
         for the terms and definitions.
         """
-        for def_list in top.findall('.//def-list'):
-            #Remove the attributes, excepting id
-            element_methods.remove_all_attributes(def_list, exclude=['id'])
-            #Modify the def-list element
-            def_list.tag = 'div'
-            def_list.attrib['class'] = 'def-list'
-            for def_item in def_list.findall('def-item'):
-                #Get the term being defined, modify it
-                term = def_item.find('term')
-                term.tag = 'p'
-                term.attrib['class']= 'def-item-term'
-                #Insert it before its parent def_item
-                element_methods.insert_before(def_item, term)
-                #Get the definition, handle missing with a warning
-                definition = def_item.find('def')
-                if definition is None:
-                    log.warning('Missing def element in def-item')
-                    element_methods.remove(def_item)
-                    continue
-                #PLoS appears to consistently place all definition text in a
-                #paragraph subelement of the def element
-                def_para = definition.find('p')
-                def_para.attrib['class'] = 'def-item-def'
-                #Replace the def-item element with the p element
-                element_methods.replace(def_item, def_para)
+        self.convert_elements(top, [[('def-list', self.convert_def_list)]])
+
+    def convert_def_list(self, def_list):
+        """
+        Converts a single <def-list> element, see convert_def_list_elements().
+        """
+        #Remove the attributes, excepting id
+        element_methods.remove_all_attributes(def_list, exclude=['id'])
+        #Modify the def-list element
+        def_list.tag = 'div'
+        def_list.attrib['class'] = 'def-list'
+        for def_item in def_list.findall('def-item'):
+            #Get the term being defined, modify it
+            term = def_item.find('term')
+            term.tag = 'p'
+            term.attrib['class']= 'def-item-term'
+            #Insert it before its parent def_item
+            element_methods.insert_before(def_item, term)
+            #Get the definition, handle missing with a warning
+            definition = def_item.find('def')
+            if definition is None:
+                log.warning('Missing def element in def-item')
+                element_methods.remove(def_item)
+                continue
+            #PLoS appears to consistently place all definition text in a
+            #paragraph subelement of the def element
+            def_para = definition.find('p')
+            def_para.attrib['class'] = 'def-item-def'
+            #Replace the def-item element with the p element
+            element_methods.replace(def_item, def_para)
 
     def convert_ref_list_elements(self, top):
         """
@@ -1495,17 +1568,20 @@ class OPSPLoS(OPSMeta):
         access to PLOS' algorithm for proper citation formatting.
         """
         #TODO: Handle nested ref-lists
-        for ref_list in top.findall('.//ref-list'):
-            element_methods.remove_all_attributes(ref_list)
-            ref_list.tag = 'div'
-            ref_list.attrib['class'] = 'ref-list'
-            label = ref_list.find('label')
-            if label is not None:
-                label.tag = 'h3'
-            for ref in ref_list.findall('ref'):
-                ref_p = etree.Element('p')
-                ref_p.text = str(etree.tostring(ref, method='text', encoding='utf-8'), encoding='utf-8')
-                element_methods.replace(ref, ref_p)
+        self.convert_elements(top, [[('ref-list', self.convert_ref_list)]])
+
+    def convert_ref_list(self, ref_list):
+        """
+        Converts a single <ref-list> element, see convert_ref_list_elements().
+        """
+        element_methods.remove_all_attributes(ref_list)
+        ref_list.tag = 'div'
+        ref_list.attrib['class'] = 'ref-list'
+        label = ref_list.find('label')
+        if label is not None:
+            label.tag = 'h3'
+        for ref in ref_list.findall('ref'):
+            element_methods.replace(ref, citation.format_ref(ref))
 
     def convert_graphic_elements(self, top):
         """
@@ -1514,17 +1590,22 @@ class OPSPLoS(OPSMeta):
         as a figure or a table. This method should always be employed after the
         standard cases have already been handled.
         """
-        for graphic in top.findall('.//graphic'):
-            graphic.tag = 'img'
-            graphic.attrib['alt'] = 'unowned-graphic'
-            ns_xlink_href = element_methods.ns_format(graphic, 'xlink:href')
-            if ns_xlink_href in graphic.attrib:
-                xlink_href = graphic.attrib[ns_xlink_href]
-                file_name = xlink_href.split('.')[-1] + '.png'
-                img_dir = 'images-' + self.doi_frag
-                img_path = '/'.join([img_dir, file_name])
-                graphic.attrib['src'] = img_path
-            element_methods.remove_all_attributes(graphic, exclude=['id', 'class', 'alt', 'src'])
+        self.convert_elements(top, [[('graphic', self.convert_graphic)]])
+
+    def convert_graphic(self, graphic):
+        """
+        Converts a single <graphic> element, see convert_graphic_elements().
+        """
+        graphic.tag = 'img'
+        graphic.attrib['alt'] = 'unowned-graphic'
+        ns_xlink_href = element_methods.ns_format(graphic, 'xlink:href')
+        if ns_xlink_href in graphic.attrib:
+            xlink_href = graphic.attrib[ns_xlink_href]
+            file_name = xlink_href.split('.')[-1] + '.png'
+            img_dir = 'images-' + self.doi_frag
+            img_path = '/'.join([img_dir, file_name])
+            graphic.attrib['src'] = img_path
+        element_methods.remove_all_attributes(graphic, exclude=['id', 'class', 'alt', 'src'])
 
     def fetch_single_representation(self, item_xlink_href):
         """
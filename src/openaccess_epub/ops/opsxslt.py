@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+This module defines an OPS content generator class which renders the article
+with a compiled XSLT stylesheet, rather than converting it node by node as
+OPSPLoS and OPSFrontiers do. It is selected with the --ops-backend option.
+
+The stylesheet is the NLM ViewNLM (v2.3) stylesheet bundled in the data
+directory; it is compiled once per process and the compiled transform is
+reused for every article. The bundled articleTransform-v3.xsl cannot be used,
+it requires XSLT 2.0 and imports a stylesheet (jpub3-html.xsl) which is not
+distributed with it.
+"""
+
+import openaccess_epub
+from .opsmeta import OPSMeta
+from lxml import etree
+import os
+import threading
+import logging
+
+log = logging.getLogger('OPSXSLT')
+
+#The stylesheets in the data directory which may be used, by name
+stylesheets = {'viewnlm': 'viewnlm-v2.3.xsl'}
+
+#The compiled transforms, by name
+_transforms = {}
+_transforms_lock = threading.Lock()
+
+
+def get_transform(name='viewnlm'):
+    """
+    Returns the compiled XSLT transform for the named stylesheet, compiling it
+    only the first time it is requested in this process.
+    """
+    with _transforms_lock:
+        try:
+            return _transforms[name]
+        except KeyError:
+            path = openaccess_epub.get_data(stylesheets[name])
+            log.info('Compiling XSLT stylesheet {0}'.format(path))
+            transform = etree.XSLT(etree.parse(path))
+            _transforms[name] = transform
+            return transform
+
+
+def remove_keeping_tail(element):
+    """
+    Removes the element from its parent, leaving its tail text in place.
+    """
+    parent = element.getparent()
+    if element.tail:
+        previous = element.getprevious()
+        if previous is not None:
+            previous.tail = (previous.tail or '') + element.tail
+        else:
+            parent.text = (parent.text or '') + element.tail
+    parent.remove(element)
+
+
+class OPSXSLT(OPSMeta):
+    """
+    This creates the OPS content for an ePub file from the output of an XSLT
+    stylesheet. The HTML produced by the stylesheet is divided between the
+    main, biblio and tables documents as the other OPS classes do, and is then
+    cleaned up to be valid XHTML for OPS.
+
+    The stylesheet builds a new tree, so the article is never modified, and
+    in_place has no effect.
+    """
+    #Attributes of the stylesheet's HTML which are not valid XHTML 1.1
+    invalid_attributes = {'a': ['target'],
+                          'body': ['bgcolor'],
+                          'td': ['width', 'bgcolor', 'nowrap'],
+                          'th': ['width', 'bgcolor', 'nowrap'],
+                          'tr': ['bgcolor']}
+
+    #Elements of the stylesheet's HTML which are not valid XHTML 1.1, and
+    #their replacement as (tag, style)
+    invalid_elements = {'u': ('span', 'text-decoration:underline'),
+                        's': ('span', 'text-decoration:line-through'),
+                        'strike': ('span', 'text-decoration:line-through'),
+                        'font': ('span', None),
+                        'center': ('div', 'text-align:center')}
+
+    def __init__(self, article, output_dir, in_place=False,
+                 stylesheet='viewnlm', split_size=None):
+        OPSMeta.__init__(self, article, in_place, split_size)
+        log.info('Initiating OPSXSLT')
+        self.article = article
+        self.doi = article.get_DOI()
+        #From "10.1371/journal.pone.0035956" get "journal.pone.0335956"
+        self.doi_frag = self.doi.split('/', 1)[1]
+        self.make_fragment_identifiers()
+        self.ops_dir = os.path.join(output_dir, 'OPS')
+        result = get_transform(stylesheet)(article.document)
+        self.parts = self.get_parts(result)
+        main = self.create_main()
+        biblio = self.create_biblio()
+        tables = self.create_tables()
+        for document in [main, biblio, tables]:
+            self.clean_html(document.getroot().find('body'))
+        self.link_documents([(self.main_frag, main),
+                             (self.bib_frag, biblio),
+                             (self.tab_frag, tables)])
+        self.write_main(os.path.join(self.ops_dir, self.main_frag[:-4]), main)
+        if len(biblio.getroot().find('body')):
+            self.write_document(os.path.join(self.ops_dir, self.bib_frag[:-4]), biblio)
+        #The OPF places the tables document in the spine if there are tables
+        if self.article.get_outline().tables:
+            self.write_document(os.path.join(self.ops_dir, self.tab_frag[:-4]), tables)
+
+    def make_fragment_identifiers(self):
+        """
+        This will create useful fragment identifier strings.
+        """
+        self.main_frag = 'main.{0}.xml'.format(self.doi_frag) + '#{0}'
+        self.bib_frag = 'biblio.{0}.xml'.format(self.doi_frag) + '#{0}'
+        self.tab_frag = 'tables.{0}.xml'.format(self.doi_frag) + '#{0}'
+
+    def get_parts(self, result):
+        """
+        Returns the stylesheet's divisions of the article as a dictionary by
+        name: 'front', 'body', 'back', 'figs-and-tables' and 'end-metadata'.
+        """
+        parts = {}
+        for div in result.getroot().find('body').iterchildren('div'):
+            div_id = div.get('id', '')
+            if div_id.startswith('article-level-0-'):
+                parts[div_id[len('article-level-0-'):]] = div
+        return parts
+
+    def find_section(self, part, heading):
+        """
+        Finds the section of the part under a heading (a span of class
+        "tl-main-part", such as "References"), and returns the heading and a
+        list of the elements after it up to the next heading or rule. The
+        heading is None if it is not found.
+        """
+        if part is None:
+            return None, []
+        title, section = None, []
+        for child in part:
+            if title is not None:
+                if child.tag == 'hr' or child.get('class') == 'tl-main-part':
+                    break
+                section.append(child)
+            elif child.tag == 'span' and child.get('class') == 'tl-main-part':
+                if (child.text or '').strip() == heading:
+                    title = child
+        return title, section
+
+    def create_main(self):
+        """
+        The main document receives the front matter, body and back matter of
+        the stylesheet's output, and its list of figures. The references are
+        taken by create_biblio and the HTML tables by create_tables, so this
+        must come first.
+        """
+        document = self.make_document('main')
+        body = etree.SubElement(document.getroot(), 'body')
+        for name in ['front', 'body', 'back', 'figs-and-tables']:
+            part = self.parts.get(name)
+            if part is not None:
+                body.append(part)
+        for span in body.iter('span'):
+            if span.get('class') == 'tl-document':
+                span.attrib['id'] = 'title'
+                break
+        return document
+
+    def create_biblio(self):
+        """
+        The biblio document receives the stylesheet's references.
+        """
+        document = self.make_document('biblio')
+        body = etree.SubElement(document.getroot(), 'body')
+        body.attrib['id'] = 'references'
+        back = self.parts.get('back')
+        title, section = self.find_section(back, 'References')
+        if title is None:
+            return document
+        #Remove the rule before the heading
+        previous = title.getprevious()
+        if previous is not None and previous.tag == 'hr':
+            back.remove(previous)
+        back.remove(title)
+        for element in section:
+            body.append(element)
+        return document
+
+    def create_tables(self):
+        """
+        The tables document receives the HTML tables of each table-wrap, with
+        its label; as in the other OPS classes, the table-wrap itself, with
+        its id, label, caption and any image, is left in the main document.
+        """
+        document = self.make_document('tables')
+        body = etree.SubElement(document.getroot(), 'body')
+        body.attrib['id'] = 'tables'
+        _title, section = self.find_section(self.parts.get('figs-and-tables'),
+                                            'Tables')
+        for table_wrap in section:
+            moved = [c for c in table_wrap if c.tag in ('table', 'div')]
+            if not moved:
+                continue
+            div = etree.SubElement(body, 'div')
+            if 'id' in table_wrap.attrib:
+                div.attrib['id'] = table_wrap.attrib['id']
+            for label in table_wrap.iterchildren('span'):
+                if label.get('class') == 'label':
+                    label_b = etree.SubElement(div, 'b')
+                    label_b.text = label.text
+            for child in moved:
+                div.append(child)
+        return document
+
+    def clean_html(self, top):
+        """
+        Converts the stylesheet's HTML beneath top to valid XHTML for OPS:
+        removing invalid attributes and elements, the stylesheet's markers of
+        element ids, and pointing the images to the ePub's image directory.
+        """
+        for element in list(top.iter()):
+            if not isinstance(element.tag, str):  # Comments, PIs
+                continue
+            for name in self.invalid_attributes.get(element.tag, []):
+                element.attrib.pop(name, None)
+            if element.tag in self.invalid_elements:
+                tag, style = self.invalid_elements[element.tag]
+                element.tag = tag
+                element.attrib.clear()
+                if style is not None:
+                    element.attrib['style'] = style
+            elif element.tag == 'img':
+                self.convert_img(element)
+            elif element.tag == 'span' and element.get('class') == 'gen':
+                self.remove_marker(element)
+
+    def convert_img(self, img):
+        """
+        The stylesheet uses the xlink:href of the graphic for the image source,
+        this points it to the image in the ePub, named as in the other OPS
+        classes.
+        """
+        src = img.get('src', '')
+        img_dir = 'images-' + self.doi_frag
+        if src and not src.startswith(img_dir):
+            img.attrib['src'] = '/'.join([img_dir, src.split('.')[-1] + '.png'])
+        if 'alt' not in img.attrib:
+            img.attrib['alt'] = 'image'
+
+    def remove_marker(self, span):
+        """
+        The stylesheet marks many elements for review, as "[Figure ID: x]" or
+        "[genus-species: E. coli]"; these markers are removed. The id of an ID
+        marker is given to its parent, as it is the target of links, and its
+        value is removed too, the value of other markers is kept.
+        """
+        text = span.text or ''
+        if not text.startswith('[') or span.getparent() is None:
+            return
+        closing = span.getnext()
+        if closing is not None and closing.tag == 'span' and \
+           closing.get('class') == 'gen' and \
+           (closing.text or '').startswith(']'):
+            closing.text = closing.text[1:].strip() or None
+            if closing.text is None:
+                remove_keeping_tail(closing)
+        parent = span.getparent()
+        if text.rstrip().endswith('ID:'):
+            if 'id' in span.attrib and 'id' not in parent.attrib:
+                parent.attrib['id'] = span.attrib['id']
+            span.tail = None
+        remove_keeping_tail(span)
+
+    def link_documents(self, documents):
+        """
+        The stylesheet links within a single document; links to ids which have
+        been placed in another of the documents are pointed to that document.
+        documents is a list of (fragment identifier, document) pairs.
+        """
+        placed = {}
+        for frag, document in documents:
+            for element in document.iter():
+                if isinstance(element.tag, str) and 'id' in element.attrib:
+                    placed.setdefault(element.attrib['id'], frag)
+        for frag, document in documents:
+            for link in document.iter('a'):
+                href = link.get('href', '')
+                if not href.startswith('#'):
+                    continue
+                target_frag = placed.get(href[1:])
+                if target_frag is not None and target_frag != frag:
+                    link.attrib['href'] = target_frag.format(href[1:])
@@ -7,6 +7,7 @@ Used for configuring an installation of OpenAccess_EPUB
 
 from openaccess_epub.utils import cache_location, evaluate_relative_path, \
      mkdir_p
+from openaccess_epub.utils.image_cache import parse_size
 from openaccess_epub import __version__ as OAE_VERSION
 import os
 import sys
@@ -68,10 +69,20 @@ image_cache = '{image-cache}'
 # A Boolean toggle for whether or not to use the Image Cache
 use_image_cache = {use-image-cache}
 
+# The largest size of the Image Cache, such as 500M or 20G, beyond which the
+# images of the articles used least recently are removed. None for no limit
+image_cache_size = {image-cache-size}
+
 # -- Image Fetching Options --
 # A Boolean toggle for whether or not to use Image Fetching
 use_image_fetching = {use-image-fetching}
 
+# -- Image Profile Options --
+# Device profiles for oaepub --image-profile, besides e-ink, tablet and
+# original. Each maps a name to (maximum width, maximum height, grayscale,
+# JPEG quality), such as {{'phone': (720, 1280, False, 80)}}
+image_profiles = {{}}
+
 # -- Output Configuration -----------------------------------------------------
 # OpenAccess_EPUB can place the output in the desired location. A relative path
 # will be interpreted as relative to the input, and an absolute path will serve
@@ -120,6 +131,16 @@ def boolean(x):
         raise ValidationError("Please enter either 'y' or 'n'.")
     return x.upper() in ('Y', 'YES')
 
+def size_limit(x):
+    """
+    Validates a size such as 500M or 20G, or none, for the config file.
+    """
+    try:
+        size = parse_size(x)
+    except ValueError as error:
+        raise ValidationError(str(error))
+    return 'None' if size is None else repr(x.strip())
+
 def list_opts(x):
     try:
         return ', '.join(['\'' + unix_path_coercion(opt.strip()) + '\'' for opt in x.split(',')])
@@ -173,6 +194,7 @@ def inner_main(args):
                     'use-input-relative-images': 'y',
                     'image-cache': os.path.join(CACHE_LOCATION, 'img_cache'),
                     'use-image-cache': 'n',
+                    'image-cache-size': 'none',
                     'use-image-fetching': 'y',
                     'default-output': '.',
                     'input-relative-css': '.',
@@ -184,6 +206,7 @@ def inner_main(args):
         default_config['use-input-relative-images'] = boolean(default_config['use-input-relative-images'])
         default_config['image-cache'] = absolute_path(default_config['image-cache'])
         default_config['use-image-cache'] = boolean(default_config['use-image-cache'])
+        default_config['image-cache-size'] = size_limit(default_config['image-cache-size'])
         default_config['use-image-fetching'] = boolean(default_config['use-image-fetching'])
         default_config['default-output'] = nonempty(default_config['default-output'])
         default_config['input-relative-css'] = nonempty(default_config['input-relative-css'])
@@ -252,6 +275,12 @@ consume extra disk space for storage.''')
     user_prompt(config_dict, 'use-image-cache', 'Use image cache?: (y/N)',
                 default=default_config['use-image-cache'],
                 validator=boolean)
+    print('''
+How large may the image cache grow? Give a size such as 500M or 20G; when it
+is exceeded, the images of the articles used least recently are removed.''')
+    user_prompt(config_dict, 'image-cache-size', 'Image cache size limit?:',
+                default=default_config['image-cache-size'],
+                validator=size_limit)
     #Image fetching online details
     print('''
 Should OpenAccess_EPUB attempt to download the images from the Internet? This
@@ -18,8 +18,12 @@ from openaccess_epub.utils.input import doi_input, url_input
 #Python documentation refers to this recipe for an OrderedSet
 #http://code.activestate.com/recipes/576694/
 import collections
+try:
+    from collections.abc import MutableSet
+except ImportError:  # Python < 3.3
+    from collections import MutableSet
 
-class OrderedSet(collections.MutableSet):
+class OrderedSet(MutableSet):
 
     def __init__(self, iterable=None):
         self.end = end = [] 
@@ -181,6 +185,8 @@ def get_output_directory(args):
                 #Batch should only work on a supplied directory
                 abs_batch_path = get_absolute_path(args.parallel_batch)
                 return abs_batch_path
+            elif args.catalog:
+                return get_absolute_path(args.catalog)
             elif args.collection:
                 return os.getcwd()
             else:  # Un-handled or currently unsupported options
@@ -248,6 +254,20 @@ def make_epub_base():
     with open(css_path, 'wb') as css:
         css.write(bytes(DEFAULT_CSS, 'UTF-8'))
 
+def write_xml(document, destination):
+    """
+    Serializes an lxml ElementTree to destination, which may be a file name or
+    an open binary file, such as an entry opened with ZipFile.open(name, 'w').
+    The serialization is written out as it is produced, so that it is never
+    held in memory as a whole. The output is identical to that of
+    etree.tostring(document, encoding='utf-8').
+    """
+    if isinstance(destination, str):
+        with open(destination, 'wb') as output:
+            document.write(output, encoding='utf-8')
+    else:
+        document.write(destination, encoding='utf-8')
+
 def createDCElement(document, name, data, attributes = None):
     """
     A convenience method for creating DC tag elements.
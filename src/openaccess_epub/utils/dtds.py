@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+"""
+A process-wide registry of the DTDs supported by OpenAccess_EPUB.
+
+Parsing a DTD module tree like JPTS is expensive, so each DTD is compiled only
+once per process, the first time a document with its public id is seen. DTDs
+for versions that never appear are never compiled. The registry may be warmed
+in a parent process before forking worker processes so that the compiled DTDs
+are inherited rather than compiled again in every worker.
+
+Parsing of article XML files should go through parse() and iterparse() in this
+module. They use shared parsers that never touch the network: the DOCTYPE is
+resolved to the bundled DTD files by its public id, and the DTD is only loaded
+when the document needs it to define its entities.
+"""
+
+from openaccess_epub import JPTS10_PATH, JPTS11_PATH, JPTS20_PATH,\
+    JPTS21_PATH, JPTS22_PATH, JPTS23_PATH, JPTS30_PATH
+from openaccess_epub._version import __version__
+import os
+import re
+import pickle
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+from keyword import iskeyword
+
+from lxml import etree
+
+log = logging.getLogger('utils.dtds')
+
+dtd_tuple = namedtuple('DTD_Tuple', 'path, name, version')
+
+dtds = {'-//NLM//DTD Journal Archiving and Interchange DTD v1.0 20021201//EN':
+        dtd_tuple(JPTS10_PATH, 'JPTS', 1.0),
+        '-//NLM//DTD Journal Archiving and Interchange DTD v1.1 20031101//EN':
+        dtd_tuple(JPTS11_PATH, 'JPTS', 1.1),
+        '-//NLM//DTD Journal Publishing DTD v2.0 20040830//EN':
+        dtd_tuple(JPTS20_PATH, 'JPTS', 2.0),
+        '-//NLM//DTD Journal Publishing DTD v2.1 20050630//EN':
+        dtd_tuple(JPTS21_PATH, 'JPTS', 2.1),
+        '-//NLM//DTD Journal Publishing DTD v2.2 20060430//EN':
+        dtd_tuple(JPTS22_PATH, 'JPTS', 2.2),
+        '-//NLM//DTD Journal Publishing DTD v2.3 20070202//EN':
+        dtd_tuple(JPTS23_PATH, 'JPTS', 2.3),
+        '-//NLM//DTD Journal Publishing DTD v3.0 20080202//EN':
+        dtd_tuple(JPTS30_PATH, 'JPTS', 3.0)}
+
+#The precomputed content model for a single element declaration.
+#attributes - tuple of (key, lookup, prefix, name); lookup is None when it must
+#             be resolved against the element's nsmap
+#children - tuple of (tag, multiple), de-duplicated in order of first
+#           appearance; plurality is never lost, only gained
+#pcdata - True if the element may contain text
+#type_name, field_names - namedtuple-safe names for metadata packing
+ElementModel = namedtuple('ElementModel', 'attributes, children, pcdata, \
+type_name, field_names')
+
+#Matches the public id in a DOCTYPE declaration
+DOCTYPE_PUBLIC = re.compile(br'<!DOCTYPE\s+[^\s>]+\s+PUBLIC\s+(["\'])(.*?)\1',
+                            re.DOTALL)
+
+
+class DTDRegistry(object):
+    """
+    Lazily compiles and holds lxml.etree.DTD instances keyed by public id.
+    Compilation is guarded by a lock, so the registry may be used from
+    multiple threads; hits and misses are counted for reporting.
+    """
+    def __init__(self, specifications=dtds, cache_dir=None):
+        self.specifications = specifications
+        self.cache_dir = cache_dir
+        self.compiled = {}
+        self.content_models = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __contains__(self, public_id):
+        return public_id in self.specifications
+
+    def spec(self, public_id):
+        """
+        Returns the DTD_Tuple for the public id. Raises KeyError for
+        unsupported specifications.
+        """
+        return self.specifications[public_id]
+
+    def get(self, public_id):
+        """
+        Returns the compiled lxml.etree.DTD for the public id, compiling it on
+        first use. Raises KeyError for unsupported specifications.
+        """
+        try:
+            dtd = self.compiled[public_id]
+        except KeyError:
+            pass
+        else:
+            self.hits += 1
+            return dtd
+        spec = self.specifications[public_id]
+        with self._lock:
+            #Another thread may have compiled it while we waited
+            if public_id not in self.compiled:
+                log.debug('Compiling DTD for {0}'.format(public_id))
+                self.compiled[public_id] = etree.DTD(spec.path)
+                self.misses += 1
+            else:
+                self.hits += 1
+        return self.compiled[public_id]
+
+    def warm(self, public_ids=None):
+        """
+        Compiles the DTDs for the given public ids ahead of time, or all of the
+        supported DTDs if none are given. Unsupported ids are ignored. This is
+        intended for use in a parent process before forking workers.
+        """
+        if public_ids is None:
+            public_ids = self.specifications.keys()
+        for public_id in set(public_ids):
+            if public_id in self.specifications:
+                self.get(public_id)
+
+    def content_model(self, public_id):
+        """
+        Returns a dictionary of element name to ElementModel for the public id.
+        The table depends only on the DTD, so it is computed once per process,
+        and is persisted in the cache_dir (if one is set) so that later
+        processes may load it instead of walking the DTD.
+        """
+        try:
+            return self.content_models[public_id]
+        except KeyError:
+            pass
+        table = self._load_content_model(public_id)
+        if table is None:
+            table = build_content_model(self.get(public_id))
+            self._save_content_model(public_id, table)
+        self.content_models[public_id] = table
+        return table
+
+    def _content_model_path(self, public_id):
+        digest = hashlib.sha1(public_id.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, 'content-model-{0}.pickle'.format(digest))
+
+    def _load_content_model(self, public_id):
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self._content_model_path(public_id), 'rb') as cached:
+                version, cached_id, table = pickle.load(cached)
+        except (IOError, OSError, EOFError, ValueError, pickle.PickleError):
+            return None
+        if version != __version__ or cached_id != public_id:
+            return None
+        log.debug('Loaded content model for {0}'.format(public_id))
+        return table
+
+    def _save_content_model(self, public_id, table):
+        if self.cache_dir is None:
+            return
+        path = self._content_model_path(public_id)
+        #Write then rename, so a concurrent reader never sees a partial file
+        temp_path = '{0}.{1}'.format(path, os.getpid())
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            with open(temp_path, 'wb') as cached:
+                pickle.dump((__version__, public_id, table), cached,
+                            pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+        except (IOError, OSError) as err:
+            log.warning('Could not cache content model: {0}'.format(err))
+
+    def stats(self):
+        """
+        Returns a dictionary of the hit and miss counts, and the public ids
+        that have been compiled.
+        """
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'compiled': sorted(self.compiled)}
+
+
+def coerce_name(name):
+    """
+    Makes a DTD name safe for use in a namedtuple: characters other than
+    letters, digits, and underscores become underscores, and reserved keywords
+    receive an "l" prefix.
+    """
+    name = re.sub('[^a-zA-Z0-9_]', '_', name)
+    if iskeyword(name):
+        name = 'l' + name
+    return name
+
+
+def _walk_content(content, multiple, found):
+    """
+    Walks the branches of a "seq" or "or" content particle, appending (tag,
+    multiple) tuples to found. Plurality is passed down to inner structures.
+    """
+    for branch in [content.left, content.right]:
+        if branch is None:
+            continue
+        if branch.type == 'pcdata':
+            found.append(('pcdata', True))
+        elif branch.type in ['seq', 'or']:
+            _walk_content(branch,
+                          multiple or branch.occur in ['mult', 'plus'],
+                          found)
+        elif branch.type == 'element':
+            found.append((branch.name,
+                          multiple or branch.occur in ['mult', 'plus']))
+
+
+def element_children(content):
+    """
+    Returns a list of (tag, multiple) tuples for the element types allowed in a
+    content model, with "pcdata" standing in for text.
+    """
+    found = []
+    if content is None:
+        return found
+    if content.type == 'pcdata':
+        found.append(('pcdata', True))
+    elif content.type in ['seq', 'or']:
+        _walk_content(content, content.occur in ['mult', 'plus'], found)
+    elif content.type == 'element':
+        found.append((content.name, content.occur in ['mult', 'plus']))
+    return found
+
+
+def build_content_model(dtd):
+    """
+    Computes the table of element name to ElementModel for a compiled DTD.
+    """
+    table = {}
+    for element_def in dtd.elements():
+        attributes = []
+        for attribute in element_def.iterattributes():
+            if attribute.prefix:
+                if attribute.prefix == 'xmlns':  # Pseudo-attribute
+                    continue
+                elif attribute.prefix == 'xml':
+                    lookup = '{{http://www.w3.org/XML/1998/namespace}}{0}'.format(attribute.name)
+                else:
+                    lookup = None
+                key = '{0}:{1}'.format(attribute.prefix, attribute.name)
+            else:
+                key = attribute.name
+                lookup = key
+            attributes.append((key, lookup, attribute.prefix, attribute.name))
+        children = []
+        plurality = {}
+        pcdata = False
+        for tag, multiple in element_children(element_def.content):
+            if tag == 'pcdata':
+                pcdata = True
+            elif tag in plurality:
+                plurality[tag] = plurality[tag] or multiple
+            else:
+                plurality[tag] = multiple
+                children.append(tag)
+        children = tuple((tag, plurality[tag]) for tag in children)
+        field_names = ['node', 'attrs'] + [tag for tag, _m in children]
+        if pcdata:
+            field_names.append('text')
+        table[element_def.name] = ElementModel(tuple(attributes),
+                                               children,
+                                               pcdata,
+                                               coerce_name(element_def.name),
+                                               tuple(coerce_name(i) for i in field_names))
+    return table
+
+
+#Errors which indicate that a document relies on entities from its DTD
+UNDECLARED_ENTITY_ERRORS = set([etree.ErrorTypes.ERR_UNDECLARED_ENTITY,
+                                etree.ErrorTypes.WAR_UNDECLARED_ENTITY])
+
+
+class BundledDTDResolver(etree.Resolver):
+    """
+    Resolves the DOCTYPE of supported documents to the DTD files bundled with
+    OpenAccess_EPUB by public id. Any other request for a network resource is
+    answered with an empty document, so that parsing never waits on the
+    network. Relative system ids (the DTD modules) are left to the parser.
+    """
+    def __init__(self, specifications=dtds):
+        super(BundledDTDResolver, self).__init__()
+        self.specifications = specifications
+
+    def resolve(self, system_url, public_id, context):
+        if public_id in self.specifications:
+            return self.resolve_filename(self.specifications[public_id].path,
+                                         context)
+        if system_url and re.match('[a-zA-Z]+://', system_url) and \
+                not system_url.startswith('file:'):
+            log.warning('Refusing network lookup of {0}'.format(system_url))
+            return self.resolve_string('', context)
+        return None
+
+
+#Parser options shared by every parse site
+PARSER_OPTIONS = {'no_network': True,
+                  'huge_tree': True,
+                  'resolve_entities': True}
+
+#Parsers may not be shared across threads, so each thread gets its own
+_parsers = threading.local()
+
+
+def get_parser(load_dtd=False):
+    """
+    Returns this thread's shared XMLParser. By default the DTD is not loaded,
+    which is all that most documents need; with load_dtd the bundled DTD is
+    loaded through the BundledDTDResolver so that its entities are defined.
+    """
+    name = 'dtd_parser' if load_dtd else 'parser'
+    parser = getattr(_parsers, name, None)
+    if parser is None:
+        parser = etree.XMLParser(load_dtd=load_dtd, **PARSER_OPTIONS)
+        parser.resolvers.add(BundledDTDResolver())
+        setattr(_parsers, name, parser)
+    return parser
+
+
+def needs_dtd(error_log):
+    """
+    True if the error log of a parse (or of an XMLSyntaxError) shows entities
+    that are only defined in the document's DTD.
+    """
+    return any(entry.type in UNDECLARED_ENTITY_ERRORS for entry in error_log)
+
+
+def parse(xml_file):
+    """
+    Parses an article XML file with the shared parser. If the document uses
+    entities defined by its DTD, it is parsed again with the bundled DTD
+    loaded.
+    """
+    try:
+        return etree.parse(xml_file, get_parser())
+    except etree.XMLSyntaxError as err:
+        if not needs_dtd(err.error_log):
+            raise
+    log.debug('Loading DTD to parse entities in {0}'.format(xml_file))
+    return etree.parse(xml_file, get_parser(load_dtd=True))
+
+
+def iterparse(xml_file, load_dtd=False, **kwargs):
+    """
+    Returns an lxml.etree.iterparse over the file with the same options and
+    resolver as the shared parsers. Unlike parse(), an iterparse without the
+    DTD may silently drop undeclared entities; check its error_log with
+    needs_dtd().
+    """
+    options = dict(PARSER_OPTIONS)
+    options.update(kwargs)
+    context = etree.iterparse(xml_file, load_dtd=load_dtd, **options)
+    context.resolvers.add(BundledDTDResolver())
+    return context
+
+
+#The process-wide registry
+registry = DTDRegistry()
+
+
+def get_dtd(public_id):
+    """
+    Returns the compiled DTD for the public id from the process-wide registry.
+    """
+    return registry.get(public_id)
+
+
+def sniff_public_id(xml_file, size=4096):
+    """
+    Reads the DOCTYPE public id from the head of a file without parsing the
+    whole document. Returns None if no public id could be found.
+    """
+    with open(xml_file, 'rb') as xml:
+        head = xml.read(size)
+    match = DOCTYPE_PUBLIC.search(head)
+    if match is None:
+        return None
+    return match.group(2).decode('utf-8', 'replace')
@@ -16,6 +16,19 @@ import logging
 
 log = logging.getLogger('openaccess_epub.utils.element_methods')
 
+#The namespace of MathML, which articles may give their formulas in
+MATHML_NS = 'http://www.w3.org/1998/Math/MathML'
+
+def last_child(element):
+    """
+    Returns the last child of the element, or None if it has no children. This
+    takes constant time, where len(element) counts all of the children.
+    """
+    try:
+        return element[-1]
+    except IndexError:
+        return None
+
 def append_new_text(destination, text, join_str=None):
     """
     This method provides the functionality of adding text appropriately
@@ -24,8 +37,8 @@ def append_new_text(destination, text, join_str=None):
     """
     if join_str is None:
         join_str = ' '
-    if len(destination) > 0:  # Destination has children
-        last = destination[-1]
+    last = last_child(destination)
+    if last is not None:  # Destination has children
         if last.tail is None:  # Last child has no tail
             last.tail = text
         else:  # Last child has a tail
@@ -36,7 +49,7 @@ def append_new_text(destination, text, join_str=None):
         else:  # Destination has a text
             destination.text = join_str.join([destination.text, text])
 
-def append_all_below(destination, source, join_str=None):
+def append_all_below(destination, source, join_str=None, move=False):
     """
     Compared to xml.dom.minidom, lxml's treatment of text as .text and .tail
     attributes of elements is an oddity. It can even be a little frustrating
@@ -44,24 +57,31 @@ def append_all_below(destination, source, join_str=None):
     another element; one has to write in extra code to handle the text. This
     method provides the functionality of adding everything underneath the
     source element, in preserved order, to the destination element.
+
+    The children of the source are copied, unless move is True, in which case
+    they are moved to the destination and the source is left without them.
+    This is cheaper, and should be used if the source will be discarded.
     """
     if join_str is None:
         join_str = ' '
     if source.text is not None:  # If source has text
-        if len(destination) == 0:  # Destination has no children
+        last = last_child(destination)
+        if last is None:  # Destination has no children
             if destination.text is None:  # Destination has no text
                 destination.text = source.text
             else:  # Destination has a text
                 destination.text = join_str.join([destination.text, source.text])
         else:  # Destination has children
-            #Select last child
-            last = destination[-1]
             if last.tail is None:  # Last child has no tail
                 last.tail = source.text
             else:  # Last child has a tail
                 last.tail = join_str.join([last.tail, source.text])
-    for each_child in source:
-        destination.append(deepcopy(each_child))
+    if move:
+        for each_child in list(source):
+            destination.append(each_child)
+    else:
+        for each_child in source:
+            destination.append(deepcopy(each_child))
 
 def all_text(element):
     """
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+A concurrent HTTP fetcher for the images of articles.
+
+Files are downloaded by a bounded pool of worker threads. Connections are kept
+open and reused for each host, the requests to a host are spaced out by its
+rate limit, and a request which fails with a server error or a dropped
+connection is tried again after an exponentially growing, randomly jittered
+delay. Each download succeeds or fails on its own, and the failures are
+reported to the caller rather than abandoning the rest.
+"""
+
+from openaccess_epub._version import __version__
+import os
+import time
+import random
+import logging
+import threading
+import http.client
+import urllib.parse
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger('utils.fetch')
+
+#A file to download: its URL and the path to write it to
+FetchJob = namedtuple('FetchJob', 'url, path')
+
+#The outcome of a FetchJob: the HTTP status of the last response (None if
+#there was none), and a description of the failure, or None on success
+FetchResult = namedtuple('FetchResult', 'url, path, status, error')
+
+#A response to a request: the URL it came from, after any redirects, its
+#status, its Retry-After header or None, and its body
+Response = namedtuple('Response', 'url, status, retry_after, body')
+
+#Responses which are worth trying again after a delay
+RETRY_STATUSES = set([429, 500, 502, 503, 504])
+
+REDIRECT_STATUSES = set([301, 302, 303, 307, 308])
+
+USER_AGENT = 'OpenAccess_EPUB/{0}'.format(__version__)
+
+
+class HostPool(object):
+    """
+    The idle connections to one host, and the time at which the next request
+    to it may start under the rate limit, which is given in requests per
+    second (None for no limit).
+    """
+    def __init__(self, scheme, netloc, rate=None, timeout=30):
+        self.scheme = scheme
+        self.netloc = netloc
+        self.interval = 1.0 / rate if rate else 0.0
+        self.timeout = timeout
+        self.idle = []
+        self.next_start = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Waits for the rate limit and returns an idle connection, or a new one
+        if there are none. Returns (connection, reused).
+        """
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+            connection = self.idle.pop() if self.idle else None
+        if start > now:
+            time.sleep(start - now)
+        if connection is not None:
+            return connection, True
+        if self.scheme == 'https':
+            connection = http.client.HTTPSConnection(self.netloc,
+                                                     timeout=self.timeout)
+        else:
+            connection = http.client.HTTPConnection(self.netloc,
+                                                    timeout=self.timeout)
+        return connection, False
+
+    def release(self, connection):
+        """
+        Returns a connection to the pool. A connection which has been closed is
+        opened again when it is next used.
+        """
+        with self.lock:
+            self.idle.append(connection)
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for connection in idle:
+            connection.close()
+
+
+class Fetcher(object):
+    """
+    Downloads FetchJobs with up to workers threads, keeping a HostPool of
+    connections for each host.
+
+    A download which fails with one of RETRY_STATUSES or a connection error is
+    tried up to retries more times. The delay before retry n is drawn at random
+    between 0 and backoff * 2 ** (n - 1) seconds, capped at max_delay, or is
+    the server's Retry-After if that is longer. rate limits the requests to
+    each host per second, None for no limit.
+
+    The connections belong to the process which opened them, so, like a
+    ValidationCache, a Fetcher may be created before forking worker processes.
+    """
+    def __init__(self, workers=4, rate=None, retries=4, backoff=0.5,
+                 max_delay=30, timeout=30, max_redirects=5):
+        self.workers = workers
+        self.rate = rate
+        self.retries = retries
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self._pools = {}
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def pool(self, scheme, netloc):
+        """
+        Returns the HostPool for the host, creating it on first use.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pools = {}
+                self._pid = os.getpid()
+            try:
+                return self._pools[(scheme, netloc)]
+            except KeyError:
+                pool = HostPool(scheme, netloc, self.rate, self.timeout)
+                self._pools[(scheme, netloc)] = pool
+                return pool
+
+    def request(self, url):
+        """
+        Makes a GET request for the url on a pooled connection, following
+        redirects, and returns the Response. Raises http.client.HTTPException
+        or OSError if the request fails.
+        """
+        for _redirect in range(self.max_redirects + 1):
+            parts = urllib.parse.urlsplit(url)
+            pool = self.pool(parts.scheme, parts.netloc)
+            path = parts.path or '/'
+            if parts.query:
+                path = '{0}?{1}'.format(path, parts.query)
+            connection, reused = pool.acquire()
+            try:
+                try:
+                    response = self.get(connection, path)
+                except (http.client.RemoteDisconnected, ConnectionResetError,
+                        BrokenPipeError):
+                    #The server may have closed an idle connection, so a
+                    #reused one is given a single immediate second chance
+                    if not reused:
+                        raise
+                    connection.close()
+                    response = self.get(connection, path)
+                body = response.read()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                raise
+            finally:
+                pool.release(connection)
+            location = response.getheader('Location')
+            if response.status in REDIRECT_STATUSES and location:
+                url = urllib.parse.urljoin(url, location)
+                continue
+            return Response(url, response.status,
+                            response.getheader('Retry-After'), body)
+        raise http.client.HTTPException('Too many redirects for {0}'.format(url))
+
+    def get(self, connection, path):
+        connection.request('GET', path, headers={'User-Agent': USER_AGENT})
+        return connection.getresponse()
+
+    def delay(self, attempt, retry_after=None):
+        """
+        Returns the seconds to wait before retry number attempt.
+        """
+        delay = random.uniform(0, min(self.max_delay,
+                                      self.backoff * 2 ** (attempt - 1)))
+        try:
+            delay = max(delay, min(self.max_delay, float(retry_after)))
+        except (TypeError, ValueError):  # None, or an HTTP date
+            pass
+        return delay
+
+    def retrieve(self, url):
+        """
+        Requests the url, with retries, and returns (response, error): the last
+        Response, or None if there was none, and a description of the failure,
+        or None if the response has status 200.
+        """
+        response, error = None, None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                retry_after = response.retry_after if response else None
+                time.sleep(self.delay(attempt, retry_after))
+            try:
+                response = self.request(url)
+            except (http.client.HTTPException, OSError) as err:
+                response = None
+                error = str(err) or type(err).__name__
+                log.debug('Fetching {0} failed: {1}'.format(url, error))
+                continue
+            if response.status == 200:
+                return response, None
+            error = 'HTTP {0}'.format(response.status)
+            log.debug('Fetching {0} failed: {1}'.format(url, error))
+            if response.status not in RETRY_STATUSES:
+                break
+        return response, error
+
+    def fetch(self, job):
+        """
+        Downloads a single FetchJob, with retries, and returns its FetchResult.
+        The file is only written to job.path once it is complete.
+        """
+        response, error = self.retrieve(job.url)
+        if error is None:
+            partial = job.path + '.part'
+            with open(partial, 'wb') as output:
+                output.write(response.body)
+            os.replace(partial, job.path)
+        status = response.status if response is not None else None
+        return FetchResult(job.url, job.path, status, error)
+
+    def fetch_all(self, jobs):
+        """
+        Downloads the FetchJobs concurrently and returns their FetchResults,
+        in the same order.
+        """
+        jobs = list(jobs)
+        if not jobs:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(jobs))) as executor:
+            return list(executor.map(self.fetch, jobs))
+
+    def close(self):
+        """
+        Closes the idle connections of this process.
+        """
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            pool.close()
+
+
+#The Fetcher shared by the image fetching functions
+_fetcher = None
+
+
+def get_fetcher():
+    """
+    Returns the shared Fetcher, so that connections are reused from one
+    article to the next.
+    """
+    global _fetcher
+    if _fetcher is None:
+        _fetcher = Fetcher()
+    return _fetcher
@@ -0,0 +1,559 @@
+# -*- coding: utf-8 -*-
+"""
+A content-addressed cache of article images.
+
+Every distinct image file is stored once, as a blob named by the SHA-256 of its
+bytes, so files shared between articles, such as publisher logos and repeated
+equation glyphs, take the space of one. An SQLite index records the images of
+each article by name and digest, the size of each blob, and when each article
+was last used. Images are placed into the ePub from the cache by reflink (a
+copy-on-write clone) or hard link where the filesystem allows, so that a cache
+hit costs almost no I/O, and by copying otherwise.
+
+The cache may be given a size limit, beyond which the articles used least
+recently are evicted, along with the blobs no other article shares.
+
+As placed files may share their storage with the cache, they must never be
+written to: a stage which changes an image must write a new file in its place.
+"""
+
+from openaccess_epub.utils.validation import file_digest
+import os
+import re
+import time
+import errno
+import shutil
+import sqlite3
+import logging
+import tempfile
+import threading
+from collections import namedtuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+log = logging.getLogger('utils.image_cache')
+
+#The Linux ioctl which clones a file, on filesystems which support it
+FICLONE = 0x40049409
+
+#The devices on which a reflink has failed, which are not tried again
+_no_reflink = set()
+
+#When the size limit is exceeded, articles are evicted until the cache is
+#within this fraction of it, so that eviction is not needed on every store
+PRUNE_TO = 0.9
+
+#A summary of the cache: the numbers of articles, files, distinct blobs and
+#transcodes, the bytes of the blobs, the bytes the files would take if none
+#were shared, and the earliest and latest times at which an article was used
+CacheStats = namedtuple('CacheStats', 'articles, files, blobs, transcodes, size, logical_size, oldest, newest')
+
+SIZE_UNITS = {'': 1, 'K': 2 ** 10, 'M': 2 ** 20, 'G': 2 ** 30, 'T': 2 ** 40}
+
+
+def parse_size(size):
+    """
+    Returns the bytes in a size such as 500M or 20G, or None for None or an
+    empty string. Raises ValueError if the size is not understood.
+    """
+    if size is None or isinstance(size, int):
+        return size
+    size = size.strip().upper()
+    if not size or size == 'NONE':
+        return None
+    match = re.match(r'^(\d+(?:\.\d+)?)\s*([KMGT]?)I?B?$', size)
+    if match is None:
+        raise ValueError('Could not understand the size {0}'.format(size))
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+def format_size(size):
+    """
+    Returns a number of bytes as a short readable string, such as 1.5 GiB.
+    """
+    for unit in ['B', 'KiB', 'MiB', 'GiB']:
+        if size < 1024:
+            break
+        size /= 1024.0
+    else:
+        unit = 'TiB'
+    if unit == 'B':
+        return '{0} B'.format(int(size))
+    return '{0:.1f} {1}'.format(size, unit)
+
+
+def reflink(source, destination):
+    """
+    Clones the source file to destination, sharing its storage until either is
+    changed. Returns False, leaving no destination, where this is unsupported.
+    """
+    if fcntl is None:
+        return False
+    try:
+        device = os.stat(os.path.dirname(destination) or '.').st_dev
+    except OSError:
+        return False
+    if device in _no_reflink:
+        return False
+    try:
+        with open(source, 'rb') as src, open(destination, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    except OSError as err:
+        if os.path.lexists(destination):
+            os.remove(destination)
+        if err.errno in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV,
+                         errno.EINVAL, errno.EBADF, errno.EPERM):
+            _no_reflink.add(device)
+        return False
+    return True
+
+
+def place_file(source, destination):
+    """
+    Places the source file at destination, replacing any file there, by
+    reflink, or else by hard link, or else by copying. Returns the method
+    used: 'reflink', 'link' or 'copy'.
+    """
+    if os.path.lexists(destination):
+        os.remove(destination)
+    if reflink(source, destination):
+        return 'reflink'
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+        return 'copy'
+    return 'link'
+
+
+class ImageCache(object):
+    """
+    The image cache under root. The blobs are kept as blobs/<ab>/<sha256>,
+    where <ab> are the first two digits of the digest, and the index as
+    index.sqlite. max_size is the limit on the bytes of the blobs, None for
+    no limit.
+
+    The cache used to hold a copy of each article's images in the directory
+    <journal doi>/<article doi>; such a directory is taken into the blobs the
+    first time the article is looked up, or when the cache is pruned.
+
+    The index also records the transcodes of images for the device profiles
+    of utils.transcode, which are kept as blobs and evicted with their source.
+
+    Like a ValidationCache, the index connection is opened lazily and reopened
+    in a new process, so an instance may be created before forking.
+    """
+    def __init__(self, root, max_size=None):
+        self.root = root
+        self.max_size = max_size
+        self.blob_dir = os.path.join(root, 'blobs')
+        self.index_path = os.path.join(root, 'index.sqlite')
+        self.placed = dict((method, 0) for method in ['reflink', 'link', 'copy'])
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+
+    @property
+    def connection(self):
+        if self._connection is None or self._pid != os.getpid():
+            os.makedirs(self.root, exist_ok=True)
+            #Threads of one process share the connection under self._lock
+            self._connection = sqlite3.connect(self.index_path, timeout=60,
+                                               check_same_thread=False)
+            #A write lost in a crash costs no more than fetching the images
+            #again, so commits need not wait on the disk; WAL also lets the
+            #readers in other processes carry on while one writes
+            self._connection.executescript('''
+                PRAGMA journal_mode=WAL;
+                PRAGMA synchronous=NORMAL;
+                CREATE TABLE IF NOT EXISTS articles
+                    (doi TEXT PRIMARY KEY,
+                     stored REAL NOT NULL,
+                     accessed REAL NOT NULL);
+                CREATE INDEX IF NOT EXISTS articles_accessed
+                    ON articles (accessed);
+                CREATE TABLE IF NOT EXISTS files
+                    (doi TEXT NOT NULL,
+                     name TEXT NOT NULL,
+                     sha256 TEXT NOT NULL,
+                     PRIMARY KEY (doi, name));
+                CREATE INDEX IF NOT EXISTS files_sha256 ON files (sha256);
+                CREATE TABLE IF NOT EXISTS blobs
+                    (sha256 TEXT PRIMARY KEY,
+                     size INTEGER NOT NULL);
+                CREATE TABLE IF NOT EXISTS transcodes
+                    (sha256 TEXT NOT NULL,
+                     profile TEXT NOT NULL,
+                     result TEXT,
+                     extension TEXT,
+                     stored REAL NOT NULL,
+                     PRIMARY KEY (sha256, profile));
+                CREATE INDEX IF NOT EXISTS transcodes_result
+                    ON transcodes (result);''')
+            self._connection.commit()
+            self._pid = os.getpid()
+        return self._connection
+
+    def blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def legacy_path(self, doi):
+        journal_doi, article_doi = doi.split('/', 1)
+        return os.path.join(self.root, journal_doi, article_doi)
+
+    def temporary_path(self, path):
+        return '{0}.{1}.{2}.tmp'.format(path, os.getpid(), threading.get_ident())
+
+    def lookup(self, doi):
+        """
+        Returns the manifest of the article, a dictionary of file names to
+        digests, or None if its images are not cached.
+        """
+        with self._lock:
+            connection = self.connection
+            if connection.execute('SELECT 1 FROM articles WHERE doi=?',
+                                  (doi,)).fetchone() is None:
+                return None
+            return dict(connection.execute('''SELECT name, sha256 FROM files
+                                              WHERE doi=?''', (doi,)))
+
+    def store_file(self, path):
+        """
+        Adds the file to the blobs, if it is not already there, and returns
+        its digest and size.
+        """
+        digest = file_digest(path)
+        blob = self.blob_path(digest)
+        if not os.path.isfile(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            #Concurrent writers of the same blob each rename a complete file
+            temporary = self.temporary_path(blob)
+            place_file(path, temporary)
+            os.replace(temporary, blob)
+        return digest, os.path.getsize(blob)
+
+    def store(self, doi, directory, accessed=None, prune=True):
+        """
+        Adds the images in the directory to the cache as the images of the
+        article, replacing any it had, and returns its manifest. accessed is
+        the time the article was last used, which defaults to now. If prune is
+        True, the cache is then pruned if it is over its size limit.
+        """
+        manifest, sizes = {}, {}
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                digest, sizes[digest] = self.store_file(path)
+                manifest[name] = digest
+        now = time.time()
+        with self._lock, self.connection as connection:
+            replaced = [row[0] for row in connection.execute('''SELECT DISTINCT
+                sha256 FROM files WHERE doi=?''', (doi,))]
+            connection.execute('DELETE FROM files WHERE doi=?', (doi,))
+            connection.execute('INSERT OR REPLACE INTO articles VALUES (?, ?, ?)',
+                               (doi, now, accessed or now))
+            connection.executemany('INSERT INTO files VALUES (?, ?, ?)',
+                                   [(doi, name, digest) for name, digest in manifest.items()])
+            connection.executemany('INSERT OR IGNORE INTO blobs VALUES (?, ?)',
+                                   sizes.items())
+            #The images it had before, which nothing else has, are dropped
+            unshared, _freed = self.release(connection, replaced)
+        self.remove_blobs(unshared)
+        log.info('Cached {0} images for {1}'.format(len(manifest), doi))
+        if prune:
+            self.enforce_limit()
+        return manifest
+
+    def enforce_limit(self):
+        """
+        Prunes the cache to PRUNE_TO of its size limit if it is over the limit.
+        """
+        if self.max_size is not None and self.size() > self.max_size:
+            self.prune(int(self.max_size * PRUNE_TO))
+
+    def store_legacy(self, doi, accessed=None, prune=True):
+        """
+        Takes the legacy directory of the article into the blobs and removes
+        it. Returns the manifest, or None if there is no such directory. If
+        prune is True, the cache is then pruned as by store().
+        """
+        legacy = self.legacy_path(doi)
+        if not os.path.isdir(legacy):
+            return None
+        log.info('Taking {0} into the image cache blobs'.format(legacy))
+        #The directory is moved aside first, so that nothing takes it twice
+        work_dir = tempfile.mkdtemp(prefix='legacy-', dir=self.root)
+        moved = os.path.join(work_dir, 'images')
+        try:
+            os.rename(legacy, moved)
+        except FileNotFoundError:  # Taken by another process meanwhile
+            os.rmdir(work_dir)
+            return self.lookup(doi)
+        try:
+            manifest = self.store(doi, moved, accessed, prune=False)
+        finally:
+            shutil.rmtree(work_dir)
+        if prune:
+            self.enforce_limit()
+        return manifest
+
+    def store_all_legacy(self):
+        """
+        Takes every legacy directory into the blobs, with the time it was last
+        changed as the time it was last used. Returns how many were taken.
+        """
+        count = 0
+        for journal_doi in os.listdir(self.root):
+            journal_dir = os.path.join(self.root, journal_doi)
+            #Every DOI prefix begins with 10.
+            if not journal_doi.startswith('10.') or not os.path.isdir(journal_dir):
+                continue
+            for article_doi in os.listdir(journal_dir):
+                doi = '{0}/{1}'.format(journal_doi, article_doi)
+                accessed = os.path.getmtime(os.path.join(journal_dir, article_doi))
+                if self.store_legacy(doi, accessed, prune=False) is not None:
+                    count += 1
+            if not os.listdir(journal_dir):
+                os.rmdir(journal_dir)
+        return count
+
+    def touch(self, doi):
+        """
+        Records that the images of the article were used now.
+        """
+        with self._lock, self.connection as connection:
+            connection.execute('UPDATE articles SET accessed=? WHERE doi=?',
+                               (time.time(), doi))
+
+    def place(self, doi, img_dir):
+        """
+        Places the cached images of the article in img_dir, creating it.
+        Returns False if they are not cached, or some are missing.
+        """
+        manifest = self.lookup(doi)
+        if manifest is None:
+            manifest = self.store_legacy(doi)
+            if manifest is None:
+                return False
+        blobs = [(name, self.blob_path(digest)) for name, digest in manifest.items()]
+        if not all(os.path.isfile(blob) for _name, blob in blobs):
+            log.warning('Cached images for {0} are incomplete'.format(doi))
+            return False
+        os.makedirs(img_dir, exist_ok=True)
+        try:
+            for name, blob in blobs:
+                method = place_file(blob, os.path.join(img_dir, name))
+                with self._lock:
+                    self.placed[method] += 1
+        except FileNotFoundError:  # Evicted by another process meanwhile
+            log.warning('Cached images for {0} were evicted'.format(doi))
+            return False
+        self.touch(doi)
+        log.info('Cached image directory found for {0}'.format(doi))
+        return True
+
+    def transcoded(self, digest, profile):
+        """
+        Returns the transcode of the blob for the key of an image profile, see
+        store_transcoded(), as (digest, extension), where both are None if the
+        image is kept as it is, or None if it has not been transcoded.
+        """
+        with self._lock:
+            row = self.connection.execute('''SELECT result, extension
+                                             FROM transcodes
+                                             WHERE sha256=? AND profile=?''',
+                                          (digest, profile)).fetchone()
+        if row is None or (row[0] is not None and not os.path.isfile(self.blob_path(row[0]))):
+            return None
+        return tuple(row)
+
+    def store_transcoded(self, digest, profile, path=None, extension=None):
+        """
+        Records the transcode of the blob for the image profile: the file at
+        path, which is added to the blobs, with its extension, or None if the
+        image is kept as it is. Returns the digest of the transcode or None.
+
+        The profile is the key of a profile's name and settings, as made by
+        transcode.profile_key(); the transcodes of the blob for other settings
+        of the same name are replaced.
+        """
+        result, size = self.store_file(path) if path is not None else (None, 0)
+        name = profile.rsplit(':', 3)[0]
+        with self._lock, self.connection as connection:
+            stale = [row for row in connection.execute('''SELECT profile, result
+                                                          FROM transcodes
+                                                          WHERE sha256=?''', (digest,))
+                     if row[0] != profile and row[0].rsplit(':', 3)[0] == name]
+            for stale_profile, _stale_result in stale:
+                connection.execute('DELETE FROM transcodes WHERE sha256=? AND profile=?',
+                                   (digest, stale_profile))
+            if result is not None:
+                connection.execute('INSERT OR IGNORE INTO blobs VALUES (?, ?)',
+                                   (result, size))
+            connection.execute('INSERT OR REPLACE INTO transcodes VALUES (?, ?, ?, ?, ?)',
+                               (digest, profile, result, extension, time.time()))
+            stale_results = [row[1] for row in stale if row[1] is not None]
+            unshared, _freed = self.release(connection, stale_results)
+        self.remove_blobs(unshared)
+        return result
+
+    def size(self):
+        """
+        Returns the bytes of the blobs in the cache.
+        """
+        with self._lock:
+            return self.connection.execute('''SELECT COALESCE(SUM(size), 0)
+                                              FROM blobs''').fetchone()[0]
+
+    def stats(self):
+        """
+        Returns the CacheStats of the cache.
+        """
+        with self._lock:
+            connection = self.connection
+            articles, oldest, newest = connection.execute('''SELECT COUNT(*),
+                MIN(accessed), MAX(accessed) FROM articles''').fetchone()
+            files, logical_size = connection.execute('''SELECT COUNT(*),
+                COALESCE(SUM(size), 0) FROM files
+                JOIN blobs USING (sha256)''').fetchone()
+            blobs, size = connection.execute('''SELECT COUNT(*),
+                COALESCE(SUM(size), 0) FROM blobs''').fetchone()
+            transcodes = connection.execute('''SELECT COUNT(*) FROM transcodes
+                                               WHERE result IS NOT NULL''').fetchone()[0]
+        return CacheStats(articles, files, blobs, transcodes, size, logical_size,
+                          oldest, newest)
+
+    def release(self, connection, digests):
+        """
+        Removes the blobs of the digests from the index, unless an article or a
+        transcode still refers to them, along with their own transcodes.
+        Returns the digests removed and their bytes, for the blob files to be
+        deleted once the transaction is committed.
+        """
+        digests = list(digests)
+        unshared, freed = [], 0
+        while digests:
+            digest = digests.pop()
+            if connection.execute('''SELECT 1 FROM files WHERE sha256=?
+                                     UNION ALL SELECT 1 FROM transcodes
+                                     WHERE result=? LIMIT 1''',
+                                  (digest, digest)).fetchone() is not None:
+                continue
+            #The transcodes of an image go with it
+            digests.extend(row[0] for row in connection.execute('''SELECT
+                result FROM transcodes WHERE sha256=? AND result IS NOT
+                NULL''', (digest,)))
+            connection.execute('DELETE FROM transcodes WHERE sha256=?', (digest,))
+            row = connection.execute('SELECT size FROM blobs WHERE sha256=?',
+                                     (digest,)).fetchone()
+            connection.execute('DELETE FROM blobs WHERE sha256=?', (digest,))
+            freed += row[0] if row else 0
+            unshared.append(digest)
+        return unshared, freed
+
+    def remove_blobs(self, digests):
+        for digest in digests:
+            try:
+                os.remove(self.blob_path(digest))
+            except FileNotFoundError:
+                pass
+
+    def evict(self, doi):
+        """
+        Removes the article from the index, and the blobs which no other
+        article shares from the cache, with their transcodes. Returns the bytes
+        freed.
+        """
+        with self._lock, self.connection as connection:
+            digests = [row[0] for row in connection.execute('''SELECT DISTINCT
+                sha256 FROM files WHERE doi=?''', (doi,))]
+            connection.execute('DELETE FROM files WHERE doi=?', (doi,))
+            connection.execute('DELETE FROM articles WHERE doi=?', (doi,))
+            unshared, freed = self.release(connection, digests)
+        self.remove_blobs(unshared)
+        return freed
+
+    def evict_orphan_transcode(self):
+        """
+        Removes the oldest transcode of an image which no cached article has,
+        as made for images placed from outside the cache. Returns the bytes
+        freed, or None if there are no such transcodes.
+        """
+        with self._lock, self.connection as connection:
+            row = connection.execute('''SELECT sha256, profile, result
+                FROM transcodes WHERE NOT EXISTS (SELECT 1 FROM files
+                WHERE files.sha256=transcodes.sha256)
+                ORDER BY stored LIMIT 1''').fetchone()
+            if row is None:
+                return None
+            connection.execute('''DELETE FROM transcodes WHERE sha256=?
+                                    AND profile=?''', row[:2])
+            unshared, freed = self.release(connection, [row[2]] if row[2] else [])
+        self.remove_blobs(unshared)
+        return freed
+
+    def prune(self, max_size=None):
+        """
+        Evicts the articles used least recently until the blobs take no more
+        than max_size bytes, which defaults to the size limit; 0 empties the
+        cache. The transcodes of images which no cached article has are
+        evicted before any article, oldest first. Legacy directories are taken
+        into the blobs first, so that they are counted. Returns the number of
+        articles evicted and the bytes freed.
+        """
+        if max_size is None:
+            max_size = self.max_size
+        if max_size is None:
+            return 0, 0
+        self.store_all_legacy()
+        size = self.size()
+        evicted, freed = 0, 0
+        while size > max_size:
+            bytes_freed = self.evict_orphan_transcode()
+            if bytes_freed is None:
+                break
+            freed += bytes_freed
+            size -= bytes_freed
+        while size > max_size:
+            with self._lock:
+                row = self.connection.execute('''SELECT doi FROM articles
+                                                 ORDER BY accessed LIMIT 1''').fetchone()
+            if row is None:
+                break
+            bytes_freed = self.evict(row[0])
+            log.info('Evicted the images of {0} from the cache'.format(row[0]))
+            evicted += 1
+            freed += bytes_freed
+            size -= bytes_freed
+        return evicted, freed
+
+
+#Shared ImageCache instances, by root
+_caches = {}
+
+
+def get_cache(root, max_size=None):
+    """
+    Returns the shared ImageCache for the root directory, setting its size
+    limit in bytes if one is given.
+    """
+    try:
+        cache = _caches[root]
+    except KeyError:
+        cache = ImageCache(root)
+        _caches[root] = cache
+    if max_size is not None:
+        cache.max_size = max_size
+    return cache
+
+
+def config_cache(config):
+    """
+    Returns the shared ImageCache configured by the config module. Config files
+    written before image_cache_size was added have no size limit.
+    """
+    return get_cache(config.image_cache,
+                     parse_size(getattr(config, 'image_cache_size', None)))
@@ -3,14 +3,14 @@
 Utility suite for handling images.
 """
 
-import urllib.request
-import urllib.error
-import time
 import re
 import os.path
 import shutil
 import logging
 import openaccess_epub.utils as utils
+from openaccess_epub.utils.fetch import FetchJob, get_fetcher
+from openaccess_epub.utils.element_methods import MATHML_NS
+from openaccess_epub.utils.image_cache import config_cache
 
 
 log = logging.getLogger('utils.images')
@@ -32,37 +32,19 @@ def local_images(images_path, outdirect, doi):
             shutil.copy2(item_path, epub_img_dir)
 
 
-def move_images_to_cache(source, destination):
-    """
-    Handles the movement of images to the cache. Must be helpful if it finds
-    that the folder for this article already exists.
-    """
-    print('Moving images to cache, {0}'.format(destination))
-    try:
-        shutil.copytree(source, destination)
-    except OSError:  # Should occur if the folder already exists
-        print('An image cache for this article already appears to exist!')
-        print('Would you like to replace it?')
-        choice = raw_input('[y/N]')
-        if choice in ['y', 'Y']:
-            shutil.rmtree(destination)
-            log.debug('Previous cache removed: {0}'.format(destination))
-            shutil.copytree(source, destination)
-
-
-def explicit_images(images, config, img_dir):
+def explicit_images(images, config, img_dir, doi):
     """
     The method used to handle an explicitly defined image directory by the
     user as a parsed argument.
     """
     log.info('Explicit image directory specified: {0}'.format(images))
-    shutil.copytree(manual_images, img_dir)
+    shutil.copytree(images, img_dir)
     if config.use_image_cache:
-        move_images_to_cache(manual_images, article_cache)
+        config_cache(config).store(doi, img_dir)
     return True
 
 
-def input_relative_images(config, img_dir):
+def input_relative_images(config, img_dir, doi):
     """
     The method used to handle Input-Relative image inclusion.
     """
@@ -71,23 +53,12 @@ def input_relative_images(config, img_dir):
             log.info('Input-Relative image directory found: {0}'.format(dir))
             shutil.copytree(dir, img_dir)
             if config.use_image_cache:
-                move_images_to_cache(dir, article_cache)
+                config_cache(config).store(doi, img_dir)
             return True
     return False
 
 
-def image_cache(article_cache, img_dir):
-    """
-    The method to be used by get_images() for copying images out of the cache.
-    """
-    if os.path.isdir(article_cache):
-        log.info('Cached image directory found: {0}'.format(article_cache))
-        shutil.copytree(article_cache, img_dir)
-        return True
-    return False
-
-
-def get_images(doi, outdirect, images, config, document):
+def get_images(doi, outdirect, images, config, document, mathml=False):
     """
     This controls the logic for placing the appropriate image files into the
     ePub directory.
@@ -102,6 +73,10 @@ def get_images(doi, outdirect, images, config, document):
     images from the internet (publisher's website).
 
     Caching=True will ensure that the images are added to the cache.
+
+    If mathml is True, the formulas given in MathML will be placed in the ePub
+    as MathML, so their images are not downloaded; as the set of images is
+    then incomplete, it is not added to the cache.
     """
     #Split the DOI
     journal_doi, article_doi = doi.split('/')
@@ -112,39 +87,37 @@ def get_images(doi, outdirect, images, config, document):
     img_dir = os.path.join(outdirect, 'OPS', 'images-{0}'.format(article_doi))
     log.info('Constructed image directory as {0}'.format(img_dir))
 
-    #Construct path to cache for article
-    article_cache = os.path.join(config.image_cache, journal_doi, article_doi)
-
     #Use manual image directory, explicit images
     if images:
         #Explicit images prevents all other image methods
-        return explicit_images(images, config, img_dir)
+        return explicit_images(images, config, img_dir, doi)
 
     #Input-Relative import, looks for any one of the listed options
     if config.use_input_relative_images:
         #Prevents other image methods only if successful
-        if input_relative_images(config, img_dir):
+        if input_relative_images(config, img_dir, doi):
             return True
 
     #Use cache for article if it exists
     if config.use_image_cache:
         #Prevents other image methods only if successful
-        if image_cache(article_cache, img_dir):
+        if config_cache(config).place(doi, img_dir):
             return True
 
     #Download images from Internet
     if config.use_image_fetching:
         os.mkdir(img_dir)
         if journal_doi == '10.3389':
-            fetch_frontiers_images(article_doi, img_dir)
-            if config.use_image_cache:
-                move_images_to_cache(img_dir, article_cache)
-            return True
-        elif journal_doi == '10.1371':
-            success = fetch_plos_images(article_doi, img_dir, document)
+            success = fetch_frontiers_images(doi, img_dir)
             if success:
                 if config.use_image_cache:
-                    move_images_to_cache(img_dir, article_cache)
+                    config_cache(config).store(doi, img_dir)
+            return success
+        elif journal_doi == '10.1371':
+            success = fetch_plos_images(article_doi, img_dir, document, mathml)
+            if success and not mathml:
+                if config.use_image_cache:
+                    config_cache(config).store(doi, img_dir)
             return success
         else:
             print('Fetching images for this publisher is not supported!')
@@ -154,164 +127,216 @@ def get_images(doi, outdirect, images, config, document):
 
 def make_image_cache(img_cache):
     """
-    Initiates the image cache if it does not exist
+    Initiates the image cache if it does not exist, see utils.image_cache
     """
     log.info('Initiating the image cache at {0}'.format(img_cache))
     if not os.path.isdir(img_cache):
         utils.mkdir_p(img_cache)
-        utils.mkdir_p(os.path.join(img_cache, '10.1371'))
-        utils.mkdir_p(os.path.join(img_cache, '10.3389'))
+        utils.mkdir_p(os.path.join(img_cache, 'blobs'))
+
+
+#The images of a Frontiers full text page
+frontiers_image_patterns = [re.compile(p) for p in [
+    r'<a href="(?P<href>http://\w{7}.\w{3}.\w{3}.rackcdn.com/\d{5}/f\w{4}-\d{2}-\d{5}-HTML/image_m/f\w{4}-\d{2}-\d{5}-\D{1,2}\d{3}.\D{3})',
+    r'<a href="(?P<href>http://\w{7}.\w{3}.\w{3}.rackcdn.com/\d{5}/f\w{4}-\d{2}-\d{5}-r2/image_m/f\w{4}-\d{2}-\d{5}-\D{1,2}\d{3}.\D{3})',
+    r'<img src="(?P<src>http://\w{7}.\w{3}.\w{3}.rackcdn.com/\d{5}/f\w{4}-\d{2}-\d{5}-HTML/image_n/f\w{4}-\d{2}-\d{5}-\D{1,2}\d{3}.\D{3})']]
 
+#The inline equation images, named as i001.gif
+frontiers_equation_pattern = re.compile(r'^i(\d{3})\.gif$')
 
-def fetch_frontiers_images(doi, output_dir):
+
+def frontiers_full_text_url(doi, fetcher, doi_url='http://dx.doi.org/{0}'):
+    """
+    Returns the URL of the full text page of a Frontiers article, found by
+    following its DOI to the abstract page. Raises ValueError if it cannot be
+    found.
+    """
+    response, error = fetcher.retrieve(doi_url.format(doi))
+    if error is not None:
+        raise ValueError('Unable to resolve {0}: {1}'.format(doi, error))
+    if response.url.endswith('abstract'):
+        full = response.url[:-len('abstract')] + 'full'
+    elif response.url.endswith('full'):
+        full = response.url
+    else:
+        raise ValueError('Unexpected page for {0}: {1}'.format(doi, response.url))
+    return full
+
+
+def fetch_frontiers_images(doi, output_dir, fetcher=None,
+                           doi_url='http://dx.doi.org/{0}', probe_batch=8):
     """
     Fetch the images from Frontiers' website. This method may fail to properly
     locate all the images and should be avoided if the files can be accessed
     locally. Downloading the images to an appropriate directory in the cache,
     or to a directory specified by passed argument are the preferred means to
     access images.
+
+    The images are found in the full text page and downloaded concurrently by
+    the fetcher, by default the shared one from utils.fetch.get_fetcher().
+    Inline equation images are sometimes not exposed in the page, so the gaps
+    in their numbering are filled, and the numbers after the highest are
+    probed in batches of probe_batch until one is not found. Nothing is
+    written outside of output_dir. Returns True if the page was read and every
+    image found in it was downloaded.
     """
     log.info('Fetching Frontiers images')
     log.warning('This method may fail to locate all images.')
-
-    def download_image(fetch, img_file):
-        try:
-            image = urllib.request.urlopen(fetch)
-        except urllib.error.HTTPError as e:
-            if e.code == 503:  # Server overloaded
-                time.sleep(1)  # Wait one second
-                try:
-                    image = urllib.request.urlopen(fetch)
-                except:
-                    return None
-            elif e.code == 500:
-                print('urllib.error.HTTPError {0}'.format(e.code))
-            return None
-        else:
-            with open(img_file, 'wb') as outimage:
-                outimage.write(image.read())
-        return True
-
-    def check_equation_completion(images):
-        """
-        In some cases, equations images are not exposed in the fulltext (hidden
-        behind a rasterized table). This attempts to look for gaps and fix them
-        """
-        log.info('Checking for complete equations')
-        files = os.listdir(output_dir)
-        inline_equations = []
-        for e in files:
-            if e[0] == 'i':
-                inline_equations.append(e)
-        missing = []
-        highest = 0
-        if inline_equations:
-            inline_equations.sort()
-            highest = int(inline_equations[-1][1:4])
-            i = 1
-            while i < highest:
-                name = 'i{0}.gif'.format(str(i).zfill(3))
-                if name not in inline_equations:
-                    missing.append(name)
-                i += 1
-        get = images[0][:-8]
-        for m in missing:
-            loc = os.path.join(output_dir, m)
-            download_image(get + m, loc)
-            print('Downloaded image {0}'.format(loc))
-        #It is possible that we need to go further than the highest
-        highest += 1
-        name = 'i{0}.gif'.format(str(highest).zfill(3))
-        loc = os.path.join(output_dir, name)
-        while download_image(get + name, loc):
-            print('Downloaded image {0}'.format(loc))
-            highest += 1
-            name = 'i{0}.gif'.format(str(highest).zfill(3))
+    if fetcher is None:
+        fetcher = get_fetcher()
 
     print('Processing images for {0}...'.format(doi))
-    #We use the DOI of the article to locate the page.
-    doistr = 'http://dx.doi.org/{0}'.format(doi)
-    logging.debug('Accessing DOI address-{0}'.format(doistr))
-    page = urllib.request.urlopen(doistr)
-    if page.geturl()[-8:] == 'abstract':
-        full = page.geturl()[:-8] + 'full'
-    elif page.geturl()[-4:] == 'full':
-        full = page.geturl()
+    try:
+        full = frontiers_full_text_url(doi, fetcher, doi_url)
+    except ValueError as err:
+        log.error(str(err))
+        print(err)
+        return False
     print(full)
-    page = urllib.request.urlopen(full)
-    with open('temp', 'w') as temp:
-        temp.write(page.read())
+    response, error = fetcher.retrieve(full)
+    if error is not None:
+        log.error('Unable to fetch {0}: {1}'.format(full, error))
+        return False
+    page = response.body.decode('utf-8', 'replace')
     images = []
-    with open('temp', 'r') as temp:
-        for l in temp.readlines():
-            images += re.findall('<a href="(?P<href>http://\w{7}.\w{3}.\w{3}.rackcdn.com/\d{5}/f\w{4}-\d{2}-\d{5}-HTML/image_m/f\w{4}-\d{2}-\d{5}-\D{1,2}\d{3}.\D{3})', l)
-            images += re.findall('<a href="(?P<href>http://\w{7}.\w{3}.\w{3}.rackcdn.com/\d{5}/f\w{4}-\d{2}-\d{5}-r2/image_m/f\w{4}-\d{2}-\d{5}-\D{1,2}\d{3}.\D{3})', l)
-            images += re.findall('<img src="(?P<src>http://\w{7}.\w{3}.\w{3}.rackcdn.com/\d{5}/f\w{4}-\d{2}-\d{5}-HTML/image_n/f\w{4}-\d{2}-\d{5}-\D{1,2}\d{3}.\D{3})', l)
-    os.remove('temp')
-    for i in images:
-        loc = os.path.join(output_dir, i.split('-')[-1])
-        download_image(i, loc)
-        print('Downloaded image {0}'.format(loc))
+    for pattern in frontiers_image_patterns:
+        for image in pattern.findall(page):
+            if image not in images:
+                images.append(image)
+
+    def jobs_for(urls):
+        return [FetchJob(url, os.path.join(output_dir, url.split('-')[-1]))
+                for url in urls]
+
+    def download(jobs):
+        downloaded = []
+        for result in fetcher.fetch_all(jobs):
+            if result.error is None:
+                print('Downloaded image {0}'.format(result.path))
+                downloaded.append(result)
+        return downloaded
+
+    jobs = jobs_for(images)
+    success = len(download(jobs)) == len(jobs)
     if images:
-        check_equation_completion(images)
+        #Fill the gaps in the inline equation numbers
+        log.info('Checking for complete equations')
+        get = images[0][:-8]
+        numbers = set()
+        for name in os.listdir(output_dir):
+            match = frontiers_equation_pattern.match(name)
+            if match:
+                numbers.add(int(match.group(1)))
+        highest = max(numbers) if numbers else 0
+        missing = [n for n in range(1, highest) if n not in numbers]
+        download(jobs_for([get + 'i{0:03d}.gif'.format(n) for n in missing]))
+        #It is possible that we need to go further than the highest
+        while True:
+            batch = range(highest + 1, highest + 1 + probe_batch)
+            found = download(jobs_for([get + 'i{0:03d}.gif'.format(n) for n in batch]))
+            if len(found) < probe_batch:
+                break
+            highest += probe_batch
     print("Done downloading images")
+    return success
 
 
-def fetch_plos_images(article_doi, output_dir, document):
+def mathml_graphics(root):
     """
-    Fetch the images for a PLoS article from the internet.
-
-    PLoS images are known through the inspection of <graphic> and
-    <inline-graphic> elements. The information in these tags are then parsed
-    into appropriate URLs for downloading.
+    Returns the set of <graphic> and <inline-graphic> elements under root of
+    formulas which are also given in MathML.
     """
-    print('Processing images for {0}...'.format(article_doi))
+    graphics = set()
+    for formula in root.iter('disp-formula', 'inline-formula'):
+        if formula.find('.//{{{0}}}math'.format(MATHML_NS)) is not None:
+            graphics.update(formula.iter('graphic', 'inline-graphic'))
+    return graphics
 
-    #A dict of URLs for PLoS subjournals
-    journal_urls = {'pgen': 'http://www.plosgenetics.org/article/{0}',
-                    'pcbi': 'http://www.ploscompbiol.org/article/{0}',
-                    'ppat': 'http://www.plospathogens.org/article/{0}',
-                    'pntd': 'http://www.plosntds.org/article/{0}',
-                    'pmed': 'http://www.plosmedicine.org/article/{0}',
-                    'pbio': 'http://www.plosbiology.org/article/{0}',
-                    'pone': 'http://www.plosone.org/article/{0}',
-                    'pctr': 'http://clinicaltrials.ploshubs.org/article/{0}'}
 
-    #Identify subjournal name for base URl
-    subjournal_name = article_doi.split('.')[1]
-    base_url = journal_urls[subjournal_name]
+#The URLs of the PLoS subjournals, as format strings taking the resource
+plos_journal_urls = {'pgen': 'http://www.plosgenetics.org/article/{0}',
+                     'pcbi': 'http://www.ploscompbiol.org/article/{0}',
+                     'ppat': 'http://www.plospathogens.org/article/{0}',
+                     'pntd': 'http://www.plosntds.org/article/{0}',
+                     'pmed': 'http://www.plosmedicine.org/article/{0}',
+                     'pbio': 'http://www.plosbiology.org/article/{0}',
+                     'pone': 'http://www.plosone.org/article/{0}',
+                     'pctr': 'http://clinicaltrials.ploshubs.org/article/{0}'}
 
-    #Acquire <graphic> and <inline-graphic> xml elements
-    graphics = document.document.getroot().findall('.//graphic')
-    graphics += document.document.getroot().findall('.//inline-graphic')
 
-    #Begin to download
-    print('Downloading images, this may take some time...')
+def plos_image_jobs(article_doi, output_dir, root, skipped=(), base_url=None):
+    """
+    Returns the FetchJobs for the images of a PLoS article, one for each
+    distinct href of the <graphic> and <inline-graphic> elements under root,
+    except those in skipped. base_url is as for fetch_plos_images().
+    """
+    if base_url is None:
+        subjournal_name = article_doi.split('.')[1]
+        base_url = plos_journal_urls[subjournal_name]
+
+    graphics = root.findall('.//graphic') + root.findall('.//inline-graphic')
+    href = '{http://www.w3.org/1999/xlink}href'
+    jobs = []
+    hrefs = set()
     for graphic in graphics:
-        nsmap = document.document.getroot().nsmap
-        xlink_href = graphic.attrib['{'+nsmap['xlink']+'}'+'href']
+        if graphic in skipped:
+            continue
+        xlink_href = graphic.attrib[href]
+        if xlink_href in hrefs:  # Each image is only downloaded once
+            continue
+        hrefs.add(xlink_href)
         if xlink_href[-4] == 'e' or xlink_href[-3] == 'e':  # Equations are handled differently
             resource = 'fetchObject.action?uri=' + xlink_href + '&representation=PNG'
         else:
             resource = xlink_href + '/largerimage'
-        full_url = base_url.format(resource)
-        try:
-            image = urllib.request.urlopen(full_url)
-        except urllib.error.HTTPError as e:
-            if e.code == 503:  # Server overload error
-                time.sleep(1)  # Wait a second
-                try:
-                    image = urllib.request.urlopen(full_url)
-                except:
-                    return False  # Happened twice, give up
-            else:
-                log.error('urllib.error.HTTPError {0}'.format(e.code))
-                return False
+        img_name = xlink_href.split('.')[-1] + '.png'
+        jobs.append(FetchJob(base_url.format(resource),
+                             os.path.join(output_dir, img_name)))
+    return jobs
+
+
+def fetch_plos_images(article_doi, output_dir, document, mathml=False,
+                      fetcher=None, base_url=None):
+    """
+    Fetch the images for a PLoS article from the internet.
+
+    PLoS images are known through the inspection of <graphic> and
+    <inline-graphic> elements. The information in these tags are then parsed
+    into appropriate URLs for downloading. If mathml is True, the images of
+    formulas which are also given in MathML are skipped.
+
+    The images are downloaded concurrently by the fetcher, by default the
+    shared one from utils.fetch.get_fetcher(). base_url replaces the URL of the
+    subjournal, as a format string taking the resource, to fetch from another
+    server. Returns True if every image was downloaded; the images which could
+    not be are reported, and the others are kept.
+    """
+    print('Processing images for {0}...'.format(article_doi))
+
+    skipped = set()
+    if mathml:
+        skipped = mathml_graphics(document.document.getroot())
+        log.info('Skipping {0} formula images given in MathML'.format(len(skipped)))
+    jobs = plos_image_jobs(article_doi, output_dir, document.document.getroot(),
+                           skipped, base_url)
+
+    #Begin to download
+    print('Downloading images, this may take some time...')
+    if fetcher is None:
+        fetcher = get_fetcher()
+    failures = 0
+    for result in fetcher.fetch_all(jobs):
+        img_name = os.path.basename(result.path)
+        if result.error is None:
+            print('Downloaded image {0}'.format(img_name))
         else:
-            img_name = xlink_href.split('.')[-1] + '.png'
-            img_path = os.path.join(output_dir, img_name)
-            with open(img_path, 'wb') as output:
-                output.write(image.read())
-            print('Downloaded image {0}\n'.format(img_name))
+            failures += 1
+            log.error('Failed to download image {0} from {1}: {2}'.format(img_name,
+                                                                        result.url,
+                                                                        result.error))
+            print('Failed to download image {0}: {1}'.format(img_name, result.error))
+    if failures:
+        print('Done downloading images, {0} of {1} failed'.format(failures, len(jobs)))
+        return False
     print('Done downloading images')
     return True
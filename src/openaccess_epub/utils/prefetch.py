@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Background prefetching of article images into the image cache.
+
+In Batch Input Mode and Collection Input Mode the images of each article used
+to be downloaded as it was converted, leaving the network idle while articles
+were converted and the CPU idle while images were downloaded. prefetch() runs
+ahead of such a loop: while one article is converted, the images of the next
+few are found from their <graphic> and <inline-graphic> elements, downloaded
+and stored in the image cache, where get_images() then finds them.
+
+Only PLoS images can be known from the article itself; the images of other
+publishers are still fetched when their article is converted. Nor are the
+images of an article prefetched if formulas given in MathML are to be placed as
+MathML, as the rest of its images would not make a complete set for the cache.
+"""
+
+from openaccess_epub.utils.dtds import parse
+from openaccess_epub.utils.fetch import get_fetcher
+from openaccess_epub.utils.image_cache import config_cache
+from openaccess_epub.utils.images import plos_image_jobs, mathml_graphics
+import os
+import shutil
+import logging
+import tempfile
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger('utils.prefetch')
+
+
+def article_doi(root):
+    """
+    Returns the DOI of the article from its <article-id> elements, or None.
+    """
+    for article_id in root.iterfind('front/article-meta/article-id'):
+        if article_id.get('pub-id-type') == 'doi' and article_id.text:
+            return article_id.text.strip()
+    return None
+
+
+def prefetch_article(xml_file, config, fetcher=None, mathml=False):
+    """
+    Downloads the images of the article into the image cache, unless they are
+    already there or would be taken from an input-relative directory. Returns
+    True if the images are in the cache.
+
+    If mathml is True and the article has formulas given in MathML, nothing is
+    downloaded: as in get_images(), the images of those formulas are not used,
+    and the others are an incomplete set which may not be stored in the cache.
+    """
+    if config.use_input_relative_images:
+        if any(os.path.isdir(d) for d in config.input_relative_images):
+            return False
+    root = parse(xml_file).getroot()
+    doi = article_doi(root)
+    if doi is None or not doi.startswith('10.1371/'):
+        return False
+    if mathml and mathml_graphics(root):
+        return False
+    cache = config_cache(config)
+    if cache.lookup(doi) is not None or os.path.isdir(cache.legacy_path(doi)):
+        return True
+    if fetcher is None:
+        fetcher = get_fetcher()
+    #The images are gathered beside the blobs, so that they may be linked in
+    img_dir = tempfile.mkdtemp(prefix='prefetch-', dir=cache.root)
+    try:
+        jobs = plos_image_jobs(doi.split('/')[1], img_dir, root)
+        failed = [result for result in fetcher.fetch_all(jobs)
+                  if result.error is not None]
+        if failed:
+            log.warning('Prefetching {0} of {1} images for {2} failed'.format(len(failed),
+                                                                          len(jobs),
+                                                                          doi))
+            return False
+        cache.store(doi, img_dir)
+    finally:
+        shutil.rmtree(img_dir)
+    log.info('Prefetched {0} images for {1}'.format(len(jobs), doi))
+    return True
+
+
+def prefetch(xml_files, config, window, fetcher=None, mathml=False):
+    """
+    Yields each of the xml_files in turn, once its images have been
+    prefetched, while the images of the next window files are prefetched in
+    background threads. A failed prefetch is logged, and leaves the images to
+    be fetched as usual when the article is converted. mathml is as for
+    prefetch_article().
+
+    The files are yielded straight away if window is 0, or if the config does
+    not enable both the image cache and image fetching.
+    """
+    if window and not (config.use_image_cache and config.use_image_fetching):
+        print('Prefetching images requires use_image_cache and use_image_fetching')
+        window = 0
+    if not window:
+        yield from xml_files
+        return
+    xml_files = iter(xml_files)
+    executor = ThreadPoolExecutor(max_workers=window)
+    pending = deque()
+
+    def submit(files):
+        for xml_file in files:
+            pending.append((xml_file, executor.submit(prefetch_article, xml_file,
+                                                      config, fetcher, mathml)))
+
+    try:
+        submit(itertools.islice(xml_files, window + 1))
+        while pending:
+            xml_file, future = pending.popleft()
+            try:
+                future.result()
+            except Exception:
+                log.exception('Prefetching images for {0} failed'.format(xml_file))
+            yield xml_file
+            submit(itertools.islice(xml_files, 1))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
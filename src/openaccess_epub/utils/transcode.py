@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+Transcoding of article images for the devices the ePub is made for.
+
+Publishers supply figures as TIFF, which ePub readers do not support, and as
+PNG or JPEG at print resolution, far larger than any e-reader screen. With an
+image profile, the images placed in the ePub are converted: TIFF becomes PNG,
+or JPEG if it is photographic; images larger than the profile's screen are
+downscaled; e-ink profiles are made grayscale; and PNG files are recompressed
+losslessly where that makes them smaller. Images which would not be improved
+are kept as they are.
+
+Transcoding runs in a pool of worker processes. With use_image_cache, each
+result is stored in the image cache under the digest of its source and the name
+of its profile, so that an image shared between articles is only transcoded
+once; otherwise images are transcoded afresh for each ePub.
+
+Pillow is required; without it images are left unchanged.
+"""
+
+from openaccess_epub.utils import write_xml
+from openaccess_epub.utils.image_cache import config_cache, place_file
+from openaccess_epub.utils.validation import file_digest
+import os
+import atexit
+import shutil
+import logging
+import tempfile
+import multiprocessing
+from collections import namedtuple
+
+from lxml import etree
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+log = logging.getLogger('utils.transcode')
+
+#A device to make images for: the largest width and height of an image in
+#pixels (None for no limit), whether to make images grayscale, and the quality
+#of JPEG images made from photographic ones
+Profile = namedtuple('Profile', 'name, max_width, max_height, grayscale, jpeg_quality')
+
+PROFILES = {'original': Profile('original', None, None, False, 90),
+            'tablet': Profile('tablet', 1536, 2048, False, 85),
+            'e-ink': Profile('e-ink', 1072, 1448, True, 75)}
+
+#The extensions of the image files which are transcoded
+IMAGE_EXTENSIONS = set(['.png', '.jpg', '.jpeg', '.gif', '.tif', '.tiff'])
+
+#The modes which PNG files may keep; others are converted to RGB(A)
+PNG_MODES = set(['1', 'L', 'LA', 'P', 'RGB', 'RGBA'])
+
+#Line art is mostly flat color: in a sample of it at most LINE_ART_SAMPLE pixels
+#on a side, the LINE_ART_COLORS commonest colors cover LINE_ART_COVERAGE of it
+LINE_ART_SAMPLE = 256
+LINE_ART_COLORS = 16
+LINE_ART_COVERAGE = 0.9
+
+
+def get_profile(name, config=None):
+    """
+    Returns the Profile by name, from the image_profiles of the config module,
+    which map names to (max_width, max_height, grayscale, jpeg_quality), or
+    else from PROFILES. Raises KeyError if there is no such profile.
+    """
+    profiles = getattr(config, 'image_profiles', None) or {}
+    if name in profiles:
+        return Profile(name, *profiles[name])
+    return PROFILES[name]
+
+
+def profile_key(profile):
+    """
+    Returns the key under which the transcodes for the Profile are cached, of
+    its name and its settings, as in "tablet:1536x2048:False:85", so that the
+    images are transcoded afresh for a profile redefined in the config module.
+    """
+    return '{0}:{1}x{2}:{3}:{4}'.format(*profile)
+
+
+def profile_names(config=None):
+    """
+    Returns the names of the profiles, including those of the config module.
+    """
+    names = set(PROFILES)
+    names.update(getattr(config, 'image_profiles', None) or {})
+    return sorted(names)
+
+
+def is_line_art(image):
+    """
+    Returns True if the image is line art, such as a chart or a diagram, rather
+    than photographic. Grayscale and color images are judged alike.
+    """
+    if image.mode in ('L', 'RGB'):
+        sample = image.copy()
+    else:
+        sample = image.convert('RGB')
+    #Nearest neighbour sampling makes no colors which the image lacks
+    sample.thumbnail((LINE_ART_SAMPLE, LINE_ART_SAMPLE), Image.NEAREST)
+    pixels = sample.width * sample.height
+    counts = sorted((count for count, _color in sample.getcolors(pixels)), reverse=True)
+    return sum(counts[:LINE_ART_COLORS]) >= LINE_ART_COVERAGE * pixels
+
+
+def transcode(source, destination, profile):
+    """
+    Transcodes the image at source for the Profile, writing it to destination
+    with the extension of its format added. Returns the extension, '.png' or
+    '.jpg', or None if the source is best kept as it is and nothing was
+    written. This is the work done in the worker processes.
+    """
+    with Image.open(source) as image:
+        image.load()
+        source_format = image.format
+        changed = source_format not in ('PNG', 'JPEG', 'GIF')
+        if profile.grayscale and image.mode not in ('1', 'L', 'LA'):
+            image = image.convert('LA' if 'A' in image.getbands() else 'L')
+            changed = True
+        if profile.max_width or profile.max_height:
+            limit = (profile.max_width or image.width,
+                     profile.max_height or image.height)
+            if image.width > limit[0] or image.height > limit[1]:
+                image.thumbnail(limit, Image.LANCZOS)
+                changed = True
+        if source_format == 'JPEG' and not changed:
+            return None  # Saving it again would only lose quality
+        #Line art, and images with transparency, are kept lossless
+        if source_format in ('PNG', 'GIF') or 'A' in image.getbands() or \
+           is_line_art(image):
+            if image.mode not in PNG_MODES:
+                image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+            image.save(destination + '.png', 'PNG', optimize=True)
+            extension = '.png'
+        else:
+            if image.mode not in ('L', 'RGB'):
+                image = image.convert('L' if profile.grayscale else 'RGB')
+            image.save(destination + '.jpg', 'JPEG', quality=profile.jpeg_quality,
+                       optimize=True, progressive=True)
+            extension = '.jpg'
+    if not changed and os.path.getsize(destination + extension) >= os.path.getsize(source):
+        os.remove(destination + extension)
+        return None
+    return extension
+
+
+def _transcode_job(job):
+    """
+    Runs transcode() for a (source, destination, profile) job, returning False
+    if the image could not be read.
+    """
+    source, destination, profile = job
+    try:
+        return transcode(source, destination, profile)
+    except (OSError, ValueError) as err:  # Unreadable or unsupported images
+        log.warning('Could not transcode {0}: {1}'.format(source, err))
+        return False
+
+
+#The pool of transcoding processes, shared by the articles of a batch
+_pool = None
+
+
+def get_pool():
+    """
+    Returns the shared pool of worker processes, or None in a daemonic process,
+    such as a worker of Parallel Batch Input Mode, which may not have children.
+    """
+    global _pool
+    if multiprocessing.current_process().daemon:
+        return None
+    if _pool is None:
+        _pool = multiprocessing.Pool()
+        atexit.register(_pool.terminate)
+    return _pool
+
+
+def transcode_images(img_dir, profile, config):
+    """
+    Replaces the images in img_dir with their transcodes for the Profile. With
+    use_image_cache, transcodes are taken from the image cache or else made by
+    the worker pool and stored there; a transcode is placed as a new file, so
+    that files linked to the cache are never written to. Without it, every
+    image is transcoded and nothing is stored. Returns True if any image was
+    renamed by a change of format.
+    """
+    if Image is None:
+        log.warning('Pillow is not installed, images are not transcoded')
+        return False
+    cache = config_cache(config) if config.use_image_cache else None
+    names = [name for name in sorted(os.listdir(img_dir))
+             if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS]
+    results = {}
+    if cache is None:
+        missing = names
+    else:
+        key = profile_key(profile)
+        digests = dict((name, file_digest(os.path.join(img_dir, name))) for name in names)
+        missing = []
+        for name in names:
+            result = cache.transcoded(digests[name], key)
+            if result is None:
+                missing.append(name)
+            else:
+                results[name] = result
+    work_dir = None
+    try:
+        if missing:
+            #With the cache, transcodes are written beside the blobs, so that
+            #they may be linked in
+            work_dir = tempfile.mkdtemp(prefix='transcode-',
+                                        dir=None if cache is None else cache.root)
+            jobs = [(os.path.join(img_dir, name), os.path.join(work_dir, str(number)),
+                     profile) for number, name in enumerate(missing)]
+            pool = get_pool() if len(jobs) > 1 else None
+            if pool is None:
+                extensions = [_transcode_job(job) for job in jobs]
+            else:
+                extensions = pool.map(_transcode_job, jobs)
+            for (_source, destination, _profile), name, extension in zip(jobs, missing, extensions):
+                if extension is False:  # Left as it is, but not remembered
+                    results[name] = (None, None)
+                    continue
+                path = destination + extension if extension else None
+                if cache is not None:
+                    path = cache.store_transcoded(digests[name], key, path,
+                                                  extension)
+                results[name] = (path, extension)
+        renamed = False
+        for name in names:
+            result, extension = results[name]
+            if result is None:
+                continue
+            root, old_extension = os.path.splitext(name)
+            os.remove(os.path.join(img_dir, name))
+            new_path = os.path.join(img_dir, root + extension)
+            if cache is None:
+                shutil.move(result, new_path)
+            else:
+                place_file(cache.blob_path(result), new_path)
+            renamed = renamed or extension != old_extension.lower()
+    finally:
+        if work_dir is not None:
+            shutil.rmtree(work_dir)
+    log.info('Transcoded {0} images for the {1} profile, {2} of them anew'.format(len(names),
+                                                                                 profile.name,
+                                                                                 len(missing)))
+    return renamed
+
+
+def relink_images(ops_dir, img_dir):
+    """
+    Points the <img> elements of the documents in ops_dir which refer to a file
+    missing from img_dir at the file there of the same name and another
+    extension, as left by transcode_images().
+    """
+    img_dir_name = os.path.basename(img_dir)
+    by_stem = dict((os.path.splitext(name)[0], name) for name in os.listdir(img_dir))
+    for document_name in os.listdir(ops_dir):
+        if not document_name.endswith('.xml'):
+            continue
+        path = os.path.join(ops_dir, document_name)
+        document = etree.parse(path)
+        changed = False
+        for img in document.iter('{http://www.w3.org/1999/xhtml}img', 'img'):
+            src = img.get('src', '')
+            directory, _slash, name = src.rpartition('/')
+            if directory != img_dir_name or os.path.isfile(os.path.join(img_dir, name)):
+                continue
+            replacement = by_stem.get(os.path.splitext(name)[0])
+            if replacement is not None:
+                img.set('src', '/'.join([directory, replacement]))
+                changed = True
+        if changed:
+            write_xml(document, path)
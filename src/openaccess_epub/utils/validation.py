@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+A persistent cache of DTD validation results.
+
+Validating an article against its DTD is one of the more expensive steps in
+processing, and corpora are often processed again with few changes. Results
+are stored in an SQLite database in the cache location, keyed by the SHA-256
+of the input file's bytes and the public id of its DTD, so an unchanged file is
+never validated twice while a changed or new file always is.
+"""
+
+import openaccess_epub.utils
+from openaccess_epub.utils.dtds import registry, parse, sniff_public_id
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+from collections import namedtuple
+
+from lxml import etree
+
+log = logging.getLogger('utils.validation')
+
+ValidationResult = namedtuple('ValidationResult', 'passed, errors')
+
+
+def file_digest(xml_file):
+    """
+    Returns the hex SHA-256 of the bytes of a file.
+    """
+    digest = hashlib.sha256()
+    with open(xml_file, 'rb') as xml:
+        for chunk in iter(lambda: xml.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ValidationCache(object):
+    """
+    Stores and retrieves ValidationResults by (sha256, public id) in an SQLite
+    database. The connection is opened lazily and reopened in a new process, so
+    an instance may be created before forking worker processes.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._connection = None
+        self._pid = None
+
+    @property
+    def connection(self):
+        if self._connection is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            self._connection = sqlite3.connect(self.path, timeout=60)
+            self._connection.execute('''CREATE TABLE IF NOT EXISTS validation
+                                        (sha256 TEXT NOT NULL,
+                                         public_id TEXT NOT NULL,
+                                         passed INTEGER NOT NULL,
+                                         errors TEXT,
+                                         validated REAL,
+                                         PRIMARY KEY (sha256, public_id))''')
+            self._connection.commit()
+            self._pid = os.getpid()
+        return self._connection
+
+    def lookup(self, digest, public_id):
+        """
+        Returns the cached ValidationResult, or None if it is not known.
+        """
+        row = self.connection.execute('''SELECT passed, errors FROM validation
+                                         WHERE sha256=? AND public_id=?''',
+                                      (digest, public_id)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return ValidationResult(bool(row[0]), row[1])
+
+    def store(self, digest, public_id, result):
+        """
+        Records a ValidationResult for the (sha256, public id) key.
+        """
+        with self.connection:
+            self.connection.execute('''INSERT OR REPLACE INTO validation
+                                       VALUES (?, ?, ?, ?, ?)''',
+                                    (digest, public_id, int(result.passed),
+                                     result.errors, time.time()))
+
+    def validate(self, dtd, document, public_id, xml_file, digest=None):
+        """
+        Returns the ValidationResult for the document against the compiled
+        DTD, from the cache if this file has been validated before, otherwise
+        by validating it and storing the result.
+        """
+        if digest is None:
+            digest = file_digest(xml_file)
+        result = self.lookup(digest, public_id)
+        if result is not None:
+            log.debug('Validation cache hit for {0}'.format(xml_file))
+            return result
+        result = validate(dtd, document)
+        self.store(digest, public_id, result)
+        return result
+
+    def clear(self):
+        """
+        Removes all cached results.
+        """
+        with self.connection:
+            self.connection.execute('DELETE FROM validation')
+
+
+def validate(dtd, document):
+    """
+    Validates the document against the compiled DTD, without any caching, and
+    returns a ValidationResult.
+    """
+    if dtd.validate(document):
+        return ValidationResult(True, '')
+    return ValidationResult(False, str(dtd.error_log.filter_from_errors()))
+
+
+def default_cache_path():
+    return os.path.join(openaccess_epub.utils.cache_location(),
+                        'validation_cache.sqlite')
+
+
+#Shared ValidationCache instances, by path
+_caches = {}
+
+
+def get_cache(path=None):
+    """
+    Returns the shared ValidationCache for the path, which defaults to the
+    file validation_cache.sqlite in the cache location.
+    """
+    if path is None:
+        path = default_cache_path()
+    try:
+        return _caches[path]
+    except KeyError:
+        cache = ValidationCache(path)
+        _caches[path] = cache
+        return cache
+
+
+def validate_file(xml_file, max_errors=10, cache=None):
+    """
+    Parses and validates a single file, for use by dtdvalidate and its worker
+    processes. Never raises for a bad file; returns a dictionary describing
+    the outcome with the keys: file, public_id, status (one of "valid",
+    "invalid", "parse-error", "unsupported"), errors (the first max_errors
+    error lines), cached, parse_seconds, and validate_seconds.
+    """
+    report = {'file': xml_file, 'public_id': None, 'status': None,
+              'errors': [], 'cached': False,
+              'parse_seconds': 0.0, 'validate_seconds': 0.0}
+    digest = None
+    missed = None  # The public id already looked up in vain, if any
+    if cache is not None:
+        #A known file need not even be parsed
+        public_id = sniff_public_id(xml_file)
+        digest = file_digest(xml_file)
+        result = cache.lookup(digest, public_id) if public_id else None
+        if result is None:
+            missed = public_id
+        else:
+            report['public_id'] = public_id
+            report['cached'] = True
+            return _report_result(report, result, max_errors)
+    start = time.time()
+    try:
+        document = parse(xml_file)
+    except (etree.XMLSyntaxError, IOError, OSError) as err:
+        report['status'] = 'parse-error'
+        report['errors'] = [str(err)]
+        report['parse_seconds'] = time.time() - start
+        return report
+    report['parse_seconds'] = time.time() - start
+    public_id = document.docinfo.public_id
+    report['public_id'] = public_id
+    try:
+        dtd = registry.get(public_id)
+    except KeyError:
+        report['status'] = 'unsupported'
+        report['errors'] = ['Unsupported public id: {0}'.format(public_id)]
+        return report
+    start = time.time()
+    if cache is None:
+        result = validate(dtd, document)
+    elif public_id == missed:
+        result = validate(dtd, document)
+        cache.store(digest, public_id, result)
+    else:
+        hits = cache.hits
+        result = cache.validate(dtd, document, public_id, xml_file, digest)
+        report['cached'] = cache.hits > hits
+    report['validate_seconds'] = time.time() - start
+    return _report_result(report, result, max_errors)
+
+
+def _report_result(report, result, max_errors):
+    report['status'] = 'valid' if result.passed else 'invalid'
+    if not result.passed:
+        report['errors'] = result.errors.splitlines()[:max_errors]
+    return report